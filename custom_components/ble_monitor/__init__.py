@@ -3,10 +3,10 @@ import asyncio
 import copy
 import json
 import logging
+from functools import partial
 from threading import Thread
 
 import aioblescan as aiobs
-import janus
 import voluptuous as vol
 from homeassistant.config_entries import SOURCE_IMPORT, ConfigEntry
 from homeassistant.const import (CONF_DEVICES, CONF_DISCOVERY, CONF_MAC,
@@ -19,32 +19,48 @@ from homeassistant.helpers.device_registry import DeviceEntry
 from homeassistant.util import dt
 
 from .ble_parser import BleParser
+from .ble_parser.capture import CaptureWriter, replay_capture
+from .ble_parser.dispatch import VENDORS
+from .ble_parser.handoff import POLICIES, Coalescer, HandoffQueue
+from .ble_parser.pool import ParserPool
 from .bt_helpers import (BT_INTERFACES, BT_MULTI_SELECT, DEFAULT_BT_INTERFACE,
                          reset_bluetooth)
-from .const import (AES128KEY24_REGEX, AES128KEY32_REGEX,
-                    AUTO_BINARY_SENSOR_LIST, AUTO_MANUFACTURER_DICT,
-                    AUTO_SENSOR_LIST, CONF_ACTIVE_SCAN, CONF_BATT_ENTITIES,
-                    CONF_BT_AUTO_RESTART, CONF_BT_INTERFACE,
-                    CONF_DEVICE_ENCRYPTION_KEY, CONF_DEVICE_REPORT_UNKNOWN,
-                    CONF_DEVICE_RESET_TIMER, CONF_DEVICE_RESTORE_STATE,
-                    CONF_DEVICE_TRACK, CONF_DEVICE_TRACKER_CONSIDER_HOME,
+from .const import (AES128KEY24_REGEX, AES128KEY32_REGEX, CONF_ACTIVE_SCAN,
+                    CONF_BATT_ENTITIES, CONF_BT_AUTO_RESTART,
+                    CONF_BT_INTERFACE, CONF_CAPTURE_FILE,
+                    CONF_CAPTURE_MAX_SIZE, CONF_COALESCE_MEASUREMENTS,
+                    CONF_DEDUP_TTL, CONF_DEVICE_ENCRYPTION_KEY,
+                    CONF_DEVICE_REPORT_UNKNOWN, CONF_DEVICE_RESET_TIMER,
+                    CONF_DEVICE_RESTORE_STATE, CONF_DEVICE_TRACK,
+                    CONF_DEVICE_TRACKER_CONSIDER_HOME,
                     CONF_DEVICE_TRACKER_SCAN_INTERVAL, CONF_DEVICE_USE_MEDIAN,
-                    CONF_GATEWAY_ID, CONF_HCI_INTERFACE, CONF_LOG_SPIKES,
-                    CONF_PACKET, CONF_PERIOD, CONF_REPORT_UNKNOWN,
-                    CONF_RESTORE_STATE, CONF_USE_MEDIAN, CONF_UUID,
-                    CONFIG_IS_FLOW, DEFAULT_ACTIVE_SCAN, DEFAULT_BATT_ENTITIES,
-                    DEFAULT_BT_AUTO_RESTART, DEFAULT_DEVICE_REPORT_UNKNOWN,
-                    DEFAULT_DEVICE_RESET_TIMER, DEFAULT_DEVICE_RESTORE_STATE,
-                    DEFAULT_DEVICE_TRACK, DEFAULT_DEVICE_TRACKER_CONSIDER_HOME,
+                    CONF_GATEWAY_ID, CONF_HANDOFF_BATCH_SIZE,
+                    CONF_HANDOFF_DELAY, CONF_HCI_INTERFACE, CONF_LOG_SPIKES,
+                    CONF_PACKET, CONF_PARSER_WORKERS, CONF_PERIOD,
+                    CONF_QUEUE_POLICY, CONF_QUEUE_SIZE, CONF_REPLAY_FILE,
+                    CONF_REPLAY_SPEED, CONF_REPORT_UNKNOWN, CONF_RESTORE_STATE,
+                    CONF_SCANNER_MODE, CONF_STATE_MAX_SIZE, CONF_STATE_TTL,
+                    CONF_USE_MEDIAN, CONF_UUID, CONF_VENDORS, CONFIG_IS_FLOW,
+                    DEFAULT_ACTIVE_SCAN, DEFAULT_BATT_ENTITIES,
+                    DEFAULT_BT_AUTO_RESTART, DEFAULT_CAPTURE_MAX_SIZE,
+                    DEFAULT_COALESCE_MEASUREMENTS, DEFAULT_DEDUP_TTL,
+                    DEFAULT_DEVICE_REPORT_UNKNOWN, DEFAULT_DEVICE_RESET_TIMER,
+                    DEFAULT_DEVICE_RESTORE_STATE, DEFAULT_DEVICE_TRACK,
+                    DEFAULT_DEVICE_TRACKER_CONSIDER_HOME,
                     DEFAULT_DEVICE_TRACKER_SCAN_INTERVAL,
                     DEFAULT_DEVICE_USE_MEDIAN, DEFAULT_DISCOVERY,
-                    DEFAULT_LOG_SPIKES, DEFAULT_PERIOD, DEFAULT_REPORT_UNKNOWN,
-                    DEFAULT_RESTORE_STATE, DEFAULT_USE_MEDIAN, DOMAIN,
-                    MAC_REGEX, MANUFACTURER_DICT, MEASUREMENT_DICT, PLATFORMS,
-                    REPORT_UNKNOWN_LIST, SERVICE_CLEANUP_ENTRIES,
-                    SERVICE_PARSE_DATA)
+                    DEFAULT_HANDOFF_BATCH_SIZE, DEFAULT_HANDOFF_DELAY,
+                    DEFAULT_LOG_SPIKES, DEFAULT_PARSER_WORKERS, DEFAULT_PERIOD,
+                    DEFAULT_QUEUE_POLICY, DEFAULT_QUEUE_SIZE,
+                    DEFAULT_REPLAY_SPEED, DEFAULT_REPORT_UNKNOWN,
+                    DEFAULT_RESTORE_STATE, DEFAULT_SCANNER_MODE,
+                    DEFAULT_STATE_MAX_SIZE, DEFAULT_STATE_TTL,
+                    DEFAULT_USE_MEDIAN, DOMAIN, JAGGED_HUMIDITY, MAC_REGEX,
+                    PLATFORMS, REPORT_UNKNOWN_LIST, SCANNER_MODE_LIST,
+                    SERVICE_CLEANUP_ENTRIES, SERVICE_PARSE_DATA)
 from .helper import (config_validation_uuid, dict_get_or, dict_get_or_clean,
                      identifier_clean)
+from .routing import build_routes, route_sensor_data
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -120,6 +136,44 @@ CONFIG_SCHEMA = vol.Schema(
                     vol.Optional(
                         CONF_REPORT_UNKNOWN, default=DEFAULT_REPORT_UNKNOWN
                     ): vol.In(REPORT_UNKNOWN_LIST),
+                    vol.Optional(CONF_DEDUP_TTL, default=DEFAULT_DEDUP_TTL): cv.positive_int,
+                    vol.Optional(
+                        CONF_STATE_MAX_SIZE, default=DEFAULT_STATE_MAX_SIZE
+                    ): vol.All(cv.positive_int, vol.Range(min=1)),
+                    vol.Optional(CONF_STATE_TTL, default=DEFAULT_STATE_TTL): cv.positive_int,
+                    vol.Optional(
+                        CONF_PARSER_WORKERS, default=DEFAULT_PARSER_WORKERS
+                    ): cv.positive_int,
+                    vol.Optional(CONF_VENDORS): vol.All(
+                        cv.ensure_list, [vol.In(sorted(VENDORS))]
+                    ),
+                    vol.Optional(CONF_CAPTURE_FILE): cv.string,
+                    vol.Optional(
+                        CONF_CAPTURE_MAX_SIZE, default=DEFAULT_CAPTURE_MAX_SIZE
+                    ): vol.All(cv.positive_int, vol.Range(min=1)),
+                    vol.Optional(CONF_REPLAY_FILE): cv.string,
+                    vol.Optional(
+                        CONF_REPLAY_SPEED, default=DEFAULT_REPLAY_SPEED
+                    ): vol.All(vol.Coerce(float), vol.Range(min=0)),
+                    vol.Optional(
+                        CONF_HANDOFF_DELAY, default=DEFAULT_HANDOFF_DELAY
+                    ): cv.positive_int,
+                    vol.Optional(
+                        CONF_HANDOFF_BATCH_SIZE, default=DEFAULT_HANDOFF_BATCH_SIZE
+                    ): vol.All(cv.positive_int, vol.Range(min=1)),
+                    vol.Optional(
+                        CONF_COALESCE_MEASUREMENTS, default=DEFAULT_COALESCE_MEASUREMENTS
+                    ): cv.boolean,
+                    vol.Optional(
+                        CONF_SCANNER_MODE, default=DEFAULT_SCANNER_MODE
+                    ): vol.In(SCANNER_MODE_LIST),
+                    vol.Optional(CONF_QUEUE_SIZE, default=DEFAULT_QUEUE_SIZE): cv.positive_int,
+                    vol.Optional(CONF_QUEUE_POLICY, default={}): vol.Schema(
+                        {
+                            vol.Optional(queue, default=policy): vol.In(POLICIES)
+                            for queue, policy in DEFAULT_QUEUE_POLICY.items()
+                        }
+                    ),
                 }
             ),
         )
@@ -130,7 +184,7 @@ CONFIG_SCHEMA = vol.Schema(
 SERVICE_CLEANUP_ENTRIES_SCHEMA = vol.Schema({})
 SERVICE_PARSE_DATA_SCHEMA = vol.Schema(
     {
-        vol.Required(CONF_PACKET): cv.string,
+        vol.Required(CONF_PACKET): vol.All(cv.ensure_list, [cv.string]),
         vol.Optional(CONF_GATEWAY_ID): cv.string
     }
 )
@@ -370,7 +424,7 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry):
     )
     blemonitor: BLEmonitor = hass.data[DOMAIN]["blemonitor"]
     if blemonitor:
-        blemonitor.stop()
+        await blemonitor.async_stop()
 
     return unload_ok
 
@@ -416,12 +470,12 @@ async def async_cleanup_entries_service(hass: HomeAssistant, service_data):
 
 
 async def async_parse_data_service(hass: HomeAssistant, service_data):
-    """Call parse_raw_data with RAW HCI packet data."""
+    """Parse RAW HCI packet data, a single packet or a list of packets."""
     _LOGGER.debug("async_parse_data_service")
     blemonitor: BLEmonitor = hass.data[DOMAIN]["blemonitor"]
     if blemonitor:
-        blemonitor.dumpthread.process_hci_events(
-            bytes.fromhex(service_data["packet"]),
+        blemonitor.dumpthread.process_hci_batch(
+            [bytes.fromhex(packet) for packet in service_data[CONF_PACKET]],
             service_data[CONF_GATEWAY_ID] if CONF_GATEWAY_ID in service_data else DOMAIN
         )
 
@@ -445,10 +499,16 @@ class BLEmonitor:
 
     def __init__(self, config):
         """Init."""
+        queue_size = config.get(CONF_QUEUE_SIZE, DEFAULT_QUEUE_SIZE)
+        queue_policy = {**DEFAULT_QUEUE_POLICY, **config.get(CONF_QUEUE_POLICY, {})}
+        # without a handoff delay, the updaters are woken up for every BLE advertisement
+        handoff_batch_size = (
+            config.get(CONF_HANDOFF_BATCH_SIZE, DEFAULT_HANDOFF_BATCH_SIZE)
+            if config.get(CONF_HANDOFF_DELAY, DEFAULT_HANDOFF_DELAY) else 1
+        )
         self.dataqueue = {
-            "binary": janus.Queue(),
-            "measuring": janus.Queue(),
-            "tracker": janus.Queue(),
+            name: HandoffQueue(name, queue_size, queue_policy[name], dict_get_or, handoff_batch_size)
+            for name in ("binary", "measuring", "tracker")
         }
         self.config = config
         self.dumpthread = None
@@ -460,32 +520,52 @@ class BLEmonitor:
 
     def start(self):
         """Start receiving broadcasts."""
-        _LOGGER.debug("Spawning HCIdump thread")
-        self.dumpthread = HCIdump(
-            config=self.config,
-            dataqueue=self.dataqueue,
-        )
+        if self.config.get(CONF_SCANNER_MODE, DEFAULT_SCANNER_MODE) == "event_loop":
+            _LOGGER.debug("Starting HCI scanner in the event loop")
+            self.dumpthread = HCIscanner(
+                config=self.config,
+                dataqueue=self.dataqueue,
+            )
+        else:
+            _LOGGER.debug("Spawning HCIdump thread")
+            self.dumpthread = HCIdump(
+                config=self.config,
+                dataqueue=self.dataqueue,
+            )
         self.dumpthread.start()
 
     def stop(self):
-        """Stop HCIdump thread(s)."""
-        self.dataqueue["binary"].sync_q.put_nowait(None)
-        self.dataqueue["measuring"].sync_q.put_nowait(None)
-        self.dataqueue["tracker"].sync_q.put_nowait(None)
+        """Stop HCIdump thread(s) or the HCI scanner, then close the data queues."""
         result = True
-        if self.dumpthread is None:
-            _LOGGER.debug("BLE monitor stopped")
-            return True
-        if self.dumpthread.is_alive():
-            self.dumpthread.join()
-            if self.dumpthread.is_alive():
-                result = False
-                _LOGGER.error(
-                    "Waiting for the HCIdump thread to finish took too long! (>10s)"
-                )
+        if isinstance(self.dumpthread, HCIscanner):
+            # the scanner stops in the event loop, it closes the queues after its last data
+            self.dumpthread.stop(self.close_queues)
+        else:
+            if self.dumpthread is not None and self.dumpthread.is_alive():
+                self.dumpthread.join()
+                if self.dumpthread.is_alive():
+                    result = False
+                    _LOGGER.error(
+                        "Waiting for the HCIdump thread to finish took too long! (>10s)"
+                    )
+            self.close_queues()
         _LOGGER.debug("BLE monitor stopped")
         return result
 
+    def close_queues(self):
+        """Close the data queues, the updaters stop after the queued data."""
+        for queue in self.dataqueue.values():
+            queue.close()
+
+    async def async_stop(self):
+        """Stop receiving broadcasts, and wait in the event loop until the HCI scanner is stopped."""
+        result = self.stop()
+        if isinstance(self.dumpthread, HCIscanner):
+            if not await self.dumpthread.async_join():
+                result = False
+                _LOGGER.error("Waiting for the HCI scanner to finish took too long! (>10s)")
+        return result
+
     def restart(self):
         """Restart scanning."""
         if self.dumpthread.is_alive():
@@ -494,18 +574,18 @@ class BLEmonitor:
             self.start()
 
 
-class HCIdump(Thread):
-    """Mimic deprecated hcidump tool."""
+class HCIprocessor:
+    """Parse HCI events and send the parsed data to the queues of the sensors."""
+
+    log_name = "HCI processor"
 
     def __init__(self, config, dataqueue):
-        """Initiate HCIdump thread."""
-        Thread.__init__(self)
-        _LOGGER.debug("HCIdump thread: Init")
-        self.dataqueue_bin = dataqueue["binary"]
-        self.dataqueue_meas = dataqueue["measuring"]
-        self.dataqueue_tracker = dataqueue["tracker"]
+        """Initiate HCI processor."""
+        self.dataqueue = dataqueue
         self._event_loop = None
-        self._joining = False
+        self._flush_timer = None
+        self._replay_task = None
+        self.capture = None
         self.evt_cnt = 0
         self.config = config
         self._interfaces = list(set(config[CONF_HCI_INTERFACE]))
@@ -579,8 +659,8 @@ class HCIdump(Thread):
             "%s device tracker(s) being monitored", len(self.tracker_whitelist)
         )
 
-        # prepare the ble_parser
-        self.ble_parser = BleParser(
+        # prepare the ble_parser, or a pool of parsers in worker threads
+        parser_kwargs = dict(
             report_unknown=self.report_unknown,
             discovery=self.discovery,
             filter_duplicates=self.filter_duplicates,
@@ -588,44 +668,184 @@ class HCIdump(Thread):
             tracker_whitelist=self.tracker_whitelist,
             report_unknown_whitelist=self.report_unknown_whitelist,
             aeskeys=self.aeskeys,
+            dedup_ttl=self.config.get(CONF_DEDUP_TTL, DEFAULT_DEDUP_TTL),
+            state_max_size=self.config.get(CONF_STATE_MAX_SIZE, DEFAULT_STATE_MAX_SIZE),
+            state_ttl=self.config.get(CONF_STATE_TTL, DEFAULT_STATE_TTL),
+            vendors=self.config.get(CONF_VENDORS),
         )
+        parser_workers = self.config.get(CONF_PARSER_WORKERS, DEFAULT_PARSER_WORKERS)
+        if parser_workers:
+            self.ble_parser = None
+            self.parser_pool = ParserPool(self.process_parsed_data, parser_workers, **parser_kwargs)
+            _LOGGER.debug("%s parser worker(s) used", parser_workers)
+        else:
+            self.ble_parser = BleParser(**parser_kwargs)
+            self.parser_pool = None
+
+        # the queues of the sensor data of each device type
+        self.routes = build_routes()
+
+        # the parse results are handed to the event loop of Home Assistant in batches
+        self.handoff_delay = self.config.get(CONF_HANDOFF_DELAY, DEFAULT_HANDOFF_DELAY) / 1000
+        # the measuring sensor data of a device between two handoffs can be merged
+        if self.handoff_delay and self.config.get(
+            CONF_COALESCE_MEASUREMENTS, DEFAULT_COALESCE_MEASUREMENTS
+        ):
+            self.coalescer = Coalescer(dict_get_or)
+        else:
+            self.coalescer = None
 
     def process_hci_events(self, data, gateway_id=DOMAIN):
         """Parse HCI events."""
         self.evt_cnt += 1
         if len(data) < 12:
             return
-        sensor_msg, tracker_msg = self.ble_parser.parse_raw_data(data)
+        if self.parser_pool is not None:
+            self.parser_pool.submit(data, gateway_id)
+            return
+        for sensor_msg, tracker_msg in self.ble_parser.parse_hci_event(data):
+            self.process_parsed_data(sensor_msg, tracker_msg, gateway_id)
+
+    def process_hci_batch(self, packets, gateway_id=DOMAIN):
+        """Parse a batch of HCI events, e.g. forwarded by a gateway."""
+        if self.capture is not None:
+            for data in packets:
+                self.capture.write(data, gateway_id)
+        if self.parser_pool is not None:
+            for data in packets:
+                self.process_hci_events(data, gateway_id)
+            return
+        self.evt_cnt += len(packets)
+        for results in self.ble_parser.parse_raw_batch(packets):
+            for sensor_msg, tracker_msg in results:
+                self.process_parsed_data(sensor_msg, tracker_msg, gateway_id)
+
+    def process_parsed_data(self, sensor_msg, tracker_msg, gateway_id=DOMAIN):
+        """Send the parsed data of one advertising report to the queues."""
         if sensor_msg:
-            measurements = list(sensor_msg.keys())
-            device_type = sensor_msg["type"]
-            if device_type in MANUFACTURER_DICT:
-                sensor_list = (
-                    MEASUREMENT_DICT[device_type][0] + MEASUREMENT_DICT[device_type][1]
-                )
-                binary_list = MEASUREMENT_DICT[device_type][2] + ["battery"]
-            elif device_type in AUTO_MANUFACTURER_DICT:
-                sensor_list = AUTO_SENSOR_LIST
-                binary_list = AUTO_BINARY_SENSOR_LIST + ["battery"]
-            else:
+            route = self.routes.get(sensor_msg["type"])
+            if route is None:
                 return
-
-            measuring = any(x in measurements for x in sensor_list)
-            binary = any(x in measurements for x in binary_list)
-            if binary == measuring:
-                self.dataqueue_bin.sync_q.put_nowait(sensor_msg)
-                self.dataqueue_meas.sync_q.put_nowait(sensor_msg)
-            else:
-                if binary is True:
-                    self.dataqueue_bin.sync_q.put_nowait(sensor_msg)
-                if measuring is True:
-                    self.dataqueue_meas.sync_q.put_nowait(sensor_msg)
+            measuring, binary = route_sensor_data(route, sensor_msg)
+            if binary:
+                self.dataqueue["binary"].put(sensor_msg)
+            if measuring:
+                self.put_measuring(sensor_msg, route)
         if tracker_msg:
             tracker_msg[CONF_GATEWAY_ID] = gateway_id
-            self.dataqueue_tracker.sync_q.put_nowait(tracker_msg)
+            self.dataqueue["tracker"].put(tracker_msg)
+
+    def put_measuring(self, sensor_msg, route):
+        """Send the data of the measuring sensors to the coalescer or, with instant measurements, to the queue."""
+        if (
+            self.coalescer is None
+            or sensor_msg.get("data") is False
+            or not route.instant.isdisjoint(sensor_msg)
+            or self.jagged_humidity(sensor_msg)
+        ):
+            self.dataqueue["measuring"].put(sensor_msg)
+        else:
+            self.coalescer.put(sensor_msg)
+
+    @staticmethod
+    def jagged_humidity(sensor_msg):
+        """Return True for a jagged humidity, that is rounded per sample and can't be merged."""
+        return (
+            sensor_msg["type"] in JAGGED_HUMIDITY
+            and "humidity" in sensor_msg
+            and sensor_msg.get("firmware", "")[0:6] == "Xiaomi"
+        )
+
+    def flush_coalescer(self):
+        """Queue the merged data of the measuring sensors."""
+        if self.coalescer is not None:
+            for sensor_msg in self.coalescer.flush():
+                self.dataqueue["measuring"].put(sensor_msg)
+
+    def flush_handoff(self):
+        """Hand the parsed data over to Home Assistant every handoff_delay seconds."""
+        self.flush_coalescer()
+        for queue in self.dataqueue.values():
+            queue.notify()
+        self._flush_timer = self._event_loop.call_later(self.handoff_delay, self.flush_handoff)
+
+    def capture_hci_events(self, adapter, data):
+        """Record and parse the HCI events of a Bluetooth adapter."""
+        self.capture.write(data, adapter)
+        self.process_hci_events(data)
+
+    def process_replayed_events(self, data, adapter):
+        """Parse the replayed HCI events of a Bluetooth adapter or a gateway."""
+        self.process_hci_events(data, DOMAIN if adapter.startswith("hci") else adapter)
+
+    async def replay(self, path):
+        """Replay a capture file instead of receiving from the Bluetooth adapters."""
+        speed = self.config.get(CONF_REPLAY_SPEED, DEFAULT_REPLAY_SPEED)
+        _LOGGER.info("%s: replaying %s at speed %s", self.log_name, path, speed or "max")
+        try:
+            count = await replay_capture(path, self.process_replayed_events, speed)
+        except (OSError, ValueError) as error:
+            _LOGGER.error("%s: Replay of %s failed: %s", self.log_name, path, error)
+        else:
+            _LOGGER.info("%s: %i HCI events replayed from %s", self.log_name, count, path)
+
+    def open_capture(self):
+        """Open the capture file, if HCI events are recorded."""
+        capture_file = self.config.get(CONF_CAPTURE_FILE)
+        if capture_file:
+            try:
+                self.capture = CaptureWriter(
+                    capture_file,
+                    self.config.get(CONF_CAPTURE_MAX_SIZE, DEFAULT_CAPTURE_MAX_SIZE) * 1048576,
+                )
+            except OSError as error:
+                _LOGGER.error("%s: Can't open capture file %s: %s", self.log_name, capture_file, error)
+            else:
+                _LOGGER.info("%s: HCI events are recorded in %s", self.log_name, capture_file)
+
+    def end_period(self):
+        """Log the statistics of the scan period that ended."""
+        _LOGGER.debug("%s: Scanning will be restarted", self.log_name)
+        _LOGGER.debug("%i HCI events processed for previous period", self.evt_cnt)
+        self.evt_cnt = 0
+        _LOGGER.debug("BLE parser state: %s", (self.parser_pool or self.ble_parser).stats())
+        _LOGGER.debug(
+            "Queues: %s", {name: queue.stats() for name, queue in self.dataqueue.items()}
+        )
+        if self.coalescer is not None:
+            _LOGGER.debug("Coalesced measurements: %s", self.coalescer.stats())
+        if self.capture is not None:
+            self.capture.flush()
+
+    def finish(self):
+        """Close the capture file, stop the parser pool and hand over the remaining parsed data."""
+        if self.capture is not None:
+            self.capture.close()
+        if self.parser_pool is not None:
+            self.parser_pool.stop()
+        self.flush_coalescer()
+        for queue in self.dataqueue.values():
+            queue.notify()
+
+
+class HCIdump(HCIprocessor, Thread):
+    """Mimic deprecated hcidump tool."""
+
+    log_name = "HCIdump thread"
+
+    def __init__(self, config, dataqueue):
+        """Initiate HCIdump thread."""
+        Thread.__init__(self)
+        _LOGGER.debug("HCIdump thread: Init")
+        HCIprocessor.__init__(self, config, dataqueue)
+        self._joining = False
 
     def run(self):
         """Run HCIdump thread."""
+        if self.parser_pool is not None:
+            self.parser_pool.start()
+        self.open_capture()
+        replay_file = self.config.get(CONF_REPLAY_FILE)
         while True:
             _LOGGER.debug("HCIdump thread: Run")
             mysocket = {}
@@ -637,8 +857,14 @@ class HCIdump(Thread):
             initialized_evt = {}
             if self._event_loop is None:
                 self._event_loop = asyncio.new_event_loop()
+                if self.handoff_delay:
+                    self._event_loop.call_later(self.handoff_delay, self.flush_handoff)
             asyncio.set_event_loop(self._event_loop)
-            if "disable" not in self.config[CONF_BT_INTERFACE]:
+            if replay_file:
+                # the replay continues after a restart of the event loop
+                if self._replay_task is None:
+                    self._replay_task = self._event_loop.create_task(self.replay(replay_file))
+            elif "disable" not in self.config[CONF_BT_INTERFACE]:
                 for hci in self._interfaces:
                     interface_is_ok[hci] = False
                     try:
@@ -672,7 +898,10 @@ class HCIdump(Thread):
                             fac[hci].close()
                             mysocket[hci].close()
                         else:
-                            btctrl[hci].process = self.process_hci_events
+                            if self.capture is None:
+                                btctrl[hci].process = self.process_hci_events
+                            else:
+                                btctrl[hci].process = partial(self.capture_hci_events, f"hci{hci}")
                             _LOGGER.debug("HCIdump thread: connected to hci%i", hci)
                             try:
                                 self._event_loop.run_until_complete(
@@ -714,7 +943,7 @@ class HCIdump(Thread):
                 self._event_loop.run_forever()
             finally:
                 _LOGGER.debug("HCIdump thread: main event_loop stopped, finishing.")
-                if "disable" not in self.config[CONF_BT_INTERFACE]:
+                if not replay_file and "disable" not in self.config[CONF_BT_INTERFACE]:
                     for hci in self._interfaces:
                         if interface_is_ok[hci] is True:
                             try:
@@ -744,10 +973,14 @@ class HCIdump(Thread):
                 self._event_loop.run_until_complete(asyncio.sleep(0))
             if self._joining is True:
                 break
-            _LOGGER.debug("HCIdump thread: Scanning will be restarted")
-            _LOGGER.debug("%i HCI events processed for previous period", self.evt_cnt)
-            self.evt_cnt = 0
+            self.end_period()
+        if self._replay_task is not None and not self._replay_task.done():
+            self._replay_task.cancel()
+            self._event_loop.run_until_complete(
+                asyncio.gather(self._replay_task, return_exceptions=True)
+            )
         self._event_loop.close()
+        self.finish()
         _LOGGER.debug("HCIdump thread: Run finished")
 
     def join(self, timeout=10):
@@ -768,3 +1001,174 @@ class HCIdump(Thread):
             self._event_loop.call_soon_threadsafe(self._event_loop.stop)
         except AttributeError as error:
             _LOGGER.debug("%s", error)
+
+
+class HCIscanner(HCIprocessor):
+    """Scan in the event loop of Home Assistant, without the HCIdump thread.
+
+    The HCI sockets of the Bluetooth adapters are read by the event loop of
+    Home Assistant, and the HCI events are parsed in this event loop as well,
+    unless parser_workers are used.
+    """
+
+    log_name = "HCI scanner"
+
+    def __init__(self, config, dataqueue):
+        """Initiate HCI scanner."""
+        _LOGGER.debug("HCI scanner: Init")
+        super().__init__(config, dataqueue)
+        self._task = None
+        self._stopping = False
+        self._on_stopped = None
+        self._restart = asyncio.Event()
+        self._scanning = {}
+
+    def start(self):
+        """Start scanning, must be called in the event loop."""
+        self._event_loop = asyncio.get_running_loop()
+        self._task = self._event_loop.create_task(self.run())
+
+    def is_alive(self):
+        """Return True if the scanner is running."""
+        return self._task is not None and not self._task.done()
+
+    async def run(self):
+        """Run HCI scanner, until it is stopped."""
+        if self.parser_pool is not None:
+            self.parser_pool.start()
+        self.open_capture()
+        if self.handoff_delay:
+            self._flush_timer = self._event_loop.call_later(self.handoff_delay, self.flush_handoff)
+        replay_file = self.config.get(CONF_REPLAY_FILE)
+        try:
+            while not self._stopping:
+                _LOGGER.debug("HCI scanner: Run")
+                if replay_file:
+                    # the replay continues after a restart
+                    if self._replay_task is None:
+                        self._replay_task = self._event_loop.create_task(self.replay(replay_file))
+                elif "disable" not in self.config[CONF_BT_INTERFACE]:
+                    await self.start_scanning()
+                await self._restart.wait()
+                self._restart.clear()
+                await self.stop_scanning()
+                if self._stopping:
+                    break
+                self.end_period()
+        finally:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+            if self._replay_task is not None and not self._replay_task.done():
+                self._replay_task.cancel()
+                await asyncio.gather(self._replay_task, return_exceptions=True)
+            for mysocket, conn, _ in self._scanning.values():
+                conn.close()
+                mysocket.close()
+            self._scanning = {}
+            self.finish()
+            if self._on_stopped is not None:
+                self._on_stopped()
+            _LOGGER.debug("HCI scanner: Run finished")
+
+    async def start_scanning(self):
+        """Send the scan requests, and power cycle the adapters that fail, if enabled."""
+        interfaces_to_reset = []
+        for hci in self._interfaces:
+            if not await self.open_interface(hci) and self.config[CONF_BT_AUTO_RESTART] is True:
+                interfaces_to_reset.append(hci)
+        if interfaces_to_reset:
+            ts_now = dt.now()
+            if (ts_now - self.last_bt_reset).seconds > 60:
+                for iface in interfaces_to_reset:
+                    _LOGGER.error(
+                        "HCI scanner: Trying to power cycle Bluetooth adapter hci%i %s,"
+                        " will try to use it next scan period.",
+                        iface,
+                        BT_INTERFACES[iface],
+                    )
+                    # the power cycle blocks, it runs in the executor
+                    await self._event_loop.run_in_executor(None, reset_bluetooth, iface)
+                self.last_bt_reset = ts_now
+
+    async def open_interface(self, hci):
+        """Open the HCI socket of an adapter and send the scan request, return True on success."""
+        try:
+            mysocket = aiobs.create_bt_socket(hci)
+        except OSError as error:
+            _LOGGER.error("HCI scanner: OS error (hci%i): %s", hci, error)
+            return False
+        conn, btctrl = await getattr(self._event_loop, "_create_connection_transport")(
+            mysocket, aiobs.BLEScanRequester, None, None
+        )
+        # Wait up to five seconds for aioblescan BLEScanRequester to initialize
+        try:
+            await asyncio.wait_for(getattr(btctrl, "_initialized").wait(), 5)
+        except asyncio.TimeoutError:
+            _LOGGER.warning(
+                "HCI scanner: Something wrong - interface hci%i not ready,"
+                " and will be skipped for current scan period.",
+                hci,
+            )
+            conn.close()
+            mysocket.close()
+            return False
+        if self.capture is None:
+            btctrl.process = self.process_hci_events
+        else:
+            btctrl.process = partial(self.capture_hci_events, f"hci{hci}")
+        try:
+            await btctrl.send_scan_request(self._active)
+        except RuntimeError as error:
+            _LOGGER.error(
+                "HCI scanner: Runtime error while sending scan request on hci%i: %s.",
+                hci,
+                error,
+            )
+            conn.close()
+            mysocket.close()
+            return False
+        self._scanning[hci] = (mysocket, conn, btctrl)
+        _LOGGER.debug("HCI scanner: connected to hci%i, send_scan_request succeeded.", hci)
+        return True
+
+    async def stop_scanning(self):
+        """Send the stop scan requests and close the HCI sockets."""
+        scanning, self._scanning = self._scanning, {}
+        for hci, (mysocket, conn, btctrl) in scanning.items():
+            try:
+                await btctrl.stop_scan_request()
+            except RuntimeError as error:
+                _LOGGER.error(
+                    "HCI scanner: Runtime error while stop scan request on hci%i: %s.",
+                    hci,
+                    error,
+                )
+            conn.close()
+            mysocket.close()
+
+    def restart(self):
+        """Restart scanning, can be called from any thread."""
+        try:
+            self._event_loop.call_soon_threadsafe(self._restart.set)
+        except (AttributeError, RuntimeError) as error:
+            _LOGGER.debug("%s", error)
+
+    def stop(self, on_stopped=None):
+        """Stop scanning, can be called from any thread.
+
+        on_stopped is called when the scanner has handed over its last data.
+        """
+        _LOGGER.debug("HCI scanner: stopping")
+        self._on_stopped = on_stopped
+        self._stopping = True
+        self.restart()
+        if on_stopped is not None and not self.is_alive():
+            # not started or already finished
+            on_stopped()
+
+    async def async_join(self, timeout=10):
+        """Wait until the scanner is stopped, return False if it took too long."""
+        if self._task is None:
+            return True
+        _, pending = await asyncio.wait([self._task], timeout=timeout)
+        return not pending
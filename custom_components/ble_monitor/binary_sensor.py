@@ -1,6 +1,7 @@
 """Passive BLE monitor binary sensor platform."""
 import asyncio
 import logging
+from collections import deque
 from datetime import timedelta
 
 from homeassistant.components.binary_sensor import BinarySensorEntity
@@ -73,7 +74,7 @@ class BLEupdaterBinary:
         """Initiate BLE updater."""
         _LOGGER.debug("BLE binary sensors updater initialization")
         self.monitor = blemonitor
-        self.dataqueue = blemonitor.dataqueue["binary"].async_q
+        self.dataqueue = blemonitor.dataqueue["binary"]
         self.config = blemonitor.config
         self.period = self.config[CONF_PERIOD]
         self.add_entities = add_entities
@@ -173,16 +174,19 @@ class BLEupdaterBinary:
 
         # Set up new binary sensors when first BLE advertisement is received
         sensors = {}
+        batch = deque()
         while True:
-            try:
-                advevent = await asyncio.wait_for(self.dataqueue.get(), 1)
-                if advevent is None:
-                    _LOGGER.debug("Entities updater loop stopped")
-                    return True
-                data = advevent
-                self.dataqueue.task_done()
-            except asyncio.TimeoutError:
-                pass
+            if not batch:
+                try:
+                    advevents = await asyncio.wait_for(self.dataqueue.get(), 1)
+                    if advevents is None:
+                        _LOGGER.debug("Entities updater loop stopped")
+                        return True
+                    # the BLE advertisements are received in batches
+                    batch.extend(advevents)
+                except asyncio.TimeoutError:
+                    pass
+            data = batch.popleft() if batch else None
             if len(hpriority) > 0:
                 for entity in hpriority:
                     if entity.pending_update is True:
@@ -195,7 +199,7 @@ class BLEupdaterBinary:
                 batt_attr = None
                 device_model = data["type"]
                 firmware = data["firmware"]
-                manufacturer = data["manufacturer"] if "manufacturer" in data else None
+                manufacturer = data.get("manufacturer")
                 # migrate to new model/firmware/manufacturer if changed
                 device_model = RENAMED_MODEL_DICT.get(device_model, device_model)
                 firmware = RENAMED_FIRMWARE_DICT.get(firmware, firmware)
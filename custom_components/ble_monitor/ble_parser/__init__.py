@@ -1,56 +1,18 @@
 """Parser for passive BLE advertisements."""
 import logging
+from itertools import repeat
+from time import monotonic
 from typing import Optional
 
-from .acconeer import parse_acconeer
-from .airmentor import parse_airmentor
-from .almendo import parse_almendo
-from .altbeacon import parse_altbeacon
-from .amazfit import parse_amazfit
-from .atc import parse_atc
-from .beckett import parse_beckett
-from .bluemaestro import parse_bluemaestro
-from .blustream import parse_blustream
-from .bparasite import parse_bparasite
-from .bthome import parse_bthome
-from .chefiq import parse_chefiq
-from .const import JAALEE_TYPES, TILT_TYPES
-from .govee import parse_govee
-from .grundfos import parse_grundfos
+from .arbitration import SourceArbiter
+from .cache import LRUStateMap, PayloadDedupCache
+from .crypto import CipherCache, DecryptionFailures
+from .dispatch import (DISPATCH_TABLE, VENDORS, Advertisement,
+                       build_vendor_table, match_manufacturer_data,
+                       match_service_data)
 from .helpers import to_mac, to_unformatted_mac, to_uuid
-from .hhcc import parse_hhcc
-from .holyiot import parse_holyiot
-from .hormann import parse_hormann
-from .ibeacon import parse_ibeacon
-from .inkbird import parse_inkbird
-from .inode import parse_inode
-from .jaalee import parse_jaalee
-from .jinou import parse_jinou
-from .kegtron import parse_kegtron
-from .kkm import parse_kkm
-from .laica import parse_laica
-from .michelin import parse_michelin_tms
-from .mikrotik import parse_mikrotik
-from .miscale import parse_miscale
-from .moat import parse_moat
-from .mocreo import parse_mocreo
-from .oral_b import parse_oral_b
-from .oras import parse_oras
-from .qingping import parse_qingping
-from .relsib import parse_relsib
-from .ruuvitag import parse_ruuvitag
-from .sensirion import parse_sensirion
-from .sensorpush import parse_sensorpush
-from .senssun import parse_senssun
-from .smartdry import parse_smartdry
-from .sonoff import parse_sonoff
-from .switchbot import parse_switchbot
-from .teltonika import parse_teltonika
-from .thermobeacon import parse_thermobeacon
-from .thermopro import parse_thermopro
-from .tilt import parse_tilt
-from .xiaogui import parse_xiaogui
-from .xiaomi import parse_xiaomi
+from .prefilter import Prefilter
+from .tokenizer import split_hci_event, tokenize_ad_structures
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -65,113 +27,185 @@ class BleParser:
         sensor_whitelist=None,
         tracker_whitelist=None,
         report_unknown_whitelist=None,
-        aeskeys=None
+        aeskeys=None,
+        dedup_ttl=0,
+        dedup_max_size=1024,
+        state_max_size=10000,
+        state_ttl=3600,
+        prefilter=True,
+        vendors=None
     ):
         self.report_unknown = report_unknown
         self.discovery = discovery
         self.filter_duplicates = filter_duplicates
-        if sensor_whitelist is None:
-            self.sensor_whitelist = []
-        else:
-            self.sensor_whitelist = sensor_whitelist
-        if tracker_whitelist is None:
-            self.tracker_whitelist = []
-        else:
-            self.tracker_whitelist = tracker_whitelist
-        if report_unknown_whitelist is None:
-            self.report_unknown_whitelist = []
-        else:
-            self.report_unknown_whitelist = report_unknown_whitelist
+        # whitelists are sets of MAC addresses (6 bytes) and beacon UUIDs (16 bytes)
+        self.sensor_whitelist = {bytes(key) for key in sensor_whitelist or []}
+        self.tracker_whitelist = {bytes(key) for key in tracker_whitelist or []}
+        self.report_unknown_whitelist = {bytes(key) for key in report_unknown_whitelist or []}
+        self.beacon_whitelist = {
+            key
+            for key in self.sensor_whitelist | self.tracker_whitelist | self.report_unknown_whitelist
+            if len(key) == 16
+        }
+        self.whitelist_rejected = 0
         if aeskeys is None:
             self.aeskeys = {}
         else:
             self.aeskeys = aeskeys
+        self.ciphers = CipherCache(self.aeskeys, state_max_size, state_ttl)
 
-        self.lpacket_ids = {}
-        self.movements_list = {}
-        self.adv_priority = {}
-        self.no_key_message = []
+        self.lpacket_ids = LRUStateMap(state_max_size, state_ttl)
+        self.movements_list = LRUStateMap(state_max_size, state_ttl)
+        # priority of the advertisement formats of dual-format devices
+        self.source_arbiter = SourceArbiter(state_max_size, state_ttl)
+        # vendors of which the parsers are used, all vendors if None
+        if vendors is None or set(vendors) >= VENDORS:
+            self.vendors = None
+            self.dispatch_table = DISPATCH_TABLE
+        else:
+            self.vendors = frozenset(vendors)
+            self.dispatch_table = build_vendor_table(self.vendors)
+        # devices without encryption key, the error is logged once per device
+        self.no_key_message = LRUStateMap(state_max_size, state_ttl)
+        self.decryption_failures = DecryptionFailures(max_size=state_max_size, ttl=state_ttl)
+        if dedup_ttl:
+            self.dedup_cache = PayloadDedupCache(dedup_ttl, dedup_max_size)
+        else:
+            self.dedup_cache = None
+        # unknown advertisements are still needed to report them
+        if prefilter and not self.report_unknown:
+            self.prefilter = Prefilter(self.dispatch_table)
+        else:
+            self.prefilter = None
 
-    def parse_raw_data(self, data):
-        """Parse the raw data."""
-        # check if packet is Extended scan result
-        is_ext_packet = True if data[3] == 0x0D else False
-        # check for no BR/EDR + LE General discoverable mode flags
-        adpayload_start = 29 if is_ext_packet else 14
-        # https://www.silabs.com/community/wireless/bluetooth/knowledge-base.entry.html/2017/02/10/bluetooth_advertisin-hGsf
-        try:
-            adpayload_size = data[adpayload_start - 1]
-        except IndexError:
-            return None, None
-        # check for BTLE msg size
-        msg_length = data[2] + 3
-        if (
-            msg_length <= adpayload_start or msg_length != len(data) or msg_length != (
-                adpayload_start + adpayload_size + (0 if is_ext_packet else 1)
+    def stats(self):
+        """Return the sizes and eviction counts of the parser state and caches."""
+        stats = {
+            name: {"size": len(state), "evictions": state.evictions}
+            for name, state in (
+                ("lpacket_ids", self.lpacket_ids),
+                ("movements_list", self.movements_list),
+                ("source_arbitration", self.source_arbiter),
+                ("no_key_message", self.no_key_message),
             )
-        ):
+        }
+        stats["source_arbitration"]["rejected"] = self.source_arbiter.rejected
+        stats["ciphers"] = {"size": len(self.ciphers), "evictions": self.ciphers.evictions}
+        stats["decryption_failures"] = {
+            "size": len(self.decryption_failures),
+            "skipped": self.decryption_failures.skipped,
+        }
+        if self.discovery is False:
+            stats["whitelist"] = {"rejected": self.whitelist_rejected}
+        if self.prefilter is not None:
+            stats["prefilter"] = {
+                "accepted": self.prefilter.accepted,
+                "rejected": self.prefilter.rejected,
+            }
+        if self.dedup_cache is not None:
+            stats["dedup_cache"] = {
+                "size": len(self.dedup_cache),
+                "evictions": self.dedup_cache.evictions,
+                "hits": self.dedup_cache.hits,
+                "misses": self.dedup_cache.misses,
+            }
+        return stats
+
+    def diagnostics(self):
+        """Return the parser statistics and the devices that fail to decrypt."""
+        return {
+            "stats": self.stats(),
+            "decryption_failures": self.decryption_failures.diagnostics(),
+        }
+
+    def parse_raw_data(self, data):
+        """Parse the raw data of a HCI event with a single advertising report."""
+        results = self.parse_hci_event(data)
+        if not results:
             return None, None
-        # extract RSSI byte
-        rssi_index = 18 if is_ext_packet else msg_length - 1
-        rssi = data[rssi_index]
-        # strange positive RSSI workaround
-        if rssi > 127:
-            rssi = rssi - 256
-        # MAC address
-        mac = (data[8 if is_ext_packet else 7:14 if is_ext_packet else 13])[::-1]
-        complete_local_name = ""
-        shortened_local_name = ""
-        service_class_uuid16 = None
-        service_class_uuid128 = None
-        service_data_list = []
-        man_spec_data_list = []
+        return results[0]
+
+    def parse_hci_event(self, data):
+        """Parse all advertising reports in a raw HCI event.
+
+        Returns a list with a (sensor_data, tracker_data) tuple per report.
+        When discovery is disabled, reports of MAC addresses that are not
+        whitelisted are rejected, unless a whitelisted beacon UUID can be in the
+        report. Reports that none of the parsers can handle are rejected by the
+        prefilter. Reports with the same advertising payload as the previous
+        report of the same MAC are answered from the dedup cache (if enabled),
+        without parsing.
+        """
+        return [
+            self.parse_report(data, mac, rssi, adpayload_start, adpayload_size)
+            for mac, rssi, adpayload_start, adpayload_size in split_hci_event(data)
+        ]
+
+    def parse_raw_batch(self, packets, timestamps=None):
+        """Parse a sequence of raw HCI events, e.g. of a capture or a gateway.
 
-        while adpayload_size > 1:
-            adstuct_size = data[adpayload_start] + 1
-            if adstuct_size > 1 and adstuct_size <= adpayload_size:
-                adstruct = data[adpayload_start:adpayload_start + adstuct_size]
-                # https://www.bluetooth.com/specifications/assigned-numbers/generic-access-profile/
-                adstuct_type = adstruct[1]
-                if adstuct_type == 0x02:
-                    # AD type 'Incomplete List of 16-bit Service Class UUIDs'
-                    service_class_uuid16 = (adstruct[2] << 8) | adstruct[3]
-                elif adstuct_type == 0x03:
-                    # AD type 'Complete List of 16-bit Service Class UUIDs'
-                    service_class_uuid16 = (adstruct[2] << 8) | adstruct[3]
-                elif adstuct_type == 0x05:
-                    # AD type 'Complete List of 32-bit Service Class UUIDs'
-                    if mac == b"\x66\x55\x44\x33\x22\x11":
-                        # Sonoff specific data
-                        man_spec_data_list.append(adstruct)
-                elif adstuct_type == 0x06:
-                    # AD type '128-bit Service Class UUIDs'
-                    service_class_uuid128 = adstruct[2:]
-                elif adstuct_type == 0x08:
-                    # AD type 'shortened local name'
-                    try:
-                        shortened_local_name = adstruct[2:].decode("utf-8")
-                    except UnicodeDecodeError:
-                        shortened_local_name = ""
-                elif adstuct_type == 0x09:
-                    # AD type 'complete local name'
-                    try:
-                        complete_local_name = adstruct[2:].decode("utf-8")
-                    except UnicodeDecodeError:
-                        complete_local_name = ""
-                elif adstuct_type == 0x16 and adstuct_size > 4:
-                    # AD type 'Service Data - 16-bit UUID'
-                    service_data_list.append(adstruct)
-                elif adstuct_type == 0xFF:
-                    # AD type 'Manufacturer Specific Data'
-                    man_spec_data_list.append(adstruct)
-                    # https://www.bluetooth.com/specifications/assigned-numbers/company-identifiers/
-            adpayload_size -= adstuct_size
-            adpayload_start += adstuct_size
+        Yields the list of (sensor_data, tracker_data) tuples of each HCI
+        event, as parse_hci_event returns it, in the order of the packets.
+        Events with an invalid length yield an empty list. The optional
+        timestamps are the receive times of the packets in seconds. They are
+        used by the dedup cache instead of the current time, so a capture can
+        be parsed faster than it was recorded. The events are parsed one by
+        one, a batch is not faster than calls of parse_hci_event.
+        """
+        if timestamps is None:
+            batch = zip(packets, repeat(None))
+        else:
+            batch = zip(packets, timestamps, strict=True)
+        for data, now in batch:
+            yield [
+                self.parse_report(data, mac, rssi, adpayload_start, adpayload_size, now)
+                for mac, rssi, adpayload_start, adpayload_size in split_hci_event(data)
+            ]
+
+    def parse_report(self, data, mac, rssi, adpayload_start, adpayload_size, now=None):
+        """Parse one advertising report of a raw HCI event.
 
-        if complete_local_name:
-            local_name = complete_local_name
+        The advertising payload is data[adpayload_start:adpayload_start + adpayload_size].
+        Returns a (sensor_data, tracker_data) tuple. All per-packet state is kept
+        in locals, so reports can be parsed from several threads, as long as the
+        reports of one MAC address are parsed by the same thread (see ParserPool).
+        now is the receive time for the dedup cache, the current time if None.
+        """
+        if self.discovery is False and mac not in self.sensor_whitelist:
+            if (
+                not self.beacon_whitelist
+                and mac not in self.tracker_whitelist
+                and mac not in self.report_unknown_whitelist
+            ):
+                self.whitelist_rejected += 1
+                return None, None
+            # only beacons are parsed, their UUID is checked in the dispatcher
+            beacons_only = True
         else:
-            local_name = shortened_local_name
+            beacons_only = False
+        prefilter = self.prefilter
+        if (
+            prefilter is not None
+            and mac not in self.tracker_whitelist
+            and mac not in self.report_unknown_whitelist
+            and not prefilter.accepts(data, adpayload_start, adpayload_size, mac)
+        ):
+            return None, None
+        dedup_cache = self.dedup_cache
+        if dedup_cache is not None:
+            payload_hash = hash(data[adpayload_start:adpayload_start + adpayload_size])
+            if now is None:
+                now = monotonic()
+            cached = dedup_cache.lookup(mac, payload_hash, now, rssi)
+            if cached is not None:
+                return cached
+        (
+            local_name,
+            service_class_uuid16,
+            service_class_uuid128,
+            service_data_list,
+            man_spec_data_list,
+        ) = tokenize_ad_structures(data, adpayload_start, adpayload_size, mac)
 
         sensor_data, tracker_data = self.parse_advertisement(
             mac,
@@ -180,10 +214,41 @@ class BleParser:
             service_class_uuid128,
             local_name,
             service_data_list,
-            man_spec_data_list
+            man_spec_data_list,
+            beacons_only
         )
+        if dedup_cache is not None:
+            dedup_cache.store(mac, payload_hash, now, sensor_data, tracker_data)
         return sensor_data, tracker_data
 
+    def _dispatch(self, records, matcher, adv, beacons_only=False):
+        """Hand each AD structure to the first matching parser in the dispatch table.
+
+        With beacons_only, only beacons with a whitelisted UUID are parsed.
+        """
+        sensor_data = {}
+        tracker_data = {}
+        uuid = None
+        unknown_sensor = False
+        table = self.dispatch_table
+        for data in records:
+            entry = matcher(data, adv, table)
+            if entry is None:
+                unknown_sensor = True
+                continue
+            if entry.unknown:
+                unknown_sensor = True
+            if entry.handler is not None:
+                if entry.beacon:
+                    uuid = data[6:22]
+                    if not beacons_only or uuid in self.beacon_whitelist:
+                        sensor_data, tracker_data = entry.handler(self, data, adv)
+                elif not beacons_only:
+                    sensor_data = entry.handler(self, data, adv)
+            if entry.stop:
+                break
+        return sensor_data, tracker_data, uuid, unknown_sensor
+
     def parse_advertisement(
             self,
             mac: bytes,
@@ -192,7 +257,8 @@ class BleParser:
             service_class_uuid128: Optional[bytes] = None,
             local_name: Optional[str] = "",
             service_data_list: Optional[list] = None,
-            man_spec_data_list: Optional[list] = None
+            man_spec_data_list: Optional[list] = None,
+            beacons_only: bool = False
     ):
         """parse BLE advertisement"""
         sensor_data = {}
@@ -204,368 +270,44 @@ class BleParser:
         if man_spec_data_list is None:
             man_spec_data_list = []
 
-        while not sensor_data:
-            if service_data_list:
-                for service_data in service_data_list:
-                    # parse data for sensors with service data
-                    uuid16 = (service_data[3] << 8) | service_data[2]
-                    if uuid16 == 0x1809:
-                        # UUID16 = Health Thermometer service (used by Relsib)
-                        if len(service_data_list) == 3:
-                            uuid16_2 = (service_data_list[1][3] << 8) | service_data_list[1][2]
-                            if uuid16_2 == 0x181A:
-                                service_data = b"".join(service_data_list)
-                        sensor_data = parse_relsib(self, service_data, mac)
-                        break
-                    if uuid16 == 0x181A:
-                        # UUID16 = Environmental Sensing (used by ATC or b-parasite)
-                        if len(service_data) == 22 or len(service_data) == 20:
-                            sensor_data = parse_bparasite(self, service_data, mac)
-                        else:
-                            sensor_data = parse_atc(self, service_data, mac)
-                        break
-                    elif uuid16 in [0x181B, 0x181D]:
-                        # UUID16 = Body Composition and Weight Scale (used by Mi Scale)
-                        sensor_data = parse_miscale(self, service_data, mac)
-                        break
-                    elif uuid16 in [0x181C, 0x181E]:
-                        # UUID16 = User Data and Bond Management (used by BTHome)
-                        sensor_data = parse_bthome(self, service_data, uuid16, mac)
-                        break
-                    elif uuid16 == 0x5242:
-                        # UUID16 = HolyIOT
-                        sensor_data = parse_holyiot(self, service_data, mac)
-                        break
-                    elif uuid16 in [0xAA20, 0xAA21, 0xAA22] and local_name == "ECo":
-                        # UUID16 = Relsib
-                        sensor_data = parse_relsib(self, service_data, mac)
-                        break
-                    elif uuid16 in [0xF51C, 0xF525]:
-                        # UUID16 = Jaalee
-                        sensor_data = parse_jaalee(self, service_data, mac)
-                        break
-                    elif uuid16 == 0xFCD2:
-                        # UUID16 = Allterco Robotics ltd (BTHome V2)
-                        sensor_data = parse_bthome(self, service_data, uuid16, mac)
-                        break
-                    elif uuid16 in [0xFD3D, 0x0D00]:
-                        # UUID16 = unknown (used by Switchbot)
-                        sensor_data = parse_switchbot(self, service_data, mac)
-                        break
-                    elif uuid16 == 0xFD50:
-                        # UUID16 = Hangzhou Tuya Information Technology Co., Ltd (HHCC)
-                        sensor_data = parse_hhcc(self, service_data, mac)
-                        break
-                    elif uuid16 == 0xFDCD:
-                        # UUID16 = Qingping
-                        sensor_data = parse_qingping(self, service_data, mac)
-                        break
-                    elif uuid16 == 0xFE95:
-                        # UUID16 = Xiaomi
-                        sensor_data = parse_xiaomi(self, service_data, mac)
-                        break
-                    elif uuid16 == 0xFEAA:
-                        if len(service_data) == 19:
-                            # UUID16 = Google (used by KKM)
-                            sensor_data = parse_kkm(self, service_data, mac)
-                            break
-                        elif len(service_data) >= 23:
-                            # UUID16 = Google (used by Ruuvitag V2/V4)
-                            sensor_data = parse_ruuvitag(self, service_data, mac)
-                            break
-                    elif uuid16 == 0xFEE0:
-                        # UUID16 = Anhui Huami Information Technology Co., Ltd. (Amazfit)
-                        if man_spec_data_list:
-                            man_spec_data = man_spec_data_list[0]
-                        else:
-                            man_spec_data = None
-                        sensor_data = parse_amazfit(self, service_data, man_spec_data, mac)
-                    elif uuid16 == 0xFFF9:
-                        # UUID16 = FIDO (used by Cleargrass)
-                        sensor_data = parse_qingping(self, service_data, mac)
-                        break
-                    elif uuid16 == 0x2A6E or uuid16 == 0x2A6F:
-                        # UUID16 = Temperature and Humidity (used by Teltonika)
-                        if len(service_data_list) == 2:
-                            service_data = b"".join(service_data_list)
-                        sensor_data = parse_teltonika(self, service_data, local_name, mac)
-                        break
-                    else:
-                        unknown_sensor = True
-            elif man_spec_data_list:
-                for man_spec_data in man_spec_data_list:
-                    # parse data for sensors with manufacturer specific data
-                    comp_id = (man_spec_data[3] << 8) | man_spec_data[2]
-                    data_len = man_spec_data[0]
-                    # Filter on Company Identifier
-                    if comp_id == 0x0828:
-                        # Michelin TMS
-                        sensor_data = parse_michelin_tms(self, man_spec_data, mac)
-                        break
-                    if comp_id == 0x0001 and data_len in [0x09, 0x0C, 0x22, 0x25]:
-                        # Govee H5101/H5102/H5106/H5177
-                        sensor_data = parse_govee(self, man_spec_data, service_class_uuid16, local_name, mac)
-                        break
-                    elif comp_id == 0x004C and man_spec_data[4] == 0x02:
-                        # iBeacon
-                        if int.from_bytes(man_spec_data[6:22], byteorder='big') in TILT_TYPES:
-                            # Tilt
-                            sensor_data, tracker_data = parse_tilt(self, man_spec_data, mac)
-                            uuid = man_spec_data[6:22]
-                            break
-                        elif int.from_bytes(man_spec_data[6:22], byteorder='big') in JAALEE_TYPES:
-                            # Jaalee
-                            sensor_data = parse_jaalee(self, man_spec_data, mac)
-                            break
-                        elif len(man_spec_data_list) == 2:
-                            # Teltonika Eye (can send both iBeacon and Teltonika data in one message)
-                            second_man_spec_data = man_spec_data_list[1]
-                            second_comp_id = (second_man_spec_data[3] << 8) | second_man_spec_data[2]
-                            if second_comp_id == 0x089A:
-                                sensor_data = parse_teltonika(self, second_man_spec_data, local_name, mac)
-                                break
-                        else:
-                            # iBeacon
-                            sensor_data, tracker_data = parse_ibeacon(self, man_spec_data, mac)
-                            uuid = man_spec_data[6:22]
-                            break
-                    elif comp_id == 0x00DC and data_len == 0x0E:
-                        # Oral-b
-                        sensor_data = parse_oral_b(self, man_spec_data, mac)
-                        break
-                    elif comp_id == 0x05CD and data_len == 0x15:
-                        # Chef iQ
-                        sensor_data = parse_chefiq(self, man_spec_data, mac)
-                        break
-                    elif comp_id == 0x0131:
-                        # Oras
-                        sensor_data = parse_oras(self, man_spec_data, mac)
-                        break
-                    elif comp_id == 0x0157 and data_len == 0x1B:
-                        # Miband
-                        sensor_data = parse_amazfit(self, None, man_spec_data, mac)
-                        break
-                    elif comp_id == 0x0194 and data_len == 0x0C:
-                        # Blustream
-                        sensor_data = parse_blustream(self, man_spec_data, mac)
-                        break
-                    elif comp_id == 0x0499:
-                        # Ruuvitag V3/V5
-                        sensor_data = parse_ruuvitag(self, man_spec_data, mac)
-                        break
-                    elif comp_id == 0x0757:
-                        # Teltonika (Ela rebrand)
-                        if len(man_spec_data_list) == 2:
-                            man_spec_data = b"".join(man_spec_data_list)
-                        sensor_data = parse_teltonika(self, man_spec_data, local_name, mac)
-                        break
-                    elif comp_id == 0x07B4:
-                        # Hörmann
-                        if len(man_spec_data_list) == 2:
-                            man_spec_data = b"".join(man_spec_data_list)
-                        sensor_data = parse_hormann(self, man_spec_data, mac)
-                        break
-                    elif comp_id == 0x089A:
-                        # Teltonika
-                        sensor_data = parse_teltonika(self, man_spec_data, local_name, mac)
-                        break
-                    elif comp_id == 0x094F and data_len == 0x15:
-                        # Mikrotik
-                        sensor_data = parse_mikrotik(self, man_spec_data, mac)
-                        break
-                    elif comp_id == 0x06E8:
-                        # Almendo (Blusensor)
-                        sensor_data = parse_almendo(self, man_spec_data, mac)
-                        break
-                    elif comp_id == 0x1000 and data_len == 0x15:
-                        # Moat S2
-                        sensor_data = parse_moat(self, man_spec_data, mac)
-                        break
-                    elif comp_id == 0x0133 and data_len in [0x11, 0x15]:
-                        # BlueMaestro
-                        sensor_data = parse_bluemaestro(self, man_spec_data, mac)
-                        break
-                    elif comp_id == 0x01AE and data_len == 0x0F:
-                        # SmartDry
-                        sensor_data = parse_smartdry(self, man_spec_data, mac)
-                        break
-                    elif comp_id == 0x06D5:
-                        # Sensirion
-                        sensor_data = parse_sensirion(self, man_spec_data, local_name, mac)
-                        break
-                    elif comp_id in [0x2111, 0x2112, 0x2121, 0x2122] and data_len == 0x0B:
-                        # Air Mentor
-                        sensor_data = parse_airmentor(self, man_spec_data, mac)
-                        break
-                    elif comp_id == 0x2730 and data_len in [0x14, 0x2D]:
-                        # Govee H5182
-                        sensor_data = parse_govee(self, man_spec_data, service_class_uuid16, local_name, mac)
-                        break
-                    elif comp_id == 0x1B36 and data_len in [0x14, 0x2D]:
-                        # Govee H5184
-                        sensor_data = parse_govee(self, man_spec_data, service_class_uuid16, local_name, mac)
-                        break
-                    elif comp_id in [0x4A32, 0x332, 0x4C32] and data_len in [0x17, 0x2D]:
-                        # Govee H5185
-                        sensor_data = parse_govee(self, man_spec_data, service_class_uuid16, local_name, mac)
-                        break
-                    elif comp_id in [0x67DD, 0xE02F, 0xF79F] and data_len in [0x11, 0x2A]:
-                        # Govee H5183
-                        sensor_data = parse_govee(self, man_spec_data, service_class_uuid16, local_name, mac)
-                    elif comp_id in [0x5112, 0x5122, 0x6111, 0x6121] and data_len == 0x0f:
-                        # Air Mentor 2S
-                        sensor_data = parse_airmentor(self, man_spec_data, mac)
-                        break
-                    elif comp_id == 0x8801 and data_len in [0x0C, 0x25]:
-                        # Govee H5179
-                        sensor_data = parse_govee(self, man_spec_data, service_class_uuid16, local_name, mac)
-                        break
-                    elif comp_id == 0xAA55 and data_len == 0x14:
-                        # Thermobeacon
-                        sensor_data = parse_thermobeacon(self, man_spec_data, mac)
-                        break
-                    elif comp_id == 0xAC63 and data_len in [0x17, 0x2D]:
-                        # Govee H5191
-                        sensor_data = parse_govee(self, man_spec_data, service_class_uuid16, local_name, mac)
-                        break
-                    elif comp_id == 0xEA1C and data_len == 0x17:
-                        # Govee H50555
-                        sensor_data = parse_govee(self, man_spec_data, service_class_uuid16, local_name, mac)
-                        break
-                    elif comp_id == 0xEC88 and data_len in [0x09, 0x0A, 0x0C, 0x22, 0x24, 0x25]:
-                        # Govee H5051/H5071/H5072/H5075/H5074
-                        sensor_data = parse_govee(self, man_spec_data, service_class_uuid16, local_name, mac)
-                        break
-                    elif comp_id == 0xF214 and data_len == 0x16:
-                        # Grundfos
-                        sensor_data = parse_grundfos(self, man_spec_data, mac)
-                        break
-                    elif comp_id == 0xFFFF and man_spec_data[4:6] == b"\xee\x1b" and mac == b"\x66\x55\x44\x33\x22\x11":
-                        # Sonoff
-                        sensor_data = parse_sonoff(self, man_spec_data, mac)
-                        break
-                    elif comp_id == 0xFFFF and data_len == 0x1E:
-                        # Kegtron
-                        sensor_data = parse_kegtron(self, man_spec_data, mac)
-                        break
-                    elif comp_id == 0xA0AC and data_len == 0x0F and man_spec_data[14] in [0x06, 0x0D]:
-                        # Laica
-                        sensor_data = parse_laica(self, man_spec_data, mac)
-                        break
-                    elif comp_id == 0x0100 and data_len == 0x14:
-                        # Senssun IF_B7
-                        sensor_data = parse_senssun(self, man_spec_data, mac)
-                        break
-                    elif comp_id == 0x061A:
-                        # R.W. Beckett heating systems
-                        sensor_data = parse_beckett(self, man_spec_data, mac)
-                        break
-                    # Filter on part of the UUID16
-                    elif man_spec_data[2] == 0xC0 and data_len == 0x10:
-                        # Xiaogui Scale
-                        sensor_data = parse_xiaogui(self, man_spec_data, mac)
-                        break
-                    elif man_spec_data[3] == 0x82 and data_len == 0x0E:
-                        # iNode
-                        sensor_data = parse_inode(self, man_spec_data, mac)
-                        break
-                    elif man_spec_data[3] in [
-                        0x91, 0x92, 0x93, 0x94, 0x95, 0x96, 0x9A, 0x9B, 0x9C, 0x9D
-                    ] and data_len == 0x19:
-                        # iNode Care Sensors
-                        sensor_data = parse_inode(self, man_spec_data, mac)
-                        break
-
-                    # Filter on service class uuid16
-                    elif service_class_uuid16 == 0x20AA and data_len == 0x0E:
-                        # Jinou BEC07-5
-                        sensor_data = parse_jinou(self, man_spec_data, mac)
-                        break
-                    elif service_class_uuid16 in [0x5182, 0x5184] and data_len in [0x14, 0x2D]:
-                        # Govee H5182 and H5184
-                        sensor_data = parse_govee(self, man_spec_data, service_class_uuid16, local_name, mac)
-                        break
-                    elif service_class_uuid16 == 0x5183 and data_len in [0x11, 0x2A]:
-                        # Govee H5183
-                        sensor_data = parse_govee(self, man_spec_data, service_class_uuid16, local_name, mac)
-                        break
-                    elif service_class_uuid16 in [0x5185, 0x5198] and data_len in [0x17, 0x30]:
-                        # Govee H5185 and H5198
-                        sensor_data = parse_govee(self, man_spec_data, service_class_uuid16, local_name, mac)
-                        break
-                    elif service_class_uuid16 == 0xF0FF:
-                        if comp_id in [0x0010, 0x0011, 0x0015, 0x0018, 0x001B] and data_len in [0x15, 0x17]:
-                            # Thermobeacon
-                            sensor_data = parse_thermobeacon(self, man_spec_data, mac)
-                            break
-                        elif (comp_id in [0x0000, 0x0001] or local_name in ["iBBQ", "xBBQ", "sps", "tps"]) and (
-                            data_len in [0x0A, 0x0D, 0x0F, 0x13, 0x17]
-                        ):
-                            # Inkbird
-                            sensor_data = parse_inkbird(self, man_spec_data, local_name, mac)
-                            break
-                        elif comp_id == 0x004A and local_name == "ST7" and data_len == 0x11:
-                            # Mocreo ST7, see below under local_name checks for the other Mocreo models
-                            sensor_data = parse_mocreo(self, man_spec_data, local_name, mac)
-                            break
-                        else:
-                            unknown_sensor = True
-
-                    # Filter on service class uuid128
-                    elif service_class_uuid128 == (
-                        b'\xb0\x0a\x09\xec\xd7\x9d\xb8\x93\xba\x42\xd6\x11\x00\x00\x09\xef'
-                    ) and data_len in [0x06, 0x08]:
-                        # Sensorpush
-                        sensor_data = parse_sensorpush(self, man_spec_data, mac)
-                        break
-
-                    # Filter on complete local name
-                    elif local_name in ["sps", "tps"] and data_len == 0x0A:
-                        # Inkbird IBS-TH
-                        sensor_data = parse_inkbird(self, man_spec_data, local_name, mac)
-                        break
-                    elif local_name == "MOCREO" and data_len == 0x13:
-                        # MOCREO non-ST7 models, see above in the service_class_uuid16 == 0xF0FF elif for ST7
-                        sensor_data = parse_mocreo(self, man_spec_data, local_name, mac)
-                        break
-                    elif local_name[0:5] in ["TP357", "TP359"] and data_len >= 0x07:
-                        # Thermopro
-                        sensor_data = parse_thermopro(self, man_spec_data, local_name[0:5], mac)
-                        break
-
-                    # Filter on other parts of the manufacturer specific data
-                    elif data_len == 0x1B and ((man_spec_data[4] << 8) | man_spec_data[5]) == 0xBEAC:
-                        # AltBeacon
-                        sensor_data, tracker_data = parse_altbeacon(self, man_spec_data, comp_id, mac)
-                        uuid = man_spec_data[6:22]
-                        break
-
-                    elif man_spec_data[0] == 0x12 and comp_id == 0xACC0:  # Acconeer
-                        sensor_data = parse_acconeer(self, man_spec_data, mac)
-                        break
-                    else:
-                        unknown_sensor = True
-            else:
-                unknown_sensor = True
-            if unknown_sensor and self.report_unknown == "Other":
-                _LOGGER.info(
-                    "Unknown advertisement received for mac: %s"
-                    "service data: %s"
-                    "manufacturer specific data: %s"
-                    "local name: %s"
-                    "UUID16: %s,"
-                    "UUID128: %s",
-                    to_mac(mac),
-                    service_data_list,
-                    man_spec_data_list,
-                    local_name,
-                    service_class_uuid16,
-                    service_class_uuid128,
-                )
-            break
+        adv = Advertisement(
+            mac,
+            local_name,
+            service_class_uuid16,
+            service_class_uuid128,
+            service_data_list,
+            man_spec_data_list
+        )
+        if service_data_list:
+            # parse data for sensors with service data
+            sensor_data, tracker_data, uuid, unknown_sensor = self._dispatch(
+                service_data_list, match_service_data, adv, beacons_only
+            )
+        elif man_spec_data_list:
+            # parse data for sensors with manufacturer specific data
+            sensor_data, tracker_data, uuid, unknown_sensor = self._dispatch(
+                man_spec_data_list, match_manufacturer_data, adv, beacons_only
+            )
+        else:
+            unknown_sensor = True
+        if unknown_sensor and self.report_unknown == "Other":
+            _LOGGER.info(
+                "Unknown advertisement received for mac: %s"
+                "service data: %s"
+                "manufacturer specific data: %s"
+                "local name: %s"
+                "UUID16: %s,"
+                "UUID128: %s",
+                to_mac(mac),
+                service_data_list,
+                man_spec_data_list,
+                local_name,
+                service_class_uuid16,
+                service_class_uuid128,
+            )
 
         # Ignore sensor data for MAC addresses not in sensor whitelist, when discovery is disabled
-        if self.discovery is False and mac not in self.sensor_whitelist:
+        if self.discovery is False and not uuid and mac not in self.sensor_whitelist:
             _LOGGER.debug("Discovery is disabled. MAC: %s is not whitelisted!", to_mac(mac))
             sensor_data = None
         # Ignore sensor data for UUID not in sensor whitelist, when discovery is disabled
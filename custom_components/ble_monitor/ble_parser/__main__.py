@@ -0,0 +1,181 @@
+"""Parse BLE advertisements outside Home Assistant.
+
+Reads raw HCI events from hex lines, btsnoop captures or BLE monitor capture
+files, from a file or from stdin, and writes the parse results as JSON lines
+to stdout:
+
+    python -m ble_monitor.ble_parser capture.log --keys keys.txt --stats
+
+A hex line holds one HCI event, optionally preceded by its timestamp in
+seconds. A keys file holds a MAC address and its encryption key per line.
+"""
+import argparse
+import io
+import json
+import logging
+import sys
+from collections import Counter
+from itertools import islice
+from time import perf_counter
+from typing import Iterable, Iterator, Optional
+
+from . import BleParser
+from .btsnoop import BTSNOOP_MAGIC, read_btsnoop
+from .capture import CAPTURE_MAGIC, read_capture
+from .dispatch import VENDORS
+from .helpers import identifier_from_string
+
+_LOGGER = logging.getLogger(__name__)
+
+# Number of HCI events that are parsed as one batch
+BATCH_SIZE = 256
+
+
+def read_hex(lines: Iterable[str]) -> Iterator[tuple[bytes, Optional[float]]]:
+    """Yield the HCI events of hex lines with their timestamp (None if there is none)."""
+    for line_number, line in enumerate(lines, 1):
+        fields = line.split()
+        if not fields or fields[0].startswith("#"):
+            continue
+        try:
+            if len(fields) == 1:
+                yield bytes.fromhex(fields[0]), None
+            elif len(fields) == 2:
+                yield bytes.fromhex(fields[1]), float(fields[0])
+            else:
+                raise ValueError("too many fields")
+        except ValueError as error:
+            _LOGGER.warning("Line %i skipped, %s: %s", line_number, error, line.strip())
+
+
+def read_packets(stream: io.BufferedReader) -> Iterator[tuple[bytes, Optional[float]]]:
+    """Yield the HCI events of a btsnoop capture, a capture file or hex lines with their timestamp."""
+    magic = stream.peek(len(BTSNOOP_MAGIC))
+    if magic.startswith(BTSNOOP_MAGIC):
+        return read_btsnoop(stream)
+    if magic.startswith(CAPTURE_MAGIC):
+        return ((data, timestamp) for timestamp, _, data in read_capture(stream))
+    return read_hex(io.TextIOWrapper(stream, encoding="ascii", errors="replace"))
+
+
+def load_keys(path: str) -> dict:
+    """Return the encryption keys of a keys file, by MAC address (or UUID)."""
+    aeskeys = {}
+    with open(path, encoding="utf-8") as keys_file:
+        for line_number, line in enumerate(keys_file, 1):
+            fields = line.split()
+            if not fields or fields[0].startswith("#"):
+                continue
+            device = identifier_from_string(fields[0])
+            try:
+                key = bytes.fromhex(fields[1]) if len(fields) == 2 else b""
+            except ValueError:
+                key = b""
+            if device is None or len(key) not in (12, 16):
+                raise ValueError(f"{path}:{line_number}: expected a MAC address and a 24 or 32 digit key")
+            aeskeys[device.raw] = key
+    return aeskeys
+
+
+def parse_stream(ble_parser: BleParser, packets: Iterator, output) -> tuple[Counter, Counter]:
+    """Parse the packets in batches and write the results as JSON lines.
+
+    Returns the counts of packets, reports, sensor and tracker results, and
+    the counts of sensor results per firmware.
+    """
+    counts = Counter()
+    firmware = Counter()
+    while True:
+        batch = list(islice(packets, BATCH_SIZE))
+        if not batch:
+            return counts, firmware
+        events = [data for data, _ in batch]
+        timestamps = [timestamp for _, timestamp in batch]
+        for timestamp, results in zip(timestamps, ble_parser.parse_raw_batch(events, timestamps)):
+            counts["packets"] += 1
+            for sensor_data, tracker_data in results:
+                counts["reports"] += 1
+                result = {}
+                if timestamp is not None:
+                    result["timestamp"] = timestamp
+                if sensor_data:
+                    counts["sensor"] += 1
+                    firmware[sensor_data.get("firmware")] += 1
+                    result["sensor"] = sensor_data
+                if tracker_data:
+                    counts["tracker"] += 1
+                    result["tracker"] = tracker_data
+                if "sensor" in result or "tracker" in result:
+                    output.write(json.dumps(result, default=str) + "\n")
+        output.flush()
+
+
+def stats_report(counts: Counter, firmware: Counter, seconds: float, parser_stats: dict) -> dict:
+    """Return the statistics of a run."""
+    return {
+        "packets": counts["packets"],
+        "reports": counts["reports"],
+        "sensor": counts["sensor"],
+        "tracker": counts["tracker"],
+        "seconds": round(seconds, 3),
+        "packets_per_second": round(counts["packets"] / seconds) if seconds else None,
+        "firmware": dict(firmware.most_common()),
+        "parser": parser_stats,
+    }
+
+
+def main(argv=None) -> None:
+    """Run the command line interface."""
+    parser = argparse.ArgumentParser(
+        prog="python -m ble_monitor.ble_parser",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("input", nargs="?", help="hex lines or capture file, stdin if omitted")
+    parser.add_argument("--keys", help="file with a MAC address and encryption key per line")
+    parser.add_argument(
+        "--whitelist", action="append", metavar="MAC", help="only parse this device (repeatable)"
+    )
+    parser.add_argument(
+        "--vendor", action="append", choices=sorted(VENDORS), help="only use this parser (repeatable)"
+    )
+    parser.add_argument("--filter-duplicates", action="store_true", help="skip repeated packet ids")
+    parser.add_argument("--dedup-ttl", type=float, default=0, help="seconds to skip repeated payloads")
+    parser.add_argument("--stats", action="store_true", help="report statistics to stderr at the end")
+    parser.add_argument("--verbose", "-v", action="store_true", help="log debug messages to stderr")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING, stream=sys.stderr)
+
+    try:
+        aeskeys = load_keys(args.keys) if args.keys else {}
+    except (OSError, ValueError) as error:
+        parser.error(str(error))
+    whitelist = []
+    for mac in args.whitelist or []:
+        device = identifier_from_string(mac)
+        if device is None:
+            parser.error(f"invalid MAC address or UUID: {mac}")
+        whitelist.append(device.raw)
+
+    ble_parser = BleParser(
+        discovery=not whitelist,
+        filter_duplicates=args.filter_duplicates,
+        sensor_whitelist=whitelist,
+        tracker_whitelist=whitelist,
+        aeskeys=aeskeys,
+        dedup_ttl=args.dedup_ttl,
+        vendors=args.vendor,
+    )
+    start = perf_counter()
+    if args.input:
+        with open(args.input, "rb") as stream:
+            counts, firmware = parse_stream(ble_parser, read_packets(stream), sys.stdout)
+    else:
+        counts, firmware = parse_stream(ble_parser, read_packets(sys.stdin.buffer), sys.stdout)
+    seconds = perf_counter() - start
+    if args.stats:
+        sys.stderr.write(json.dumps(stats_report(counts, firmware, seconds, ble_parser.stats())) + "\n")
+
+
+if __name__ == "__main__":
+    main()
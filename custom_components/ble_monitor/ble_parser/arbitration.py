@@ -0,0 +1,66 @@
+"""Arbitration between the advertisement formats of dual-format devices"""
+from time import monotonic
+
+from .cache import LRUStateMap
+
+# Results of SourceArbiter.arbitrate
+HIGHER = 1
+SAME = 0
+LOWER = -1
+
+
+class SourceArbiter:
+    """Per device priority of the advertisement formats it sends.
+
+    Some devices send the same measurements in more than one format, e.g. a
+    LYWSD03MMC with custom firmware sends both ATC and MiBeacon advertisements.
+    Each parser declares a priority for its formats and asks the arbiter before
+    decoding or decrypting an advertisement. Formats with a lower priority than
+    the best format of the device are rejected. The stored priority decreases
+    by one for every rejected advertisement, so a lower priority format takes
+    over when the device stops sending the better one.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = 3600, timer=monotonic):
+        self.rejected = 0
+        # mac: priority of the best format
+        self._priorities = LRUStateMap(max_size, ttl, timer)
+
+    def arbitrate(self, mac: bytes, priority: int) -> int:
+        """Compare the priority with the best format of the device.
+
+        Return HIGHER for a new best format, SAME for the best format (the
+        caller filters duplicates) and LOWER when the advertisement has to be
+        rejected.
+        """
+        priorities = self._priorities
+        try:
+            best = priorities[mac]
+        except KeyError:
+            # start with initial priority
+            best = 0
+        if priority > best:
+            # always process advertisements with a higher priority
+            priorities[mac] = priority
+            return HIGHER
+        if priority == best:
+            return SAME
+        # do not process advertisements with lower priority
+        priorities[mac] = best - 1
+        self.rejected += 1
+        return LOWER
+
+    def release(self, mac: bytes):
+        """Forget the best format of the device, e.g. when it can't be decrypted."""
+        try:
+            del self._priorities[mac]
+        except KeyError:
+            pass
+
+    @property
+    def evictions(self) -> int:
+        """Number of devices evicted from the arbitration state"""
+        return self._priorities.evictions
+
+    def __len__(self):
+        return len(self._priorities)
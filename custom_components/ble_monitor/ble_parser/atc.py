@@ -2,22 +2,67 @@
 import logging
 from struct import unpack
 
-from Cryptodome.Cipher import AES
-
+from .arbitration import LOWER, SAME
 from .helpers import to_mac, to_unformatted_mac
 
 _LOGGER = logging.getLogger(__name__)
 
 
+# Priority of the ATC formats in the source arbitration, by message length.
+# The formats of the custom firmware have a higher priority than MiBeacon (19)
+ATC_PRIORITY = {
+    19: 39,  # Custom format
+    17: 29,  # Atc1441 format
+    15: 39,  # Custom format with encryption
+    12: 9,  # Atc1441 format with encryption
+}
+
+
 def parse_atc(self, data: bytes, mac: bytes):
     """Parse ATC BLE advertisements"""
     device_type = "ATC"
     msg_length = len(data)
     if msg_length == 19:
-        # Parse BLE message in Custom format without encryption
         firmware = "ATC (Custom)"
         atc_mac_reversed = data[4:10]
         atc_mac = atc_mac_reversed[::-1]
+        packet_id = data[17]
+    elif msg_length == 17:
+        firmware = "ATC (Atc1441)"
+        atc_mac = data[4:10]
+        packet_id = data[16]
+    elif msg_length == 15:
+        firmware = "ATC (Custom encrypted)"
+        atc_mac = mac
+        packet_id = data[4]
+    elif msg_length == 12:
+        firmware = "ATC (Atc1441 encrypted)"
+        atc_mac = mac
+        packet_id = data[4]
+    else:
+        if self.report_unknown == "ATC":
+            _LOGGER.info(
+                "BLE ADV from UNKNOWN ATC DEVICE: MAC: %s, AdStruct: %s",
+                to_mac(mac),
+                data.hex()
+            )
+        return None
+
+    # reject lower priority formats and duplicates before decoding
+    arbitration = self.source_arbiter.arbitrate(atc_mac, ATC_PRIORITY[msg_length])
+    if arbitration == LOWER:
+        return None
+    if arbitration == SAME and self.filter_duplicates is True:
+        # only process messages with same priority that have a changed packet id
+        try:
+            if self.lpacket_ids[atc_mac] == packet_id:
+                return None
+        except KeyError:
+            pass
+    self.lpacket_ids[atc_mac] = packet_id
+
+    if msg_length == 19:
+        # Parse BLE message in Custom format without encryption
         (temp, humi, volt, batt, packet_id, trg) = unpack("<hHHBBB", data[10:])
         result = {
             "temperature": temp / 100,
@@ -29,11 +74,8 @@ def parse_atc(self, data: bytes, mac: bytes):
             "status": "opened",
             "data": True
         }
-        adv_priority = 39
     elif msg_length == 17:
         # Parse BLE message in ATC format
-        firmware = "ATC (Atc1441)"
-        atc_mac = data[4:10]
         (temp, humi, batt, volt, packet_id) = unpack(">hBBHB", data[10:])
         result = {
             "temperature": temp / 10,
@@ -42,17 +84,14 @@ def parse_atc(self, data: bytes, mac: bytes):
             "battery": batt,
             "data": True
         }
-        adv_priority = 29
-    elif msg_length == 15:
-        # Parse BLE message in Custom format with encryption
-        atc_mac = mac
-        packet_id = data[4]
-        firmware = "ATC (Custom encrypted)"
+    else:
         decrypted_data = decrypt_atc(self, data, atc_mac)
         if decrypted_data is None:
+            # a format that can't be decrypted should not block the other formats
+            self.source_arbiter.release(atc_mac)
             result = {"data": False}
-            adv_priority = 0
-        else:
+        elif msg_length == 15:
+            # Parse BLE message in Custom format with encryption
             (temp, humi, batt, trg) = unpack("<hHBB", decrypted_data)
             if batt > 100:
                 batt = 100
@@ -67,17 +106,8 @@ def parse_atc(self, data: bytes, mac: bytes):
                 "status": "opened",
                 "data": True
             }
-            adv_priority = 39
-    elif msg_length == 12:
-        # Parse BLE message in Atc1441 format with encryption
-        atc_mac = mac
-        packet_id = data[4]
-        firmware = "ATC (Atc1441 encrypted)"
-        decrypted_data = decrypt_atc(self, data, atc_mac)
-        if decrypted_data is None:
-            result = {"data": False}
-            adv_priority = 0
         else:
+            # Parse BLE message in Atc1441 format with encryption
             temp = decrypted_data[0] / 2 - 40.0
             humi = decrypted_data[1] / 2
             batt = decrypted_data[2] & 0x7f
@@ -93,40 +123,6 @@ def parse_atc(self, data: bytes, mac: bytes):
                 "switch": trg,
                 "data": True
             }
-            adv_priority = 9
-    else:
-        if self.report_unknown == "ATC":
-            _LOGGER.info(
-                "BLE ADV from UNKNOWN ATC DEVICE: MAC: %s, AdStruct: %s",
-                to_mac(mac),
-                data.hex()
-            )
-        return None
-
-    try:
-        prev_packet = self.lpacket_ids[atc_mac]
-    except KeyError:
-        # start with empty first packet
-        prev_packet = None
-    try:
-        old_adv_priority = self.adv_priority[atc_mac]
-    except KeyError:
-        # start with initial adv priority
-        old_adv_priority = 0
-    if adv_priority > old_adv_priority:
-        # always process advertisements with a higher priority
-        self.adv_priority[atc_mac] = adv_priority
-    elif adv_priority == old_adv_priority:
-        if self.filter_duplicates is True:
-            # only process messages with same priority that have a changed packet id
-            if prev_packet == packet_id:
-                return None
-    else:
-        # do not process advertisements with lower priority
-        old_adv_priority -= 1
-        self.adv_priority[atc_mac] = old_adv_priority
-        return None
-    self.lpacket_ids[atc_mac] = packet_id
 
     result.update({
         "mac": to_unformatted_mac(atc_mac),
@@ -148,22 +144,25 @@ def decrypt_atc(self, data, atc_mac):
         # no encryption key found
         _LOGGER.error("No encryption key found for ATC device with MAC: %s", to_mac(atc_mac))
         return None
+    if self.decryption_failures.skip(atc_mac):
+        return None
     # prepare the data for decryption
     nonce = b"".join([atc_mac[::-1], data[:5]])
     cipherpayload = data[5:-4]
     aad = b"\x11"
     token = data[-4:]
-    cipher = AES.new(key, AES.MODE_CCM, nonce=nonce, mac_len=4)
-    cipher.update(aad)
+    cipher = self.ciphers.get(key)
     # decrypt the data
     try:
-        decrypted_payload = cipher.decrypt_and_verify(cipherpayload, token)
+        decrypted_payload = cipher.decrypt_and_verify(nonce, cipherpayload, token, aad)
     except ValueError as error:
-        _LOGGER.warning("Decryption failed: %s", error)
-        _LOGGER.debug("token: %s", token.hex())
-        _LOGGER.debug("nonce: %s", nonce.hex())
-        _LOGGER.debug("encrypted_payload: %s", cipherpayload.hex())
+        if self.decryption_failures.failure(atc_mac):
+            _LOGGER.warning("Decryption failed: %s", error)
+            _LOGGER.debug("token: %s", token.hex())
+            _LOGGER.debug("nonce: %s", nonce.hex())
+            _LOGGER.debug("encrypted_payload: %s", cipherpayload.hex())
         return None
+    self.decryption_failures.success(atc_mac)
     if decrypted_payload is None:
         _LOGGER.warning(
             "Decryption failed for %s, decrypted payload is None",
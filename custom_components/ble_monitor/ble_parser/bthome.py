@@ -2,9 +2,7 @@
 import logging
 import struct
 from datetime import datetime, timezone
-from typing import Any
-
-from Cryptodome.Cipher import AES
+from typing import Any, Callable, NamedTuple
 
 from .bthome_const import BUTTON_EVENTS, DIMMER_EVENTS, MEAS_TYPES
 from .helpers import to_mac, to_unformatted_mac
@@ -12,35 +10,28 @@ from .helpers import to_mac, to_unformatted_mac
 _LOGGER = logging.getLogger(__name__)
 
 
+def _decimal_places(factor: float) -> int:
+    """Return the number of decimal places of a factor."""
+    return -int(f"{factor:e}".split("e")[-1])
+
+
 def parse_uint(data_obj: bytes, factor: float = 1.0) -> float:
     """Convert bytes (as unsigned integer) and factor to float."""
-    decimal_places = -int(f"{factor:e}".split("e")[-1])
     return round(
-        int.from_bytes(data_obj, "little", signed=False) * factor, decimal_places
+        int.from_bytes(data_obj, "little", signed=False) * factor, _decimal_places(factor)
     )
 
 
 def parse_int(data_obj: bytes, factor: float = 1.0) -> float:
     """Convert bytes (as signed integer) and factor to float."""
-    decimal_places = -int(f"{factor:e}".split("e")[-1])
     return round(
-        int.from_bytes(data_obj, "little", signed=True) * factor, decimal_places
+        int.from_bytes(data_obj, "little", signed=True) * factor, _decimal_places(factor)
     )
 
 
 def parse_float(data_obj: bytes, factor: float = 1.0):
     """Convert bytes (as float) and factor to float."""
-    decimal_places = -int(f"{factor:e}".split("e")[-1])
-    if len(data_obj) == 2:
-        [val] = struct.unpack("e", data_obj)
-    elif len(data_obj) == 4:
-        [val] = struct.unpack("f", data_obj)
-    elif len(data_obj) == 8:
-        [val] = struct.unpack("d", data_obj)
-    else:
-        _LOGGER.error("only 2, 4 or 8 byte long floats are supported in BTHome BLE")
-        return None
-    return round(val * factor, decimal_places)
+    return _float_decoder(factor)(data_obj)
 
 
 def parse_string(data_obj: bytes) -> str:
@@ -78,62 +69,140 @@ def parse_event_properties(
         return None
 
 
-dispatch = {
-    0x00: parse_uint,
-    0x01: parse_int,
-    0x02: parse_float,
-    0x03: parse_string,
-    0x05: parse_timestamp,
+def _integer_decoder(signed: bool, factor: float) -> Callable[[bytes], Any]:
+    if type(factor) is int and factor == 1:
+        # round(value * 1, 0) of an integer is the integer itself
+        return lambda data_obj: int.from_bytes(data_obj, "little", signed=signed)
+    decimal_places = _decimal_places(factor)
+    return lambda data_obj: round(
+        int.from_bytes(data_obj, "little", signed=signed) * factor, decimal_places
+    )
+
+
+def _float_decoder(factor: float) -> Callable[[bytes], Any]:
+    decimal_places = _decimal_places(factor)
+    formats = {2: struct.Struct("e"), 4: struct.Struct("f"), 8: struct.Struct("d")}
+
+    def decode(data_obj: bytes):
+        try:
+            [val] = formats[len(data_obj)].unpack(data_obj)
+        except KeyError:
+            _LOGGER.error("only 2, 4 or 8 byte long floats are supported in BTHome BLE")
+            return None
+        return round(val * factor, decimal_places)
+    return decode
+
+
+def _value_decoder(data_format: int, factor: float) -> Callable[[bytes], Any] | None:
+    """Return the function that converts the bytes of an object to its value."""
+    if data_format == 0:
+        return _integer_decoder(False, factor)
+    if data_format == 1:
+        return _integer_decoder(True, factor)
+    if data_format == 2:
+        return _float_decoder(factor)
+    if data_format == 3:
+        return parse_string
+    if data_format == 5:
+        return parse_timestamp
+    return None
+
+
+def _event_decoder(event_device: str) -> Callable[[bytes], Any]:
+    return lambda data_obj: parse_event_type(event_device, data_obj[0])
+
+
+# BTHome V2 data formats and their BTHome V1 (control byte) data format
+DATA_FORMATS = {
+    "unsigned_integer": 0,
+    "signed_integer": 1,
+    "float": 2,
+    "string": 3,
+    "timestamp": 5,
 }
 
 
+class ObjectDecoder(NamedTuple):
+    """Precompiled decoder of a BTHome object id"""
+    meas_format: str
+    unit_of_measurement: str | None
+    # data length of BTHome V2 objects, None for length prefixed strings
+    data_length: int | None
+    # value decoder of the BTHome V2 data format
+    decode: Callable[[bytes], Any] | None
+    # value decoders per BTHome V1 data format (0-7)
+    v1_decoders: tuple
+    # dimmer objects have the number of steps as event property
+    dimmer: bool
+
+
+def compile_decoders(meas_types: dict) -> dict[int, ObjectDecoder]:
+    """Compile the measurement types into a decoder per object id."""
+    decoders = {}
+    for obj_meas_type, meas_type in meas_types.items():
+        v1_decoders = [_value_decoder(data_format, meas_type.factor) for data_format in range(8)]
+        if meas_type.meas_format in ("button", "dimmer"):
+            # the value of events is the event type
+            v1_decoders = [
+                None if decoder is None else _event_decoder(meas_type.meas_format)
+                for decoder in v1_decoders
+            ]
+        v2_format = DATA_FORMATS.get(meas_type.data_format)
+        decoders[obj_meas_type] = ObjectDecoder(
+            meas_format=meas_type.meas_format,
+            unit_of_measurement=meas_type.unit_of_measurement,
+            data_length=None if meas_type.data_format == "string" else meas_type.data_length,
+            decode=None if v2_format is None else v1_decoders[v2_format],
+            v1_decoders=tuple(v1_decoders),
+            dimmer=meas_type.meas_format == "dimmer",
+        )
+    return decoders
+
+
+OBJECT_DECODERS = compile_decoders(MEAS_TYPES)
+
+
 def parse_bthome(self, data: str, uuid16: int, mac: bytes):
     """BTHome BLE parser"""
-    self.uuid16 = uuid16
-    self.mac = mac
-
-    if self.uuid16 == 0xFCD2:
+    if uuid16 == 0xFCD2:
         # BTHome V2 format
-        return parse_bthome_v2(self, data)
-    elif self.uuid16 in [0x181C, 0x181E]:
+        return parse_bthome_v2(self, data, mac)
+    elif uuid16 in [0x181C, 0x181E]:
         # BTHome V1 format
-        return parse_bthome_v1(self, data)
+        return parse_bthome_v1(self, data, uuid16, mac)
     else:
         return None
 
 
-def parse_bthome_v1(self, data):
+def parse_bthome_v1(self, data, uuid16, mac):
     "Parse data in BTHome V1 format"
-    self.device_type = "BTHome"
-    self.packet_id = None
+    packet_id = None
     sw_version = 1
     payload = data[4:]
-    if self.uuid16 == 0x181C:
+    if uuid16 == 0x181C:
         # Non-encrypted BTHome V1 format
-        self.firmware = "BTHome V1"
-        self.packet_id = None
-    elif self.uuid16 == 0x181E:
+        firmware = "BTHome V1"
+    elif uuid16 == 0x181E:
         # Encrypted BTHome V1 format
-        self.firmware = "BTHome V1 (encrypted)"
+        firmware = "BTHome V1 (encrypted)"
         try:
-            payload, count_id = decrypt_data(self, payload, sw_version)
+            payload, count_id = decrypt_data(self, payload, sw_version, mac)
         except (ValueError, TypeError):
             return None
 
         if count_id:
-            self.packet_id = parse_uint(count_id)
+            packet_id = parse_uint(count_id)
         else:
             return None
     else:
         return None
 
-    return parse_payload(self, payload, sw_version)
+    return parse_payload(self, payload, sw_version, mac, firmware, packet_id)
 
 
-def parse_bthome_v2(self, data):
+def parse_bthome_v2(self, data, mac):
     "Parse data in BTHome V2 format"
-    self.device_type = "BTHome"
-    self.packet_id = None
+    packet_id = None
 
     adv_info = data[4]
 
@@ -142,9 +211,9 @@ def parse_bthome_v2(self, data):
     sw_version = (adv_info >> 5) & 7  # 3 bits (5-7)
     if sw_version == 2:
         if encryption == 1:
-            self.firmware = f"BTHome V{sw_version} (encrypted)"
+            firmware = f"BTHome V{sw_version} (encrypted)"
         else:
-            self.firmware = f"BTHome V{sw_version}"
+            firmware = f"BTHome V{sw_version}"
     else:
         _LOGGER.error(
             "Sensor is set to use BTHome version %s, which is not existing. "
@@ -157,41 +226,39 @@ def parse_bthome_v2(self, data):
 
     if encryption == 1:
         try:
-            payload, count_id = decrypt_data(self, payload, sw_version)
+            payload, count_id = decrypt_data(self, payload, sw_version, mac)
         except (ValueError, TypeError):
             return None
 
         if count_id:
-            self.packet_id = parse_uint(count_id)
+            packet_id = parse_uint(count_id)
         else:
             return None
 
-    return parse_payload(self, payload, sw_version)
+    return parse_payload(self, payload, sw_version, mac, firmware, packet_id)
 
 
-def parse_payload(self, payload, sw_version):
+def parse_payload(self, payload, sw_version, mac, firmware, packet_id):
     "Parse the payload"
     payload_length = len(payload)
     next_obj_start = 0
     prev_obj_meas_type = 0
     result = {}
-    measurements: list[dict[str, Any]] = []
-    postfix_dict: dict[int, int] = {}
-    obj_data_format: str | int
 
-    # Create a list with all individual objects
+    # Parse the objects in a single pass, later objects of the same type overwrite earlier ones
     while payload_length >= next_obj_start + 1:
         obj_start = next_obj_start
 
         if sw_version == 1:
             # BTHome V1
             obj_meas_type = payload[obj_start + 1]
-            obj_data_unit = MEAS_TYPES[obj_meas_type].unit_of_measurement
             obj_control_byte = payload[obj_start]
             obj_data_length = (obj_control_byte >> 0) & 31  # 5 bits (0-4)
             obj_data_format = (obj_control_byte >> 5) & 7  # 3 bits (5-7)
             obj_data_start = obj_start + 2
             next_obj_start = obj_start + obj_data_length + 1
+            decoder = OBJECT_DECODERS.get(obj_meas_type)
+            decode = None if decoder is None else decoder.v1_decoders[obj_data_format]
         else:
             # BTHome V2
             obj_meas_type = payload[obj_start]
@@ -202,23 +269,24 @@ def parse_payload(self, payload, sw_version):
                     "payload: %s",
                     payload.hex(),
                 )
-            if obj_meas_type not in MEAS_TYPES:
+            decoder = OBJECT_DECODERS.get(obj_meas_type)
+            if decoder is None:
                 _LOGGER.debug(
                     "Invalid Object ID found in payload: %s",
                     payload.hex(),
                 )
                 break
             prev_obj_meas_type = obj_meas_type
-            obj_data_format = MEAS_TYPES[obj_meas_type].data_format
 
-            if obj_data_format == "string":
+            obj_data_length = decoder.data_length
+            if obj_data_length is None:
+                # string with its length in the first byte
                 obj_data_length = payload[obj_start + 1]
                 obj_data_start = obj_start + 2
             else:
-                obj_data_length = MEAS_TYPES[obj_meas_type].data_length
                 obj_data_start = obj_start + 1
             next_obj_start = obj_data_start + obj_data_length
-            obj_data_unit = MEAS_TYPES[obj_meas_type].unit_of_measurement
+            decode = decoder.decode
 
         if obj_data_length == 0:
             _LOGGER.debug(
@@ -230,147 +298,89 @@ def parse_payload(self, payload, sw_version):
         if payload_length < next_obj_start:
             _LOGGER.debug("Invalid payload data length, payload: %s", payload.hex())
             break
-        measurements.append(
-            {
-                "data format": obj_data_format,
-                "data unit": obj_data_unit,
-                "data length": obj_data_length,
-                "measurement type": obj_meas_type,
-                "measurement data": payload[obj_data_start:next_obj_start],
-                "device id": None,
-            }
-        )
 
-    # Get a list of measurement types that are included more than once.
-    seen_meas_types = set()
-    dup_meas_types = set()
-    for meas in measurements:
-        if meas["measurement type"] in seen_meas_types:
-            dup_meas_types.add(meas["measurement type"])
-        else:
-            seen_meas_types.add(meas["measurement type"])
-
-    # Parse each object into readable information
-    for meas in measurements:
-        if meas["measurement type"] not in MEAS_TYPES:
+        if decoder is None:
             _LOGGER.debug(
                 "UNKNOWN measurement type %s in BTHome BLE payload! Adv: %s",
-                meas["measurement type"],
+                obj_meas_type,
                 payload.hex(),
             )
             continue
-
-        if meas["measurement type"] in dup_meas_types:
-            # Add a postfix for advertisements with multiple measurements of the same type
-            postfix_counter = postfix_dict.get(meas["measurement type"], 0) + 1
-            postfix_dict[meas["measurement type"]] = postfix_counter
-            postfix = f"_{postfix_counter}"
-        else:
-            postfix = ""
-
-        meas_type = MEAS_TYPES[meas["measurement type"]]
-        meas_unit = meas_type.unit_of_measurement
-        meas_format = meas_type.meas_format
-        meas_factor = meas_type.factor
-        value: None | str | int | float | datetime
-        event_property = None
-
-        if meas["data format"] == 0 or meas["data format"] == "unsigned_integer":
-            value = parse_uint(meas["measurement data"], meas_factor)
-        elif meas["data format"] == 1 or meas["data format"] == "signed_integer":
-            value = parse_int(meas["measurement data"], meas_factor)
-        elif meas["data format"] == 2 or meas["data format"] == "float":
-            value = parse_float(meas["measurement data"], meas_factor)
-        elif meas["data format"] == 3 or meas["data format"] == "string":
-            value = parse_string(meas["measurement data"])
-        elif meas["data format"] == 5 or meas["data format"] == "timestamp":
-            value = parse_timestamp(meas["measurement data"])
-        else:
+        if decode is None:
             _LOGGER.error(
                 "UNKNOWN dataobject in BTHome BLE payload! Adv: %s",
                 payload.hex(),
             )
             continue
 
-        if meas_type.meas_format == "button":
-            value = parse_event_type(
-                event_device=meas_format,
-                data_obj=meas["measurement data"][0],
-            )
-        if meas_type.meas_format == "dimmer":
-            value = parse_event_type(
-                event_device=meas_format,
-                data_obj=meas["measurement data"][0],
-            )
-            event_property = parse_event_properties(
-                event_device=meas_format,
-                data_obj=meas["measurement data"][1:],
-            )
-
+        data_obj = payload[obj_data_start:next_obj_start]
+        value = decode(data_obj)
         if value is not None:
-            result.update({meas_format: value})
-            if meas_unit == "lbs":
+            result[decoder.meas_format] = value
+            if decoder.unit_of_measurement == "lbs":
                 # Weight measurement with non-standard unit of measurement (lb)
-                result.update({"weight unit": meas_unit})
-        if event_property is not None:
-            result.update(event_property)
+                result["weight unit"] = "lbs"
+        if decoder.dimmer:
+            result.update(parse_event_properties("dimmer", data_obj[1:]))
 
     if not result:
         if self.report_unknown == "BTHome":
             _LOGGER.info(
                 "BLE ADV from BTHome DEVICE: MAC: %s, ADV: %s",
-                to_mac(self.mac),
+                to_mac(mac),
                 payload.hex()
             )
         return None
 
     # Check for packet id in payload
     if result.get("packet"):
-        self.packet_id = result["packet"]
+        packet_id = result["packet"]
 
     # Check for duplicate messages
-    if self.packet_id:
+    if packet_id:
         try:
-            prev_packet = self.lpacket_ids[self.mac]
+            prev_packet = self.lpacket_ids[mac]
         except KeyError:
             # start with empty first packet
             prev_packet = None
-        if prev_packet == self.packet_id:
+        if prev_packet == packet_id:
             # only process new messages
             if self.filter_duplicates is True:
                 return None
-        self.lpacket_ids[self.mac] = self.packet_id
+        self.lpacket_ids[mac] = packet_id
     else:
-        self.packet_id = "no packet id"
+        packet_id = "no packet id"
 
     result.update({
-        "mac": to_unformatted_mac(self.mac),
-        "packet": self.packet_id,
-        "type": self.device_type,
-        "firmware": self.firmware,
+        "mac": to_unformatted_mac(mac),
+        "packet": packet_id,
+        "type": "BTHome",
+        "firmware": firmware,
         "data": True
     })
     return result
 
 
-def decrypt_data(self, data: bytes, sw_version: int):
+def decrypt_data(self, data: bytes, sw_version: int, mac: bytes):
     """Decrypt encrypted BTHome advertisements"""
     # check for minimum length of encrypted advertisement
     if len(data) < (15 if sw_version == 1 else 14):
         _LOGGER.debug("Invalid data length (for decryption), adv: %s", data.hex())
     # try to find encryption key for current device
     try:
-        key = self.aeskeys[self.mac]
+        key = self.aeskeys[mac]
         if len(key) != 16:
             _LOGGER.error("Encryption key should be 16 bytes (32 characters) long")
             return None, None
     except KeyError:
         # no encryption key found
-        if self.mac not in self.no_key_message:
-            _LOGGER.error("No encryption key found for device with MAC %s", to_mac(self.mac))
-            self.no_key_message.append(self.mac)
+        if mac not in self.no_key_message:
+            _LOGGER.error("No encryption key found for device with MAC %s", to_mac(mac))
+            self.no_key_message[mac] = True
         return None, None
 
+    if self.decryption_failures.skip(mac):
+        return None, None
     # prepare the data for decryption
     if sw_version == 1:
         uuid = b"\x1e\x18"
@@ -381,23 +391,23 @@ def decrypt_data(self, data: bytes, sw_version: int):
     mic = data[-4:]
 
     # nonce: mac [6], uuid16 [2 (v1) or 3 (v2)], count_id [4]
-    nonce = b"".join([self.mac, uuid, count_id])
-    cipher = AES.new(key, AES.MODE_CCM, nonce=nonce, mac_len=4)
-    if sw_version == 1:
-        cipher.update(b"\x11")
+    nonce = b"".join([mac, uuid, count_id])
+    aad = b"\x11" if sw_version == 1 else b""
 
     try:
-        decrypted_payload = cipher.decrypt_and_verify(encrypted_payload, mic)
+        decrypted_payload = self.ciphers.get(key).decrypt_and_verify(nonce, encrypted_payload, mic, aad)
     except ValueError as error:
-        _LOGGER.warning("Decryption failed: %s", error)
-        _LOGGER.debug("mic: %s", mic.hex())
-        _LOGGER.debug("nonce: %s", nonce.hex())
-        _LOGGER.debug("encrypted_payload: %s", encrypted_payload.hex())
+        if self.decryption_failures.failure(mac):
+            _LOGGER.warning("Decryption failed: %s", error)
+            _LOGGER.debug("mic: %s", mic.hex())
+            _LOGGER.debug("nonce: %s", nonce.hex())
+            _LOGGER.debug("encrypted_payload: %s", encrypted_payload.hex())
         return None
+    self.decryption_failures.success(mac)
     if decrypted_payload is None:
         _LOGGER.error(
             "Decryption failed for %s, decrypted payload is None",
-            to_mac(self.mac),
+            to_mac(mac),
         )
         return None, None
     return decrypted_payload, count_id
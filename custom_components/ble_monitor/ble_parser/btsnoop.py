@@ -0,0 +1,77 @@
+"""Reader and writer for btsnoop capture files"""
+import struct
+from time import time
+from typing import BinaryIO, Iterator, Optional
+
+BTSNOOP_MAGIC = b"btsnoop\0"
+BTSNOOP_VERSION = 1
+# Datalink types, the packets of HCI UART (H4) captures start with the packet type
+DATALINK_HCI_UNENCAPSULATED = 1001
+DATALINK_HCI_UART = 1002
+
+HCI_EVENT_PACKET = 0x04
+# Packet flags, bit 0 is set for received packets, bit 1 for commands and events
+FLAGS_RECEIVED_EVENT = 0x03
+
+_HEADER = struct.Struct(">8sII")
+_RECORD = struct.Struct(">IIIIq")
+# Microseconds from 0000-01-01 (the epoch of the timestamps) to 1970-01-01
+_EPOCH_DELTA = 0x00DCDDB30F2F8000
+
+
+def read_btsnoop(stream: BinaryIO) -> Iterator[tuple[bytes, float]]:
+    """Yield the HCI events of a btsnoop capture with their timestamp.
+
+    The events start with the HCI packet type (0x04), as they are received
+    from the HCI socket. The timestamps are in seconds since the Unix epoch.
+    Commands and ACL data are skipped, as is a truncated last record of a
+    capture that is still being written.
+    """
+    header = stream.read(_HEADER.size)
+    if len(header) < _HEADER.size:
+        raise ValueError("Not a btsnoop capture, the header is truncated")
+    magic, version, datalink = _HEADER.unpack(header)
+    if magic != BTSNOOP_MAGIC:
+        raise ValueError("Not a btsnoop capture")
+    if datalink not in (DATALINK_HCI_UNENCAPSULATED, DATALINK_HCI_UART):
+        raise ValueError(f"Unsupported btsnoop datalink type {datalink}")
+    while True:
+        record = stream.read(_RECORD.size)
+        if len(record) < _RECORD.size:
+            return
+        _, included_length, flags, _, timestamp = _RECORD.unpack(record)
+        data = stream.read(included_length)
+        if len(data) < included_length:
+            return
+        timestamp = (timestamp - _EPOCH_DELTA) / 1000000
+        if datalink == DATALINK_HCI_UART:
+            if data and data[0] == HCI_EVENT_PACKET:
+                yield data, timestamp
+        elif flags == FLAGS_RECEIVED_EVENT:
+            yield bytes([HCI_EVENT_PACKET]) + data, timestamp
+
+
+class BtsnoopWriter:
+    """Write received HCI events to a btsnoop capture (HCI UART datalink).
+
+    The capture can be opened in Wireshark and replayed with read_btsnoop.
+    """
+
+    def __init__(self, stream: BinaryIO):
+        self.stream = stream
+        stream.write(_HEADER.pack(BTSNOOP_MAGIC, BTSNOOP_VERSION, DATALINK_HCI_UART))
+
+    def write(self, data: bytes, timestamp: Optional[float] = None):
+        """Write an HCI event, starting with the packet type, received at timestamp (now if None)."""
+        if timestamp is None:
+            timestamp = time()
+        self.stream.write(
+            _RECORD.pack(
+                len(data),
+                len(data),
+                FLAGS_RECEIVED_EVENT,
+                0,
+                round(timestamp * 1000000) + _EPOCH_DELTA,
+            )
+        )
+        self.stream.write(data)
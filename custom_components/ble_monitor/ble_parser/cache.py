@@ -0,0 +1,138 @@
+"""Caches for the ble_parser"""
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from threading import Lock
+from time import monotonic
+
+# Keys of the sensor data that identify the device, repeated in refresh messages
+SENSOR_HEADER_KEYS = ("mac", "uuid", "type", "firmware", "manufacturer", "packet")
+
+
+class PayloadDedupCache:
+    """Per MAC cache of the last advertising payload and its parse result.
+
+    An advertisement with the same payload as the previous one of the same MAC
+    is not parsed again within the time to live. Instead, the cached result is
+    replayed with the new RSSI. Sensor data is replayed as a message without
+    data (data = False), which only refreshes the RSSI, tracker data is replayed
+    as is. The cache is bounded, the least recently used MAC is evicted first.
+    """
+
+    def __init__(self, ttl: float, max_size: int = 1024):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def lookup(self, mac: bytes, payload_hash: int, now: float, rssi: int):
+        """Return the replayed (sensor_data, tracker_data) or None on a miss"""
+        entry = self._entries.get(mac)
+        if entry is None or entry[0] != payload_hash or now - entry[1] >= self.ttl:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(mac)
+        sensor_header, tracker_data = entry[2], entry[3]
+        if sensor_header is not None:
+            sensor_header = dict(sensor_header, rssi=rssi)
+        if tracker_data is not None:
+            tracker_data = dict(tracker_data, rssi=rssi)
+        return sensor_header, tracker_data
+
+    def store(self, mac: bytes, payload_hash: int, now: float, sensor_data, tracker_data):
+        """Store the parse result of a payload"""
+        if sensor_data:
+            sensor_header = {key: sensor_data[key] for key in SENSOR_HEADER_KEYS if key in sensor_data}
+            sensor_header["data"] = False
+            sensor_header["local_name"] = sensor_data.get("local_name", "")
+        else:
+            sensor_header = None
+        if tracker_data:
+            tracker_data = dict(tracker_data)
+        else:
+            tracker_data = None
+        self._entries[mac] = (payload_hash, now, sensor_header, tracker_data)
+        self._entries.move_to_end(mac)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """Remove all entries"""
+        self._entries.clear()
+
+
+class LRUStateMap(MutableMapping):
+    """Dict with per device parser state, bounded in size and in idle time.
+
+    Every read or write of a key marks it as recently used. When the map is
+    full, the least recently used key is evicted. Keys that have not been used
+    for more than ttl seconds are evicted as well (ttl 0 or None disables this).
+    The map is guarded by a lock, as a parser can be used from several threads.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = 3600, timer=monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.evictions = 0
+        self._timer = timer
+        self._lock = Lock()
+        self._entries = OrderedDict()
+
+    def __getitem__(self, key):
+        with self._lock:
+            value, last_used = self._entries[key]
+            now = self._timer()
+            if self.ttl and now - last_used > self.ttl:
+                del self._entries[key]
+                self.evictions += 1
+                raise KeyError(key)
+            self._entries[key] = (value, now)
+            self._entries.move_to_end(key)
+            return value
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            now = self._timer()
+            entries = self._entries
+            entries[key] = (value, now)
+            entries.move_to_end(key)
+            if len(entries) > self.max_size:
+                entries.popitem(last=False)
+                self.evictions += 1
+            if self.ttl:
+                # the least recently used keys are in front
+                while entries:
+                    oldest = next(iter(entries))
+                    if now - entries[oldest][1] <= self.ttl:
+                        break
+                    del entries[oldest]
+                    self.evictions += 1
+
+    def __delitem__(self, key):
+        with self._lock:
+            del self._entries[key]
+
+    def __iter__(self):
+        with self._lock:
+            keys = list(self._entries)
+        return iter(keys)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def peek(self, key, default=None):
+        """Return the value of a key, without marking it as recently used."""
+        with self._lock:
+            entry = self._entries.get(key)
+        return default if entry is None else entry[0]
+
+    def snapshot(self) -> list:
+        """Return the (key, value) pairs, least recently used first, without marking them as used."""
+        with self._lock:
+            return [(key, entry[0]) for key, entry in self._entries.items()]
@@ -0,0 +1,131 @@
+"""Capture files of the raw HCI events received by BLE monitor"""
+import asyncio
+import os
+import struct
+from threading import Lock
+from time import monotonic
+from typing import BinaryIO, Callable, Iterator, Optional
+
+CAPTURE_MAGIC = b"BLEMCAP1"
+# monotonic receive time, length of the adapter id, length of the event
+_RECORD = struct.Struct(">dBH")
+# HCI events that are replayed at max speed before the event loop gets a turn
+_REPLAY_CHUNK = 1000
+
+
+class CaptureWriter:
+    """Record raw HCI events in a rotating capture file.
+
+    Each record holds the monotonic receive time, the adapter that received
+    the event (e.g. hci0, or the gateway id of the parse_data service) and the
+    event. Writes are buffered. When the file is larger than max_size bytes,
+    it is renamed to path.1 (path.1 to path.2, ...) and a new file is started.
+    The writer can be used from several threads.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_size: int = 10485760,
+        backups: int = 3,
+        buffer_size: int = 65536,
+        timer=monotonic,
+    ):
+        self.path = path
+        self.max_size = max_size
+        self.backups = backups
+        self.buffer_size = buffer_size
+        self.written = 0
+        self._timer = timer
+        self._lock = Lock()
+        self._file = None
+        self._size = 0
+        self._open()
+
+    def _open(self):
+        self._file = open(self.path, "wb", buffering=self.buffer_size)
+        self._file.write(CAPTURE_MAGIC)
+        self._size = len(CAPTURE_MAGIC)
+
+    def _rotate(self):
+        self._file.close()
+        for backup in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{backup}"):
+                os.replace(f"{self.path}.{backup}", f"{self.path}.{backup + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        self._open()
+
+    def write(self, data: bytes, adapter: str, timestamp: Optional[float] = None):
+        """Record an HCI event received by adapter at timestamp (now if None)."""
+        if timestamp is None:
+            timestamp = self._timer()
+        adapter_id = adapter.encode()[:255]
+        record = _RECORD.pack(timestamp, len(adapter_id), len(data)) + adapter_id + data
+        with self._lock:
+            if self._file is None:
+                return
+            if self._size + len(record) > self.max_size and self._size > len(CAPTURE_MAGIC):
+                self._rotate()
+            self._file.write(record)
+            self._size += len(record)
+            self.written += 1
+
+    def flush(self):
+        """Write the buffered records to the file."""
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+
+    def close(self):
+        """Write the buffered records and close the file."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def read_capture(stream: BinaryIO) -> Iterator[tuple[float, str, bytes]]:
+    """Yield the (timestamp, adapter, event) records of a capture file.
+
+    A truncated last record, e.g. of a capture that is still being written,
+    is skipped.
+    """
+    if stream.read(len(CAPTURE_MAGIC)) != CAPTURE_MAGIC:
+        raise ValueError("Not a BLE monitor capture file")
+    while True:
+        header = stream.read(_RECORD.size)
+        if len(header) < _RECORD.size:
+            return
+        timestamp, adapter_length, data_length = _RECORD.unpack(header)
+        adapter = stream.read(adapter_length)
+        data = stream.read(data_length)
+        if len(adapter) < adapter_length or len(data) < data_length:
+            return
+        yield timestamp, adapter.decode(errors="replace"), data
+
+
+async def replay_capture(path: str, callback: Callable, speed: float = 1.0, timer=monotonic) -> int:
+    """Feed the HCI events of a capture file to callback(data, adapter).
+
+    The events are replayed with the time between them divided by speed, so
+    speed 1 replays them in real time and speed 10 ten times faster. With
+    speed 0, they are replayed as fast as possible. Returns the number of
+    replayed events.
+    """
+    count = 0
+    start = None
+    with open(path, "rb") as stream:
+        for timestamp, adapter, data in read_capture(stream):
+            if speed:
+                if start is None:
+                    start = (timestamp, timer())
+                delay = start[1] + (timestamp - start[0]) / speed - timer()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            elif count % _REPLAY_CHUNK == 0:
+                # give other tasks and a stop of the event loop a turn
+                await asyncio.sleep(0)
+            callback(data, adapter)
+            count += 1
+    return count
@@ -0,0 +1,211 @@
+"""AES-CCM decryption with cached key schedules"""
+import logging
+from hmac import compare_digest
+from time import monotonic
+
+from Cryptodome.Cipher import AES
+from Cryptodome.Util.strxor import strxor
+
+from .cache import LRUStateMap
+from .helpers import to_mac
+
+_LOGGER = logging.getLogger(__name__)
+
+# key of MiBeacon v2/v3 devices is the 12 bytes key with these bytes in the middle
+LEGACY_KEY_INFIX = b"\x8d\x3d\x3c\x97"
+
+
+def legacy_key(aeskey: bytes) -> bytes:
+    """Return the AES key of a 12 bytes MiBeacon v2/v3 key"""
+    return b"".join([aeskey[0:6], LEGACY_KEY_INFIX, aeskey[6:]])
+
+
+class AesCcm:
+    """AES-CCM (RFC 3610) decryption with a reusable key schedule.
+
+    Creating a CCM cipher object with pycryptodome expands the key for every
+    packet. This context expands the key once in an ECB cipher and uses it for
+    the CTR key stream and the CBC-MAC of each packet. The results and errors
+    are the same as those of AES.new(key, AES.MODE_CCM, nonce=nonce, mac_len=4).
+    """
+
+    __slots__ = ("_encrypt", "mac_len")
+
+    def __init__(self, key: bytes, mac_len: int = 4):
+        if len(key) not in (16, 24, 32):
+            raise ValueError("Incorrect AES key length (%d bytes)" % len(key))
+        self._encrypt = AES.new(key, AES.MODE_ECB).encrypt
+        self.mac_len = mac_len
+
+    def decrypt(self, nonce: bytes, ciphertext: bytes, aad: bytes = b"") -> bytes:
+        """Decrypt the ciphertext without verifying the MAC tag"""
+        return self._decrypt(nonce, ciphertext)[0]
+
+    def decrypt_and_verify(
+        self, nonce: bytes, ciphertext: bytes, mac_tag: bytes, aad: bytes = b""
+    ) -> bytes:
+        """Decrypt the ciphertext and verify the MAC tag, raise ValueError if it is invalid"""
+        plaintext, tag_mask = self._decrypt(nonce, ciphertext)
+        mac_len = self.mac_len
+        q = 15 - len(nonce)
+        # B0: flags, nonce and message length, followed by the AAD and the message
+        flags = (0x40 if aad else 0) | ((mac_len - 2) // 2) << 3 | (q - 1)
+        blocks = bytes([flags]) + nonce + len(plaintext).to_bytes(q, "big")
+        if aad:
+            aad_blocks = len(aad).to_bytes(2, "big") + aad
+            blocks += aad_blocks + bytes(-len(aad_blocks) % 16)
+        blocks += plaintext + bytes(-len(plaintext) % 16)
+        # CBC-MAC
+        encrypt = self._encrypt
+        mac = encrypt(blocks[:16])
+        for start in range(16, len(blocks), 16):
+            mac = encrypt(strxor(mac, blocks[start:start + 16]))
+        if not compare_digest(strxor(mac[:mac_len], tag_mask), mac_tag):
+            raise ValueError("MAC check failed")
+        return plaintext
+
+    def _decrypt(self, nonce: bytes, ciphertext: bytes):
+        q = 15 - len(nonce)
+        if q < 2 or q > 8:
+            raise ValueError("Length of parameter 'nonce' must be in the range 7..13 bytes")
+        # counter blocks A0..An, A0 masks the MAC tag
+        prefix = bytes([q - 1]) + nonce
+        size = len(ciphertext)
+        key_stream = self._encrypt(
+            b"".join(prefix + i.to_bytes(q, "big") for i in range((size + 15) // 16 + 1))
+        )
+        plaintext = strxor(ciphertext, key_stream[16:16 + size]) if size else b""
+        return plaintext, key_stream[:self.mac_len]
+
+
+class CipherCache:
+    """AES-CCM contexts of the device keys.
+
+    Contexts are looked up by the key itself, so a changed key of a device
+    gets a new context. The contexts of all keys are built when the keys are
+    loaded, contexts of later added or changed keys on first use. The contexts
+    are kept in a bounded map, such that the contexts of replaced keys are
+    evicted once they are no longer used.
+    """
+
+    def __init__(self, aeskeys=None, max_size: int = 10000, ttl: float = 3600, timer=monotonic):
+        self._contexts = LRUStateMap(max_size, ttl, timer)
+        self.load(aeskeys or {})
+
+    def load(self, aeskeys: dict):
+        """Replace the contexts with those of the given device keys."""
+        self._contexts.clear()
+        for key in aeskeys.values():
+            if len(key) == 16:
+                self.get(key)
+            elif len(key) == 12:
+                self.get_legacy(key)
+
+    def get(self, key: bytes) -> AesCcm:
+        """Return the AES-CCM context of a key."""
+        try:
+            return self._contexts[key]
+        except KeyError:
+            context = self._contexts[key] = AesCcm(key)
+            return context
+
+    def get_legacy(self, aeskey: bytes) -> AesCcm:
+        """Return the AES-CCM context of a 12 bytes MiBeacon v2/v3 key."""
+        try:
+            return self._contexts[aeskey]
+        except KeyError:
+            context = self._contexts[aeskey] = AesCcm(legacy_key(aeskey))
+            return context
+
+    def __len__(self):
+        return len(self._contexts)
+
+    @property
+    def evictions(self) -> int:
+        """Return the number of evicted contexts."""
+        return self._contexts.evictions
+
+
+class DecryptionFailures:
+    """Consecutive decryption failures per device, with exponential backoff.
+
+    A wrong or rotated key makes every advertisement of a device fail the MIC
+    check. After threshold consecutive failures, decryption of the device is
+    skipped for backoff seconds, doubling after every next failure up to
+    max_backoff. Instead of a warning per advertisement, a single summary line
+    is logged per retry. A successful decryption resets the device.
+    """
+
+    def __init__(
+        self,
+        threshold: int = 3,
+        backoff: float = 10,
+        max_backoff: float = 600,
+        max_size: int = 10000,
+        ttl: float = 3600,
+        timer=monotonic,
+    ):
+        self.threshold = threshold
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.skipped = 0
+        self._timer = timer
+        # mac: [consecutive failures, time of next attempt, skipped advertisements]
+        self._devices = LRUStateMap(max_size, ttl, timer)
+
+    def skip(self, mac: bytes) -> bool:
+        """Return True if decryption of the device is in backoff"""
+        try:
+            device = self._devices[mac]
+        except KeyError:
+            return False
+        if device[0] < self.threshold or self._timer() >= device[1]:
+            return False
+        device[2] += 1
+        self.skipped += 1
+        return True
+
+    def failure(self, mac: bytes) -> bool:
+        """Count a failed decryption, return True if it should be logged per advertisement"""
+        try:
+            device = self._devices[mac]
+        except KeyError:
+            device = self._devices[mac] = [0, 0.0, 0]
+        device[0] += 1
+        failures = device[0]
+        if failures < self.threshold:
+            return True
+        backoff = min(self.backoff * 2 ** (failures - self.threshold), self.max_backoff)
+        device[1] = self._timer() + backoff
+        _LOGGER.warning(
+            "Decryption failed %i times in a row for device with MAC %s, check the encryption key. "
+            "Skipping decryption for %i seconds (%i advertisements skipped so far)",
+            failures,
+            to_mac(mac),
+            backoff,
+            device[2],
+        )
+        return False
+
+    def success(self, mac: bytes):
+        """Reset the failures of the device after a successful decryption."""
+        try:
+            del self._devices[mac]
+        except KeyError:
+            pass
+
+    def __len__(self):
+        return len(self._devices)
+
+    def diagnostics(self) -> dict:
+        """Return the failure state per device."""
+        now = self._timer()
+        diagnostics = {}
+        # a snapshot, reading the devices doesn't keep them from idle eviction
+        for mac, (failures, retry_at, skipped) in self._devices.snapshot():
+            diagnostics[to_mac(mac)] = {
+                "failures": failures,
+                "skipped": skipped,
+                "retry_in": round(max(retry_at - now, 0), 1) if failures >= self.threshold else 0,
+            }
+        return diagnostics
@@ -0,0 +1,560 @@
+"""Dispatch table for BLE advertisements to the vendor parsers"""
+import dataclasses
+from importlib import import_module
+from typing import Callable, NamedTuple, Optional
+
+from .const import JAALEE_TYPES, TILT_TYPES
+
+
+class LazyParser:
+    """Parser function of a vendor module, the module is imported on first use"""
+
+    __slots__ = ("vendor", "name", "_func")
+
+    def __init__(self, vendor: str, name: str):
+        self.vendor = vendor
+        self.name = name
+        self._func = None
+
+    def load(self) -> Callable:
+        """Import the vendor module and return the parser function"""
+        func = self._func
+        if func is None:
+            func = self._func = getattr(import_module(f".{self.vendor}", __package__), self.name)
+        return func
+
+
+# Parsers of the vendor modules, the vendor is the name of the module
+parse_acconeer = LazyParser("acconeer", "parse_acconeer")
+parse_airmentor = LazyParser("airmentor", "parse_airmentor")
+parse_almendo = LazyParser("almendo", "parse_almendo")
+parse_altbeacon = LazyParser("altbeacon", "parse_altbeacon")
+parse_amazfit = LazyParser("amazfit", "parse_amazfit")
+parse_atc = LazyParser("atc", "parse_atc")
+parse_beckett = LazyParser("beckett", "parse_beckett")
+parse_bluemaestro = LazyParser("bluemaestro", "parse_bluemaestro")
+parse_blustream = LazyParser("blustream", "parse_blustream")
+parse_bparasite = LazyParser("bparasite", "parse_bparasite")
+parse_bthome = LazyParser("bthome", "parse_bthome")
+parse_chefiq = LazyParser("chefiq", "parse_chefiq")
+parse_govee = LazyParser("govee", "parse_govee")
+parse_grundfos = LazyParser("grundfos", "parse_grundfos")
+parse_hhcc = LazyParser("hhcc", "parse_hhcc")
+parse_holyiot = LazyParser("holyiot", "parse_holyiot")
+parse_hormann = LazyParser("hormann", "parse_hormann")
+parse_ibeacon = LazyParser("ibeacon", "parse_ibeacon")
+parse_inkbird = LazyParser("inkbird", "parse_inkbird")
+parse_inode = LazyParser("inode", "parse_inode")
+parse_jaalee = LazyParser("jaalee", "parse_jaalee")
+parse_jinou = LazyParser("jinou", "parse_jinou")
+parse_kegtron = LazyParser("kegtron", "parse_kegtron")
+parse_kkm = LazyParser("kkm", "parse_kkm")
+parse_laica = LazyParser("laica", "parse_laica")
+parse_michelin_tms = LazyParser("michelin", "parse_michelin_tms")
+parse_mikrotik = LazyParser("mikrotik", "parse_mikrotik")
+parse_miscale = LazyParser("miscale", "parse_miscale")
+parse_moat = LazyParser("moat", "parse_moat")
+parse_mocreo = LazyParser("mocreo", "parse_mocreo")
+parse_oral_b = LazyParser("oral_b", "parse_oral_b")
+parse_oras = LazyParser("oras", "parse_oras")
+parse_qingping = LazyParser("qingping", "parse_qingping")
+parse_relsib = LazyParser("relsib", "parse_relsib")
+parse_ruuvitag = LazyParser("ruuvitag", "parse_ruuvitag")
+parse_sensirion = LazyParser("sensirion", "parse_sensirion")
+parse_sensorpush = LazyParser("sensorpush", "parse_sensorpush")
+parse_senssun = LazyParser("senssun", "parse_senssun")
+parse_smartdry = LazyParser("smartdry", "parse_smartdry")
+parse_sonoff = LazyParser("sonoff", "parse_sonoff")
+parse_switchbot = LazyParser("switchbot", "parse_switchbot")
+parse_teltonika = LazyParser("teltonika", "parse_teltonika")
+parse_thermobeacon = LazyParser("thermobeacon", "parse_thermobeacon")
+parse_thermopro = LazyParser("thermopro", "parse_thermopro")
+parse_tilt = LazyParser("tilt", "parse_tilt")
+parse_xiaogui = LazyParser("xiaogui", "parse_xiaogui")
+parse_xiaomi = LazyParser("xiaomi", "parse_xiaomi")
+
+SENSORPUSH_UUID128 = b'\xb0\x0a\x09\xec\xd7\x9d\xb8\x93\xba\x42\xd6\x11\x00\x00\x09\xef'
+
+
+class Advertisement(NamedTuple):
+    """Decoded AD structures of one advertisement, shared by all candidates"""
+    mac: bytes
+    local_name: str
+    service_class_uuid16: Optional[int]
+    service_class_uuid128: Optional[bytes]
+    service_data_list: list
+    man_spec_data_list: list
+
+
+@dataclasses.dataclass(frozen=True)
+class DispatchEntry:
+    """Candidate parser for a company ID or UUID16, with the guards it needs.
+
+    Guards are checked in the order service_class_uuid16, data_len, subtype,
+    local_name, local_name_prefix and match. The first entry that passes all
+    guards handles the record. An entry without handler consumes the record
+    without parsing it. The data_len, subtype and local_name_prefix guards are
+    also used by the prefilter.
+    """
+    name: str
+    handler: Optional[Callable] = None
+    keys: tuple = ()
+    data_len: Optional[frozenset] = None
+    # first byte after the company ID or UUID16 (data[4])
+    subtype: Optional[frozenset] = None
+    local_name: Optional[frozenset] = None
+    local_name_prefix: Optional[tuple] = None
+    service_class_uuid16: Optional[frozenset] = None
+    match: Optional[Callable] = None
+    # stop with the next record after this one has been handled
+    stop: bool = True
+    # report the advertisement as unknown
+    unknown: bool = False
+    # the parser returns (sensor_data, tracker_data) and data[6:22] is a beacon UUID
+    beacon: bool = False
+
+    @property
+    def vendor(self) -> Optional[str]:
+        """Return the vendor module of the parser, None for entries without parser"""
+        return getattr(self.handler, "vendor", None)
+
+
+def _mac(lazy):
+    """Handler for parsers with signature (self, data, mac)"""
+    parse = None
+
+    def handler(parser, data, adv):
+        nonlocal parse
+        if parse is None:
+            parse = lazy.load()
+        return parse(parser, data, adv.mac)
+    handler.vendor = lazy.vendor
+    return handler
+
+
+def _name(lazy):
+    """Handler for parsers with signature (self, data, local_name, mac)"""
+    parse = None
+
+    def handler(parser, data, adv):
+        nonlocal parse
+        if parse is None:
+            parse = lazy.load()
+        return parse(parser, data, adv.local_name, adv.mac)
+    handler.vendor = lazy.vendor
+    return handler
+
+
+def _uses(lazy):
+    """Decorator for handlers with signature (parse, parser, data, adv), parse is the loaded parser"""
+    def decorator(func):
+        parse = None
+
+        def handler(parser, data, adv):
+            nonlocal parse
+            if parse is None:
+                parse = lazy.load()
+            return func(parse, parser, data, adv)
+        handler.vendor = lazy.vendor
+        return handler
+    return decorator
+
+
+@_uses(parse_govee)
+def _govee(parse, parser, data, adv):
+    return parse(parser, data, adv.service_class_uuid16, adv.local_name, adv.mac)
+
+
+@_uses(parse_bthome)
+def _bthome(parse, parser, data, adv):
+    return parse(parser, data, (data[3] << 8) | data[2], adv.mac)
+
+
+@_uses(parse_relsib)
+def _relsib_health_thermometer(parse, parser, data, adv):
+    service_data_list = adv.service_data_list
+    if len(service_data_list) == 3:
+        uuid16_2 = (service_data_list[1][3] << 8) | service_data_list[1][2]
+        if uuid16_2 == 0x181A:
+            data = b"".join(service_data_list)
+    return parse(parser, data, adv.mac)
+
+
+@_uses(parse_teltonika)
+def _teltonika_service_data(parse, parser, data, adv):
+    if len(adv.service_data_list) == 2:
+        data = b"".join(adv.service_data_list)
+    return parse(parser, data, adv.local_name, adv.mac)
+
+
+@_uses(parse_amazfit)
+def _amazfit_service_data(parse, parser, data, adv):
+    man_spec_data = adv.man_spec_data_list[0] if adv.man_spec_data_list else None
+    return parse(parser, data, man_spec_data, adv.mac)
+
+
+@_uses(parse_amazfit)
+def _miband(parse, parser, data, adv):
+    return parse(parser, None, data, adv.mac)
+
+
+@_uses(parse_teltonika)
+def _teltonika_second_record(parse, parser, data, adv):
+    return parse(parser, adv.man_spec_data_list[1], adv.local_name, adv.mac)
+
+
+@_uses(parse_teltonika)
+def _teltonika_joined(parse, parser, data, adv):
+    if len(adv.man_spec_data_list) == 2:
+        data = b"".join(adv.man_spec_data_list)
+    return parse(parser, data, adv.local_name, adv.mac)
+
+
+@_uses(parse_hormann)
+def _hormann(parse, parser, data, adv):
+    if len(adv.man_spec_data_list) == 2:
+        data = b"".join(adv.man_spec_data_list)
+    return parse(parser, data, adv.mac)
+
+
+@_uses(parse_thermopro)
+def _thermopro(parse, parser, data, adv):
+    return parse(parser, data, adv.local_name[0:5], adv.mac)
+
+
+@_uses(parse_altbeacon)
+def _altbeacon(parse, parser, data, adv):
+    return parse(parser, data, (data[3] << 8) | data[2], adv.mac)
+
+
+def _is_tilt(data, adv):
+    return int.from_bytes(data[6:22], byteorder='big') in TILT_TYPES
+
+
+def _is_jaalee_ibeacon(data, adv):
+    return int.from_bytes(data[6:22], byteorder='big') in JAALEE_TYPES
+
+
+def _is_ibeacon_pair(data, adv):
+    return len(adv.man_spec_data_list) == 2
+
+
+def _is_teltonika_ibeacon_pair(data, adv):
+    if not _is_ibeacon_pair(data, adv):
+        return False
+    second_man_spec_data = adv.man_spec_data_list[1]
+    return ((second_man_spec_data[3] << 8) | second_man_spec_data[2]) == 0x089A
+
+
+def _lengths(*lengths):
+    return frozenset(lengths)
+
+
+IBEACON = frozenset([0x02])
+
+
+SERVICE_DATA_ENTRIES: tuple[DispatchEntry, ...] = (
+    DispatchEntry(
+        # Health Thermometer service
+        "Relsib (Health Thermometer)", _relsib_health_thermometer, keys=(0x1809,)
+    ),
+    DispatchEntry(
+        # Environmental Sensing
+        "b-parasite", _mac(parse_bparasite), keys=(0x181A,),
+        match=lambda data, adv: len(data) == 22 or len(data) == 20
+    ),
+    DispatchEntry("ATC", _mac(parse_atc), keys=(0x181A,)),
+    DispatchEntry(
+        # Body Composition and Weight Scale
+        "Mi Scale", _mac(parse_miscale), keys=(0x181B, 0x181D)
+    ),
+    DispatchEntry(
+        # User Data and Bond Management
+        "BTHome V1", _bthome, keys=(0x181C, 0x181E)
+    ),
+    DispatchEntry("HolyIOT", _mac(parse_holyiot), keys=(0x5242,)),
+    DispatchEntry(
+        "Relsib", _mac(parse_relsib), keys=(0xAA20, 0xAA21, 0xAA22), local_name=frozenset(["ECo"])
+    ),
+    DispatchEntry("Jaalee", _mac(parse_jaalee), keys=(0xF51C, 0xF525)),
+    DispatchEntry(
+        # Allterco Robotics ltd
+        "BTHome V2", _bthome, keys=(0xFCD2,)
+    ),
+    DispatchEntry("Switchbot", _mac(parse_switchbot), keys=(0xFD3D, 0x0D00)),
+    DispatchEntry(
+        # Hangzhou Tuya Information Technology Co., Ltd
+        "HHCC", _mac(parse_hhcc), keys=(0xFD50,)
+    ),
+    DispatchEntry("Qingping", _mac(parse_qingping), keys=(0xFDCD,)),
+    DispatchEntry("Xiaomi", _mac(parse_xiaomi), keys=(0xFE95,)),
+    DispatchEntry(
+        # Google
+        "KKM", _mac(parse_kkm), keys=(0xFEAA,), match=lambda data, adv: len(data) == 19
+    ),
+    DispatchEntry(
+        "Ruuvitag V2/V4", _mac(parse_ruuvitag), keys=(0xFEAA,),
+        match=lambda data, adv: len(data) >= 23
+    ),
+    DispatchEntry("Google (other)", keys=(0xFEAA,), stop=False),
+    DispatchEntry(
+        # Anhui Huami Information Technology Co., Ltd.
+        "Amazfit", _amazfit_service_data, keys=(0xFEE0,), stop=False
+    ),
+    DispatchEntry(
+        # FIDO
+        "Cleargrass", _mac(parse_qingping), keys=(0xFFF9,)
+    ),
+    DispatchEntry(
+        # Temperature and Humidity
+        "Teltonika (service data)", _teltonika_service_data, keys=(0x2A6E, 0x2A6F)
+    ),
+)
+
+MANUFACTURER_DATA_ENTRIES: tuple[DispatchEntry, ...] = (
+    # Filter on Company Identifier
+    DispatchEntry("Michelin TMS", _mac(parse_michelin_tms), keys=(0x0828,)),
+    DispatchEntry(
+        "Govee H5101/H5102/H5106/H5177", _govee, keys=(0x0001,),
+        data_len=_lengths(0x09, 0x0C, 0x22, 0x25)
+    ),
+    DispatchEntry(
+        "Tilt", _mac(parse_tilt), keys=(0x004C,), subtype=IBEACON, match=_is_tilt, beacon=True
+    ),
+    DispatchEntry(
+        "Jaalee (iBeacon)", _mac(parse_jaalee), keys=(0x004C,), subtype=IBEACON,
+        match=_is_jaalee_ibeacon
+    ),
+    DispatchEntry(
+        # Teltonika Eye (can send both iBeacon and Teltonika data in one message)
+        "Teltonika (iBeacon)", _teltonika_second_record, keys=(0x004C,), subtype=IBEACON,
+        match=_is_teltonika_ibeacon_pair
+    ),
+    DispatchEntry(
+        "iBeacon (pair)", keys=(0x004C,), subtype=IBEACON, match=_is_ibeacon_pair, stop=False
+    ),
+    DispatchEntry("iBeacon", _mac(parse_ibeacon), keys=(0x004C,), subtype=IBEACON, beacon=True),
+    DispatchEntry("Oral-b", _mac(parse_oral_b), keys=(0x00DC,), data_len=_lengths(0x0E)),
+    DispatchEntry("Chef iQ", _mac(parse_chefiq), keys=(0x05CD,), data_len=_lengths(0x15)),
+    DispatchEntry("Oras", _mac(parse_oras), keys=(0x0131,)),
+    DispatchEntry("Miband", _miband, keys=(0x0157,), data_len=_lengths(0x1B)),
+    DispatchEntry("Blustream", _mac(parse_blustream), keys=(0x0194,), data_len=_lengths(0x0C)),
+    DispatchEntry("Ruuvitag V3/V5", _mac(parse_ruuvitag), keys=(0x0499,)),
+    DispatchEntry("Teltonika (Ela rebrand)", _teltonika_joined, keys=(0x0757,)),
+    DispatchEntry("Hörmann", _hormann, keys=(0x07B4,)),
+    DispatchEntry("Teltonika", _name(parse_teltonika), keys=(0x089A,)),
+    DispatchEntry("Mikrotik", _mac(parse_mikrotik), keys=(0x094F,), data_len=_lengths(0x15)),
+    DispatchEntry("Almendo (Blusensor)", _mac(parse_almendo), keys=(0x06E8,)),
+    DispatchEntry("Moat S2", _mac(parse_moat), keys=(0x1000,), data_len=_lengths(0x15)),
+    DispatchEntry(
+        "BlueMaestro", _mac(parse_bluemaestro), keys=(0x0133,), data_len=_lengths(0x11, 0x15)
+    ),
+    DispatchEntry("SmartDry", _mac(parse_smartdry), keys=(0x01AE,), data_len=_lengths(0x0F)),
+    DispatchEntry("Sensirion", _name(parse_sensirion), keys=(0x06D5,)),
+    DispatchEntry(
+        "Air Mentor", _mac(parse_airmentor), keys=(0x2111, 0x2112, 0x2121, 0x2122),
+        data_len=_lengths(0x0B)
+    ),
+    DispatchEntry("Govee H5182", _govee, keys=(0x2730,), data_len=_lengths(0x14, 0x2D)),
+    DispatchEntry("Govee H5184", _govee, keys=(0x1B36,), data_len=_lengths(0x14, 0x2D)),
+    DispatchEntry(
+        "Govee H5185", _govee, keys=(0x4A32, 0x332, 0x4C32), data_len=_lengths(0x17, 0x2D)
+    ),
+    DispatchEntry(
+        "Govee H5183", _govee, keys=(0x67DD, 0xE02F, 0xF79F), data_len=_lengths(0x11, 0x2A),
+        stop=False
+    ),
+    DispatchEntry(
+        "Air Mentor 2S", _mac(parse_airmentor), keys=(0x5112, 0x5122, 0x6111, 0x6121),
+        data_len=_lengths(0x0F)
+    ),
+    DispatchEntry("Govee H5179", _govee, keys=(0x8801,), data_len=_lengths(0x0C, 0x25)),
+    DispatchEntry("Thermobeacon", _mac(parse_thermobeacon), keys=(0xAA55,), data_len=_lengths(0x14)),
+    DispatchEntry("Govee H5191", _govee, keys=(0xAC63,), data_len=_lengths(0x17, 0x2D)),
+    DispatchEntry("Govee H5055", _govee, keys=(0xEA1C,), data_len=_lengths(0x17)),
+    DispatchEntry(
+        "Govee H5051/H5071/H5072/H5075/H5074", _govee, keys=(0xEC88,),
+        data_len=_lengths(0x09, 0x0A, 0x0C, 0x22, 0x24, 0x25)
+    ),
+    DispatchEntry("Grundfos", _mac(parse_grundfos), keys=(0xF214,), data_len=_lengths(0x16)),
+    DispatchEntry(
+        "Sonoff", _mac(parse_sonoff), keys=(0xFFFF,),
+        match=lambda data, adv: data[4:6] == b"\xee\x1b" and adv.mac == b"\x66\x55\x44\x33\x22\x11"
+    ),
+    DispatchEntry("Kegtron", _mac(parse_kegtron), keys=(0xFFFF,), data_len=_lengths(0x1E)),
+    DispatchEntry(
+        "Laica", _mac(parse_laica), keys=(0xA0AC,), data_len=_lengths(0x0F),
+        match=lambda data, adv: data[14] in [0x06, 0x0D]
+    ),
+    DispatchEntry("Senssun IF_B7", _mac(parse_senssun), keys=(0x0100,), data_len=_lengths(0x14)),
+    DispatchEntry("R.W. Beckett", _mac(parse_beckett), keys=(0x061A,)),
+    # Filter on part of the UUID16
+    DispatchEntry(
+        "Xiaogui Scale", _mac(parse_xiaogui), data_len=_lengths(0x10),
+        match=lambda data, adv: data[2] == 0xC0
+    ),
+    DispatchEntry(
+        "iNode", _mac(parse_inode), data_len=_lengths(0x0E), match=lambda data, adv: data[3] == 0x82
+    ),
+    DispatchEntry(
+        "iNode Care Sensors", _mac(parse_inode), data_len=_lengths(0x19),
+        match=lambda data, adv: data[3] in [0x91, 0x92, 0x93, 0x94, 0x95, 0x96, 0x9A, 0x9B, 0x9C, 0x9D]
+    ),
+    # Filter on service class uuid16
+    DispatchEntry(
+        "Jinou BEC07-5", _mac(parse_jinou), data_len=_lengths(0x0E),
+        service_class_uuid16=frozenset([0x20AA])
+    ),
+    DispatchEntry(
+        "Govee H5182/H5184", _govee, data_len=_lengths(0x14, 0x2D),
+        service_class_uuid16=frozenset([0x5182, 0x5184])
+    ),
+    DispatchEntry(
+        "Govee H5183 (uuid16)", _govee, data_len=_lengths(0x11, 0x2A),
+        service_class_uuid16=frozenset([0x5183])
+    ),
+    DispatchEntry(
+        "Govee H5185/H5198", _govee, data_len=_lengths(0x17, 0x30),
+        service_class_uuid16=frozenset([0x5185, 0x5198])
+    ),
+    DispatchEntry(
+        "Thermobeacon (uuid16)", _mac(parse_thermobeacon), keys=(0x0010, 0x0011, 0x0015, 0x0018, 0x001B),
+        data_len=_lengths(0x15, 0x17), service_class_uuid16=frozenset([0xF0FF])
+    ),
+    DispatchEntry(
+        "Inkbird", _name(parse_inkbird), data_len=_lengths(0x0A, 0x0D, 0x0F, 0x13, 0x17),
+        service_class_uuid16=frozenset([0xF0FF]),
+        match=lambda data, adv: (
+            ((data[3] << 8) | data[2]) in [0x0000, 0x0001] or adv.local_name in ["iBBQ", "xBBQ", "sps", "tps"]
+        )
+    ),
+    DispatchEntry(
+        # see below under local_name checks for the other Mocreo models
+        "Mocreo ST7", _name(parse_mocreo), keys=(0x004A,), data_len=_lengths(0x11),
+        local_name=frozenset(["ST7"]), service_class_uuid16=frozenset([0xF0FF])
+    ),
+    DispatchEntry("uuid16 0xF0FF (other)", service_class_uuid16=frozenset([0xF0FF]), stop=False, unknown=True),
+    # Filter on service class uuid128
+    DispatchEntry(
+        "Sensorpush", _mac(parse_sensorpush), data_len=_lengths(0x06, 0x08),
+        match=lambda data, adv: adv.service_class_uuid128 == SENSORPUSH_UUID128
+    ),
+    # Filter on complete local name
+    DispatchEntry(
+        "Inkbird IBS-TH", _name(parse_inkbird), data_len=_lengths(0x0A), local_name=frozenset(["sps", "tps"])
+    ),
+    DispatchEntry(
+        # MOCREO non-ST7 models, see above for ST7
+        "MOCREO", _name(parse_mocreo), data_len=_lengths(0x13), local_name=frozenset(["MOCREO"])
+    ),
+    DispatchEntry(
+        "Thermopro", _thermopro, local_name_prefix=("TP357", "TP359"),
+        match=lambda data, adv: data[0] >= 0x07
+    ),
+    # Filter on other parts of the manufacturer specific data
+    DispatchEntry(
+        "AltBeacon", _altbeacon, data_len=_lengths(0x1B), subtype=frozenset([0xBE]),
+        match=lambda data, adv: data[5] == 0xAC, beacon=True
+    ),
+    DispatchEntry("Acconeer", _mac(parse_acconeer), keys=(0xACC0,), data_len=_lengths(0x12)),
+)
+
+
+def build_dispatch_table(entries):
+    """Index entries on their keys.
+
+    Entries without keys apply to every key. They are merged into the candidate
+    list of each key in table order and also returned as the default list.
+    """
+    generic = tuple(entry for entry in entries if not entry.keys)
+    table = {}
+    for entry in entries:
+        for key in entry.keys:
+            table.setdefault(key, [])
+    for key, candidates in table.items():
+        candidates.extend(entry for entry in entries if not entry.keys or key in entry.keys)
+    return {key: tuple(candidates) for key, candidates in table.items()}, generic
+
+
+SERVICE_DATA_DISPATCH, _ = build_dispatch_table(SERVICE_DATA_ENTRIES)
+MANUFACTURER_DATA_DISPATCH, MANUFACTURER_DATA_DEFAULT = build_dispatch_table(
+    MANUFACTURER_DATA_ENTRIES
+)
+
+# Vendor modules with a parser in the dispatch table
+VENDORS = frozenset(
+    entry.vendor for entry in SERVICE_DATA_ENTRIES + MANUFACTURER_DATA_ENTRIES if entry.vendor
+)
+
+
+class DispatchTable(NamedTuple):
+    """Dispatch tables for service data and manufacturer specific data"""
+    service_data: dict
+    manufacturer_data: dict
+    manufacturer_data_default: tuple
+
+
+DISPATCH_TABLE = DispatchTable(
+    SERVICE_DATA_DISPATCH, MANUFACTURER_DATA_DISPATCH, MANUFACTURER_DATA_DEFAULT
+)
+
+
+def build_vendor_table(vendors) -> DispatchTable:
+    """Return the dispatch tables without the entries of the vendors that are not enabled.
+
+    Entries without parser are kept, they don't belong to a vendor.
+    """
+    vendors = frozenset(vendors)
+
+    def enabled(entries):
+        return tuple(entry for entry in entries if entry.vendor is None or entry.vendor in vendors)
+
+    service_data, _ = build_dispatch_table(enabled(SERVICE_DATA_ENTRIES))
+    manufacturer_data, manufacturer_data_default = build_dispatch_table(
+        enabled(MANUFACTURER_DATA_ENTRIES)
+    )
+    return DispatchTable(service_data, manufacturer_data, manufacturer_data_default)
+
+
+def match_entry(candidates, data: bytes, adv: Advertisement) -> Optional[DispatchEntry]:
+    """Return the first candidate of which all guards pass"""
+    data_len = data[0]
+    for entry in candidates:
+        if (
+            entry.service_class_uuid16 is not None
+            and adv.service_class_uuid16 not in entry.service_class_uuid16
+        ):
+            continue
+        if entry.data_len is not None and data_len not in entry.data_len:
+            continue
+        if entry.subtype is not None and data[4] not in entry.subtype:
+            continue
+        if entry.local_name is not None and adv.local_name not in entry.local_name:
+            continue
+        if (
+            entry.local_name_prefix is not None
+            and not adv.local_name.startswith(entry.local_name_prefix)
+        ):
+            continue
+        if entry.match is not None and not entry.match(data, adv):
+            continue
+        return entry
+    return None
+
+
+def match_service_data(
+    service_data: bytes, adv: Advertisement, table: DispatchTable = DISPATCH_TABLE
+) -> Optional[DispatchEntry]:
+    """Find the parser for a 'Service Data - 16-bit UUID' AD structure"""
+    uuid16 = (service_data[3] << 8) | service_data[2]
+    return match_entry(table.service_data.get(uuid16, ()), service_data, adv)
+
+
+def match_manufacturer_data(
+    man_spec_data: bytes, adv: Advertisement, table: DispatchTable = DISPATCH_TABLE
+) -> Optional[DispatchEntry]:
+    """Find the parser for a 'Manufacturer Specific Data' AD structure"""
+    comp_id = (man_spec_data[3] << 8) | man_spec_data[2]
+    return match_entry(
+        table.manufacturer_data.get(comp_id, table.manufacturer_data_default), man_spec_data, adv
+    )
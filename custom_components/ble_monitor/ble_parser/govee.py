@@ -142,7 +142,7 @@ def parse_govee(self, data: str, service_class_uuid16: int, local_name: str, mac
         elif sensor_id == 1:
             device_type = "H5178-outdoor"
             mac_outdoor = int.from_bytes(mac, 'big') + 1
-            mac = bytearray(mac_outdoor.to_bytes(len(mac), 'big'))
+            mac = mac_outdoor.to_bytes(len(mac), 'big')
         else:
             _LOGGER.debug(
                 "Unknown sensor id for Govee H5178, please report to the developers, data: %s",
@@ -0,0 +1,353 @@
+"""Bounded queues that hand parse results over to an event loop in batches"""
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from threading import Lock
+from time import monotonic
+from typing import Callable, Optional
+
+_LOGGER = logging.getLogger(__name__)
+
+# Policies for a full queue
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+COALESCE = "coalesce"
+POLICIES = (DROP_OLDEST, DROP_NEWEST, COALESCE)
+
+# Key of the sample counts and running sums of the values of a coalesced message
+SAMPLES = "samples"
+# Numeric values that are not summed when messages are coalesced
+_NOT_SUMMED = frozenset(["packet"])
+
+# Number of recent batches of which the size and latency are kept for the statistics
+STATS_WINDOW = 1000
+# Seconds a queue has to be full before a warning is logged
+SATURATION_WARNING = 10
+
+
+def _percentile(values: list, fraction: float):
+    """Return the value at fraction (0..1) of the sorted values."""
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def coalesced_samples(data, key: str) -> tuple:
+    """Return the mean and the number of samples of a value of data that can be coalesced."""
+    try:
+        count, total, _, _ = data[SAMPLES][key]
+    except KeyError:
+        return data[key], 1
+    return total / count, count
+
+
+def coalesced_range(data, key: str) -> tuple:
+    """Return the lowest and the highest sample of a value of data that can be coalesced."""
+    try:
+        _, _, lowest, highest = data[SAMPLES][key]
+    except KeyError:
+        return data[key], data[key]
+    return lowest, highest
+
+
+def _in_loop(loop) -> bool:
+    """Return True if called in loop, while it is running."""
+    try:
+        return asyncio.get_running_loop() is loop
+    except RuntimeError:
+        return False
+
+
+def _merge(pending, item) -> dict:
+    """Return a new item with the keys of the pending item, updated with those of item."""
+    merged = dict(pending)
+    merged.update(item)
+    return merged
+
+
+class HandoffQueue:
+    """Queue of items that are put from any thread and taken in batches in an event loop.
+
+    get() returns all queued items at once. A consumer that waits for items is
+    woken up with a single call_soon_threadsafe when max_items are queued, or
+    when notify() is called, e.g. every few milliseconds by a timer of the
+    producing thread. With max_items 1, it is woken up for every item. Items
+    that are put in the event loop of the consumer wake it up directly.
+
+    With maxsize, the number of queued items is limited. When the queue is
+    full, the policy decides which item is lost: the oldest queued item
+    (drop_oldest), the new item (drop_newest), or, with coalesce, the new item
+    is merged into the queued item of the same device, as given by key(item).
+    If there is no queued item of that device, the oldest item is dropped.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        maxsize: int = 0,
+        policy: str = DROP_OLDEST,
+        key: Optional[Callable] = None,
+        max_items: int = 100,
+        timer=monotonic,
+    ):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown queue policy {policy}")
+        if policy == COALESCE and key is None:
+            raise ValueError("The coalesce policy needs a key")
+        self.name = name
+        self.maxsize = maxsize
+        self.policy = policy
+        self.key = key
+        self.max_items = max_items
+        self.dropped = 0
+        self.coalesced = 0
+        self.high_water = 0
+        self.batches = 0
+        self.items = 0
+        self._timer = timer
+        self._lock = Lock()
+        self._queue = self._new_queue()
+        # the sequence number of the last queued item of each device, for coalesce
+        self._latest = {}
+        self._sequence = 0
+        self._unnotified = 0
+        self._first_put = 0.0
+        self._saturated_since = None
+        self._warned = False
+        self._waiter = None
+        self._notified = False
+        self._closed = False
+        self._sizes = deque(maxlen=STATS_WINDOW)
+        self._latencies = deque(maxlen=STATS_WINDOW)
+
+    def _new_queue(self):
+        return OrderedDict() if self.policy == COALESCE else deque()
+
+    def __len__(self):
+        return len(self._queue)
+
+    def put(self, item):
+        """Queue an item, can be called from any thread."""
+        with self._lock:
+            if self._closed:
+                return
+            queue = self._queue
+            if not queue:
+                self._first_put = self._timer()
+            if self.maxsize and len(queue) >= self.maxsize:
+                self._overflow(item)
+            elif self.policy == COALESCE:
+                self._sequence += 1
+                queue[self._sequence] = item
+                self._latest[self.key(item)] = self._sequence
+            else:
+                queue.append(item)
+            if len(queue) > self.high_water:
+                self.high_water = len(queue)
+            self._unnotified += 1
+            if self._unnotified >= self.max_items:
+                self._notify()
+
+    def _overflow(self, item):
+        # called with the lock held, the queue is full
+        queue = self._queue
+        if self.policy == DROP_NEWEST:
+            self.dropped += 1
+        elif self.policy == DROP_OLDEST:
+            queue.popleft()
+            queue.append(item)
+            self.dropped += 1
+        else:
+            device = self.key(item)
+            sequence = self._latest.get(device)
+            if sequence in queue:
+                queue[sequence] = _merge(queue[sequence], item)
+                self.coalesced += 1
+            else:
+                queue.popitem(last=False)
+                self._sequence += 1
+                queue[self._sequence] = item
+                self._latest[device] = self._sequence
+                self.dropped += 1
+        now = self._timer()
+        if self._saturated_since is None:
+            self._saturated_since = now
+        elif not self._warned and now - self._saturated_since >= SATURATION_WARNING:
+            self._warned = True
+            _LOGGER.warning(
+                "The %s queue is full for more than %i seconds, %i BLE advertisements are dropped"
+                " and %i are coalesced so far. Home Assistant can't keep up with the BLE advertisements",
+                self.name,
+                SATURATION_WARNING,
+                self.dropped,
+                self.coalesced,
+            )
+
+    def notify(self):
+        """Wake up a waiting consumer if there are queued items, can be called from any thread."""
+        with self._lock:
+            if self._queue:
+                self._notify()
+
+    def _notify(self):
+        # called with the lock held
+        self._unnotified = 0
+        waiter = self._waiter
+        if waiter is None or self._notified:
+            return
+        loop = waiter.get_loop()
+        if _in_loop(loop):
+            # put in the event loop of the consumer, e.g. by the HCI scanner
+            if not waiter.done():
+                waiter.set_result(None)
+            return
+        self._notified = True
+        try:
+            loop.call_soon_threadsafe(self._wakeup, waiter)
+        except RuntimeError:
+            # the event loop is closed, e.g. during the shutdown of Home Assistant
+            pass
+
+    def _wakeup(self, waiter):
+        with self._lock:
+            self._notified = False
+        if not waiter.done():
+            waiter.set_result(None)
+
+    async def get(self) -> Optional[list]:
+        """Return all queued items, after waiting for items if there are none.
+
+        Returns None when the queue is closed and all items are taken.
+        """
+        while True:
+            with self._lock:
+                if self._queue:
+                    return self._take()
+                if self._closed:
+                    return None
+                waiter = self._waiter = asyncio.get_running_loop().create_future()
+            try:
+                await waiter
+            finally:
+                self._waiter = None
+
+    def _take(self) -> list:
+        # called with the lock held
+        queue = self._queue
+        batch = list(queue.values()) if self.policy == COALESCE else list(queue)
+        self._queue = self._new_queue()
+        self._latest.clear()
+        self._unnotified = 0
+        self._saturated_since = None
+        self._warned = False
+        self.batches += 1
+        self.items += len(batch)
+        self._sizes.append(len(batch))
+        self._latencies.append(self._timer() - self._first_put)
+        return batch
+
+    def close(self):
+        """Close the queue, can be called from any thread.
+
+        Items that are put after the close are ignored. The consumer still gets
+        the queued items, and then None.
+        """
+        with self._lock:
+            self._closed = True
+            self._notify()
+
+    def stats(self) -> dict:
+        """Return the counters of the queue, and the size and latency of the recent batches.
+
+        The latency of a batch is the time from the put of its first item until
+        the batch is taken by the consumer.
+        """
+        with self._lock:
+            # the consumer appends to the deques in the event loop
+            sizes = list(self._sizes)
+            latencies = list(self._latencies)
+            stats = {
+                "size": len(self._queue),
+                "high_water": self.high_water,
+                "dropped": self.dropped,
+                "coalesced": self.coalesced,
+                "batches": self.batches,
+                "items": self.items,
+            }
+        sizes.sort()
+        latencies.sort()
+        if sizes:
+            stats["batch_size"] = {
+                "mean": round(sum(sizes) / len(sizes), 1),
+                "p50": _percentile(sizes, 0.5),
+                "p99": _percentile(sizes, 0.99),
+                "max": sizes[-1],
+            }
+            stats["latency_ms"] = {
+                "p50": round(_percentile(latencies, 0.5) * 1000, 2),
+                "p90": round(_percentile(latencies, 0.9) * 1000, 2),
+                "p99": round(_percentile(latencies, 0.99) * 1000, 2),
+                "max": round(latencies[-1] * 1000, 2),
+            }
+        return stats
+
+
+class Coalescer:
+    """Merge the messages of a device into one pending message per device.
+
+    The pending message of a device holds the latest value of each key, and
+    for each numeric value (except the packet id) the number of samples, their
+    running sum and their lowest and highest value, in a dict under the
+    samples key. flush() returns the
+    pending messages, such that the consumer gets at most one message per
+    device per flush. The messages that are put are not changed. put() and
+    flush() can be called from any thread.
+    """
+
+    def __init__(self, key: Callable):
+        self.key = key
+        self.merged = 0
+        self._lock = Lock()
+        self._pending = {}
+
+    def __len__(self):
+        return len(self._pending)
+
+    def put(self, item):
+        """Merge an item into the pending message of its device."""
+        device = self.key(item)
+        with self._lock:
+            pending = self._pending.get(device)
+            if pending is None:
+                self._pending[device] = dict(item)
+                return
+            samples = pending.get(SAMPLES)
+            if samples is None:
+                samples = pending[SAMPLES] = {}
+            for name, value in item.items():
+                if type(value) not in (int, float) or name in _NOT_SUMMED:
+                    continue
+                sample = samples.get(name)
+                if sample is not None:
+                    sample[0] += 1
+                    sample[1] += value
+                    if value < sample[2]:
+                        sample[2] = value
+                    elif value > sample[3]:
+                        sample[3] = value
+                elif type(pending.get(name)) in (int, float):
+                    previous = pending[name]
+                    samples[name] = [2, previous + value, min(previous, value), max(previous, value)]
+                else:
+                    samples[name] = [1, value, value, value]
+            pending.update(item)
+            self.merged += 1
+
+    def flush(self) -> list:
+        """Return the pending messages, in the order their devices were first seen."""
+        with self._lock:
+            pending = self._pending
+            self._pending = {}
+        return list(pending.values())
+
+    def stats(self) -> dict:
+        """Return the number of devices with a pending message and of merged messages."""
+        return {"pending": len(self._pending), "merged": self.merged}
@@ -1,17 +1,63 @@
 """Helpers for bleparser"""
+from functools import lru_cache
+from typing import NamedTuple, Optional
 from uuid import UUID
 
+# Number of MAC addresses and UUIDs of which the string forms are cached
+IDENTIFIER_CACHE_SIZE = 4096
+
+
+class Identifier(NamedTuple):
+    """String forms of a MAC address or UUID"""
+    raw: bytes
+    # AABBCCDDEEFF, also the cleaned identifier of a MAC address or UUID
+    unformatted: str
+    # AA:BB:CC:DD:EE:FF
+    formatted: str
+    # e2c56db5-dffb-48d2-b060-d0f5a71096e0, only for 16 bytes
+    uuid: Optional[str]
+
+    @property
+    def normalized(self) -> str:
+        """Return the normalized form, the UUID or the formatted MAC address"""
+        return self.uuid or self.formatted
+
+
+@lru_cache(maxsize=IDENTIFIER_CACHE_SIZE)
+def identifier(raw: bytes) -> Identifier:
+    """Return the (cached) string forms of a MAC address or UUID"""
+    unformatted = raw.hex().upper()
+    formatted = ':'.join(unformatted[i:i + 2] for i in range(0, len(unformatted), 2))
+    uuid = str(UUID(bytes=raw)) if len(raw) == 16 else None
+    return Identifier(raw, unformatted, formatted, uuid)
+
+
+@lru_cache(maxsize=IDENTIFIER_CACHE_SIZE)
+def identifier_from_string(value: str) -> Optional[Identifier]:
+    """Return the (cached) string forms of a MAC address or UUID string, None if it is invalid"""
+    hex_value = value.replace('-', '').replace(':', '')
+    if len(hex_value) not in (12, 32):
+        return None
+    try:
+        raw = bytes.fromhex(hex_value)
+    except ValueError:
+        return None
+    if len(raw) * 2 != len(hex_value):
+        return None
+    return identifier(raw)
+
 
 def to_uuid(uuid: bytes) -> str:
     """Return formatted UUID"""
-    return str(UUID(''.join(f'{i:02X}' for i in uuid)))
+    # raises a ValueError if it is not 16 bytes
+    return identifier(uuid).uuid or str(UUID(bytes=uuid))
 
 
 def to_mac(addr: bytes) -> str:
     """Return formatted MAC address"""
-    return ':'.join(f'{i:02X}' for i in addr)
+    return identifier(addr).formatted
 
 
 def to_unformatted_mac(addr: bytes) -> str:
     """Return unformatted MAC address"""
-    return ''.join(f'{i:02X}' for i in addr[:])
+    return identifier(addr).unformatted
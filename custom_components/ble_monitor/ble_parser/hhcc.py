@@ -44,7 +44,7 @@ def parse_hhcc(self, data: str, mac: bytes):
 
     # Check for duplicate messages
     if packet_id:
-        print("packet_id is", packet_id)
+        _LOGGER.debug("packet_id is %s", packet_id)
         try:
             prev_packet = self.lpacket_ids[mac]
         except KeyError:
@@ -0,0 +1,93 @@
+"""Worker pool that parses advertising reports sharded by MAC address"""
+import logging
+from queue import SimpleQueue
+from threading import Thread
+
+from . import BleParser
+from .tokenizer import split_hci_event
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def _merge_stats(total: dict, stats: dict):
+    for name, value in stats.items():
+        if isinstance(value, dict):
+            _merge_stats(total.setdefault(name, {}), value)
+        else:
+            total[name] = total.get(name, 0) + value
+
+
+class ParserPool:
+    """Parse HCI events in a pool of worker threads.
+
+    The advertising reports of an HCI event are sharded over the workers by the
+    hash of their MAC address. The reports of one device are therefore always
+    parsed in order by the same worker, which has its own BleParser with the
+    packet id, priority and dedup state of its devices. The result of each
+    report is handed to callback(sensor_data, tracker_data, *args) in the
+    worker thread, the callback has to be thread safe.
+    """
+
+    def __init__(self, callback, workers=2, **parser_kwargs):
+        self.callback = callback
+        self.parsers = [BleParser(**parser_kwargs) for _ in range(workers)]
+        self._queues = [SimpleQueue() for _ in range(workers)]
+        self._threads = [
+            Thread(target=self._run, args=(worker,), name=f"ble_parser_{worker}", daemon=True)
+            for worker in range(workers)
+        ]
+
+    def start(self):
+        """Start the worker threads."""
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout=None):
+        """Parse the remaining reports and stop the worker threads."""
+        for shard in self._queues:
+            shard.put(None)
+        for thread in self._threads:
+            if thread.is_alive():
+                thread.join(timeout)
+
+    def submit(self, data, *args):
+        """Queue the advertising reports of a raw HCI event for parsing."""
+        workers = len(self._queues)
+        for mac, rssi, adpayload_start, adpayload_size in split_hci_event(data):
+            self._queues[hash(mac) % workers].put(
+                (data, mac, rssi, adpayload_start, adpayload_size, args)
+            )
+
+    def stats(self):
+        """Return the parser state and cache statistics, summed over the workers."""
+        stats = {}
+        for parser in self.parsers:
+            _merge_stats(stats, parser.stats())
+        stats["pool"] = {
+            "workers": len(self.parsers),
+            "queued": sum(shard.qsize() for shard in self._queues),
+        }
+        return stats
+
+    def diagnostics(self):
+        """Return the parser statistics and the devices that fail to decrypt, of all workers."""
+        decryption_failures = {}
+        for parser in self.parsers:
+            decryption_failures.update(parser.decryption_failures.diagnostics())
+        return {"stats": self.stats(), "decryption_failures": decryption_failures}
+
+    def _run(self, worker):
+        parser = self.parsers[worker]
+        shard = self._queues[worker]
+        while True:
+            report = shard.get()
+            if report is None:
+                break
+            data, mac, rssi, adpayload_start, adpayload_size, args = report
+            try:
+                sensor_data, tracker_data = parser.parse_report(
+                    data, mac, rssi, adpayload_start, adpayload_size
+                )
+                self.callback(sensor_data, tracker_data, *args)
+            except Exception:
+                _LOGGER.exception("Failed to parse advertising report: %s", data.hex())
@@ -0,0 +1,144 @@
+"""Prefilter that rejects advertisements that none of the parsers can handle"""
+from typing import Optional
+
+from .dispatch import DISPATCH_TABLE, DispatchTable
+from .tokenizer import SONOFF_MAC
+
+
+def _encode(names) -> Optional[tuple]:
+    if names is None:
+        return None
+    return tuple(name.encode("utf-8") for name in names)
+
+
+def build_signature(candidates) -> tuple:
+    """Return the signature of the candidates that have a parser, per data length.
+
+    Element n of the signature holds the conditions for a record with data
+    length n (data[0]). It is True if there is a parser without further
+    conditions, or a tuple with (subtype, advertisement_guards) conditions, of
+    which one has to match. The advertisement guards (service_class_uuid16,
+    local_name and local_name_prefix) depend on other AD structures and are
+    checked after the scan.
+    """
+    signature = [[] for _ in range(256)]
+    for entry in candidates:
+        if entry.handler is None:
+            continue
+        advertisement_guards = None
+        if (
+            entry.service_class_uuid16 is not None
+            or entry.local_name is not None
+            or entry.local_name_prefix is not None
+        ):
+            advertisement_guards = (
+                entry.service_class_uuid16,
+                _encode(entry.local_name),
+                _encode(entry.local_name_prefix),
+            )
+        if entry.subtype is None and advertisement_guards is None:
+            condition = True
+        else:
+            condition = (entry.subtype, advertisement_guards)
+        for data_len in entry.data_len or range(256):
+            if condition is True:
+                signature[data_len] = True
+            elif signature[data_len] is not True and condition not in signature[data_len]:
+                signature[data_len].append(condition)
+    return tuple(
+        conditions if conditions is True else tuple(conditions) for conditions in signature
+    )
+
+
+def _build_signature_table(table: dict) -> dict:
+    # keys with the same candidates share their signature
+    signatures = {}
+    return {
+        key: signatures.setdefault(candidates, build_signature(candidates))
+        for key, candidates in table.items()
+    }
+
+
+NO_PARSER = ((),) * 256
+SERVICE_DATA_SIGNATURES = _build_signature_table(DISPATCH_TABLE.service_data)
+MANUFACTURER_DATA_SIGNATURES = _build_signature_table(DISPATCH_TABLE.manufacturer_data)
+MANUFACTURER_DATA_DEFAULT_SIGNATURE = build_signature(DISPATCH_TABLE.manufacturer_data_default)
+
+
+class Prefilter:
+    """Fast reject of advertisements before the AD structures are decoded.
+
+    The raw AD structures are scanned once. An advertisement is accepted as
+    soon as a service data or manufacturer specific data AD structure matches
+    the signature of one of the parsers in the dispatch tables. Conditions that
+    also depend on the service class UUID16 or the local name are checked after
+    the scan. Only the parsers in the given dispatch table are considered.
+    """
+
+    def __init__(self, table: DispatchTable = DISPATCH_TABLE):
+        self.accepted = 0
+        self.rejected = 0
+        if table is DISPATCH_TABLE:
+            self._service_data = SERVICE_DATA_SIGNATURES
+            self._manufacturer_data = MANUFACTURER_DATA_SIGNATURES
+            self._manufacturer_data_default = MANUFACTURER_DATA_DEFAULT_SIGNATURE
+        else:
+            self._service_data = _build_signature_table(table.service_data)
+            self._manufacturer_data = _build_signature_table(table.manufacturer_data)
+            self._manufacturer_data_default = build_signature(table.manufacturer_data_default)
+
+    def accepts(self, data: bytes, start: int, size: int, mac: bytes) -> bool:
+        """Return True if the advertisement in data[start:start + size] can be parsed"""
+        service_class_uuid16 = None
+        local_names = []
+        pending = []
+        while size > 1:
+            adstuct_size = data[start] + 1
+            if adstuct_size > 1 and adstuct_size <= size:
+                adstuct_type = data[start + 1]
+                conditions = ()
+                if adstuct_type == 0x16 and adstuct_size > 4:
+                    uuid16 = (data[start + 3] << 8) | data[start + 2]
+                    conditions = self._service_data.get(uuid16, NO_PARSER)[adstuct_size - 1]
+                elif adstuct_size > 3 and (
+                    adstuct_type == 0xFF or (adstuct_type == 0x05 and mac == SONOFF_MAC)
+                ):
+                    comp_id = (data[start + 3] << 8) | data[start + 2]
+                    conditions = self._manufacturer_data.get(
+                        comp_id, self._manufacturer_data_default
+                    )[adstuct_size - 1]
+                elif adstuct_type == 0x02 or adstuct_type == 0x03:
+                    if adstuct_size > 3:
+                        service_class_uuid16 = (data[start + 2] << 8) | data[start + 3]
+                elif adstuct_type == 0x08 or adstuct_type == 0x09:
+                    # shortened or complete local name
+                    local_names.append(data[start + 2:start + adstuct_size])
+                if conditions is True:
+                    self.accepted += 1
+                    return True
+                for subtype, advertisement_guards in conditions:
+                    if subtype is not None and (adstuct_size < 5 or data[start + 4] not in subtype):
+                        continue
+                    if advertisement_guards is not None:
+                        pending.append(advertisement_guards)
+                        continue
+                    self.accepted += 1
+                    return True
+            size -= adstuct_size
+            start += adstuct_size
+
+        for uuid16_guard, local_name_guard, local_name_prefix_guard in pending:
+            if uuid16_guard is not None and service_class_uuid16 not in uuid16_guard:
+                continue
+            if local_name_guard is not None and not any(
+                local_name in local_name_guard for local_name in local_names
+            ):
+                continue
+            if local_name_prefix_guard is not None and not any(
+                local_name.startswith(local_name_prefix_guard) for local_name in local_names
+            ):
+                continue
+            self.accepted += 1
+            return True
+        self.rejected += 1
+        return False
@@ -2,10 +2,16 @@
 import logging
 from struct import unpack
 
+from .arbitration import LOWER
 from .helpers import to_mac, to_unformatted_mac
 
 _LOGGER = logging.getLogger(__name__)
 
+# Device types that also send MiBeacon advertisements
+QINGPING_DUAL_FORMAT_TYPES = frozenset(["CGG1"])
+# Priority of these devices in the source arbitration, above MiBeacon (19) and below ATC (29)
+QINGPING_PRIORITY = 24
+
 
 def parse_qingping(self, data: bytes, mac: bytes):
     """Qingping parser"""
@@ -38,6 +44,11 @@ def parse_qingping(self, data: bytes, mac: bytes):
             qingping_mac_reversed = data[6:12]
             qingping_mac = qingping_mac_reversed[::-1]
 
+        if device_type in QINGPING_DUAL_FORMAT_TYPES and qingping_mac == mac:
+            # the MiBeacon advertisements of the device are rejected before decryption
+            if self.source_arbiter.arbitrate(mac, QINGPING_PRIORITY) == LOWER:
+                return None
+
         result = {
             "packet": "no packet id",
         }
@@ -4,10 +4,14 @@ import logging
 import math
 import struct
 
+from .arbitration import LOWER
 from .helpers import to_mac, to_unformatted_mac
 
 _LOGGER = logging.getLogger(__name__)
 
+# Priority of the data formats in the source arbitration, for tags that send more than one format
+RUUVITAG_PRIORITY = {2: 9, 4: 9, 3: 19, 5: 29}
+
 
 def parse_ruuvitag(self, data: bytes, mac: bytes):
     """Ruuvitag parser"""
@@ -29,6 +33,8 @@ def parse_ruuvitag(self, data: bytes, mac: bytes):
                 if len(encoded) > 8:
                     version = 4
                     encoded = encoded[:8]
+                if self.source_arbiter.arbitrate(mac, RUUVITAG_PRIORITY[version]) == LOWER:
+                    return None
                 decoded = bytearray(base64.b64decode(encoded, "-_"))
 
                 (version, humi, temp, frac, press) = struct.unpack(">BBbBH", decoded)
@@ -59,6 +65,10 @@ def parse_ruuvitag(self, data: bytes, mac: bytes):
         comp_id = (data[3] << 8) | data[2]
         if comp_id == 0x0499:
             version = data[4]
+            if version in RUUVITAG_PRIORITY and self.source_arbiter.arbitrate(
+                mac, RUUVITAG_PRIORITY[version]
+            ) == LOWER:
+                return None
             if version == 3:
                 # Ruuvitag V3 format
                 (version, humi, temp, frac, press, accx, accy, accz, volt) = struct.unpack(
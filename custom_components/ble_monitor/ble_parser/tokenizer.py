@@ -0,0 +1,123 @@
+"""Tokenizer for HCI LE advertising report events and their AD structures"""
+SONOFF_MAC = b"\x66\x55\x44\x33\x22\x11"
+
+
+def split_hci_event(data: bytes) -> list:
+    """Split a HCI LE Meta event in its advertising reports.
+
+    Supports LE Advertising Report (0x02) and LE Extended Advertising Report
+    (0x0D) events with one or more reports. The reports are laid out one after
+    the other, as the Linux kernel parses them.
+
+    Returns a list with (mac, rssi, adpayload_start, adpayload_size) per report,
+    or an empty list when the event length does not match its reports.
+    """
+    try:
+        is_ext_packet = data[3] == 0x0D
+        num_reports = data[4]
+    except IndexError:
+        return []
+    # check for BTLE msg size
+    msg_length = data[2] + 3
+    if msg_length != len(data):
+        return []
+    reports = []
+    report_start = 5
+    for _ in range(num_reports):
+        if is_ext_packet:
+            # event type [2], address type [1], address [6], primary PHY [1], secondary PHY [1],
+            # SID [1], TX power [1], RSSI [1], interval [2], direct address type [1],
+            # direct address [6], data length [1], data [data length]
+            adpayload_start = report_start + 24
+            rssi_index = report_start + 13
+        else:
+            # event type [1], address type [1], address [6], data length [1],
+            # data [data length], RSSI [1]
+            adpayload_start = report_start + 9
+        if adpayload_start > msg_length:
+            return []
+        adpayload_size = data[adpayload_start - 1]
+        report_end = adpayload_start + adpayload_size
+        if not is_ext_packet:
+            rssi_index = report_end
+            report_end += 1
+        if report_end > msg_length:
+            return []
+        rssi = data[rssi_index]
+        # strange positive RSSI workaround
+        if rssi > 127:
+            rssi = rssi - 256
+        # MAC address (reversed in a single slice)
+        mac_start = report_start + (3 if is_ext_packet else 2)
+        mac = data[mac_start + 5:mac_start - 1:-1]
+        reports.append((mac, rssi, adpayload_start, adpayload_size))
+        report_start = report_end
+    if report_start != msg_length:
+        return []
+    return reports
+
+
+def tokenize_ad_structures(data: bytes, start: int, size: int, mac: bytes):
+    """Walk the AD structures in data[start:start + size] once.
+
+    The walk works on offsets in the raw HCI event. Only the AD structures that
+    are handed to the vendor parsers are copied out of the event, all other
+    structures (flags, tx power, appearance, ...) are skipped without slicing.
+
+    Returns (local_name, service_class_uuid16, service_class_uuid128,
+    service_data_list, man_spec_data_list).
+    """
+    complete_local_name = ""
+    shortened_local_name = ""
+    service_class_uuid16 = None
+    service_class_uuid128 = None
+    service_data_list = []
+    man_spec_data_list = []
+
+    while size > 1:
+        adstuct_size = data[start] + 1
+        if adstuct_size > 1 and adstuct_size <= size:
+            end = start + adstuct_size
+            # https://www.bluetooth.com/specifications/assigned-numbers/generic-access-profile/
+            adstuct_type = data[start + 1]
+            if adstuct_type == 0x16 and adstuct_size > 4:
+                # AD type 'Service Data - 16-bit UUID'
+                service_data_list.append(data[start:end])
+            elif adstuct_type == 0xFF:
+                # AD type 'Manufacturer Specific Data'
+                # https://www.bluetooth.com/specifications/assigned-numbers/company-identifiers/
+                man_spec_data_list.append(data[start:end])
+            elif adstuct_type == 0x02 or adstuct_type == 0x03:
+                # AD type '(In)complete List of 16-bit Service Class UUIDs'
+                if adstuct_size > 3:
+                    service_class_uuid16 = (data[start + 2] << 8) | data[start + 3]
+            elif adstuct_type == 0x05:
+                # AD type 'Complete List of 32-bit Service Class UUIDs'
+                if mac == SONOFF_MAC:
+                    # Sonoff specific data
+                    man_spec_data_list.append(data[start:end])
+            elif adstuct_type == 0x06:
+                # AD type '128-bit Service Class UUIDs'
+                service_class_uuid128 = data[start + 2:end]
+            elif adstuct_type == 0x08:
+                # AD type 'shortened local name'
+                try:
+                    shortened_local_name = data[start + 2:end].decode("utf-8")
+                except UnicodeDecodeError:
+                    shortened_local_name = ""
+            elif adstuct_type == 0x09:
+                # AD type 'complete local name'
+                try:
+                    complete_local_name = data[start + 2:end].decode("utf-8")
+                except UnicodeDecodeError:
+                    complete_local_name = ""
+        size -= adstuct_size
+        start += adstuct_size
+
+    return (
+        complete_local_name or shortened_local_name,
+        service_class_uuid16,
+        service_class_uuid128,
+        service_data_list,
+        man_spec_data_list,
+    )
@@ -2,10 +2,11 @@
 import logging
 import math
 import struct
+from typing import Callable, NamedTuple
 
-from Cryptodome.Cipher import AES
 from homeassistant.util import datetime
 
+from .arbitration import LOWER, SAME
 from .helpers import to_mac, to_unformatted_mac
 
 _LOGGER = logging.getLogger(__name__)
@@ -90,6 +91,11 @@ XIAOMI_TYPE_DICT = {
     0x64C5: "PTX-F1-Display"
 }
 
+# Device types that can also send their measurements in another format (ATC, Qingping)
+XIAOMI_DUAL_FORMAT_TYPES = frozenset(["LYWSD03MMC", "CGG1", "MHO-C401", "CGDK2"])
+# Priority of MiBeacon advertisements of these devices in the source arbitration
+XIAOMI_PRIORITY = 19
+
 # Structured objects for data conversions
 TH_STRUCT = struct.Struct("<hH")
 H_STRUCT = struct.Struct("<H")
@@ -689,7 +695,7 @@ def obj2000(xobj):
 def obj3003(xobj):
     """Brushing"""
     result = {}
-    print("brush %s", xobj.hex())
+    _LOGGER.debug("brush %s", xobj.hex())
     start_obj = xobj[0]
     if start_obj == 0:
         # Start of brushing
@@ -1394,96 +1400,139 @@ def obj6e16(xobj):
     return result
 
 
+class XiaomiDataObject(NamedTuple):
+    """Descriptor of a Xiaomi data object"""
+    # converter of the object data into measurements
+    converter: Callable[..., dict]
+    # the converter has the device type as second argument
+    with_device_type: bool = False
+    # objects without data are converted as well
+    allow_empty: bool = False
+
+
 # Dataobject dictionary
-# {dataObject_id: (converter}
-xiaomi_dataobject_dict = {
-    0x0003: obj0003,
-    0x0006: obj0006,
-    0x0007: obj0007,
-    0x0008: obj0008,
-    0x0010: obj0010,
-    0x000A: obj000a,
-    0x000B: obj000b,
-    0x000F: obj000f,
-    0x1001: obj1001,
-    0x1004: obj1004,
-    0x1005: obj1005,
-    0x1006: obj1006,
-    0x1007: obj1007,
-    0x1008: obj1008,
-    0x1009: obj1009,
-    0x1010: obj1010,
-    0x1012: obj1012,
-    0x1013: obj1013,
-    0x1014: obj1014,
-    0x1015: obj1015,
-    0x1017: obj1017,
-    0x1018: obj1018,
-    0x1019: obj1019,
-    0x101B: obj101b,
-    0x100A: obj100a,
-    0x100D: obj100d,
-    0x100E: obj100e,
-    0x2000: obj2000,
-    0x3003: obj3003,
-    0x4801: obj4801,
-    0x4802: obj4802,
-    0x4803: obj4803,
-    0x4804: obj4804,
-    0x4805: obj4805,
-    0x4806: obj4806,
-    0x4808: obj4808,
-    0x4810: obj4810,
-    0x4811: obj4811,
-    0x4818: obj4818,
-    0x483c: obj483c,
-    0x483d: obj483d,
-    0x483e: obj483e,
-    0x483f: obj483f,
-    0x4840: obj4840,
-    0x484e: obj484e,
-    0x484f: obj484f,
-    0x4850: obj4850,
-    0x4851: obj4851,
-    0x4852: obj4852,
-    0x4a01: obj4a01,
-    0x4a08: obj4a08,
-    0x4a0c: obj4a0c,
-    0x4a0d: obj4a0d,
-    0x4a0e: obj4a0e,
-    0x4a0f: obj4a0f,
-    0x4a12: obj4a12,
-    0x4a13: obj4a13,
-    0x4a1a: obj4a1a,
-    0x4a1c: obj4a1c,
-    0x4c01: obj4c01,
-    0x4c02: obj4c02,
-    0x4c03: obj4c03,
-    0x4c08: obj4c08,
-    0x4c14: obj4c14,
-    0x4e01: obj4e01,
-    0x4e0c: obj4e0c,
-    0x4e0d: obj4e0d,
-    0x4e0e: obj4e0e,
-    0x4e16: obj4e16,
-    0x4e17: obj4e17,
-    0x4e1c: obj4e1c,
-    0x5003: obj5003,
-    0x5010: obj5010,
-    0x5011: obj5011,
-    0x5403: obj5403,
-    0x5414: obj5414,
-    0x5601: obj5601,
-    0x560c: obj560c,
-    0x560d: obj560d,
-    0x560e: obj560e,
-    0x5a16: obj5a16,
-    0x6012: obj6012,
-    0x605d: obj605d,
-    0x6e16: obj6e16
+# {dataObject_id: XiaomiDataObject}
+XIAOMI_DATA_OBJECTS = {
+    0x0003: XiaomiDataObject(obj0003),
+    0x0006: XiaomiDataObject(obj0006),
+    0x0007: XiaomiDataObject(obj0007),
+    0x0008: XiaomiDataObject(obj0008, with_device_type=True),
+    0x0010: XiaomiDataObject(obj0010),
+    0x000A: XiaomiDataObject(obj000a),
+    0x000B: XiaomiDataObject(obj000b, with_device_type=True),
+    0x000F: XiaomiDataObject(obj000f, with_device_type=True),
+    0x1001: XiaomiDataObject(obj1001, with_device_type=True),
+    0x1004: XiaomiDataObject(obj1004),
+    0x1005: XiaomiDataObject(obj1005),
+    0x1006: XiaomiDataObject(obj1006),
+    0x1007: XiaomiDataObject(obj1007),
+    0x1008: XiaomiDataObject(obj1008),
+    0x1009: XiaomiDataObject(obj1009),
+    0x1010: XiaomiDataObject(obj1010),
+    0x1012: XiaomiDataObject(obj1012),
+    0x1013: XiaomiDataObject(obj1013),
+    0x1014: XiaomiDataObject(obj1014),
+    0x1015: XiaomiDataObject(obj1015),
+    0x1017: XiaomiDataObject(obj1017),
+    0x1018: XiaomiDataObject(obj1018),
+    0x1019: XiaomiDataObject(obj1019),
+    0x101B: XiaomiDataObject(obj101b),
+    0x100A: XiaomiDataObject(obj100a),
+    0x100D: XiaomiDataObject(obj100d),
+    0x100E: XiaomiDataObject(obj100e, with_device_type=True),
+    0x2000: XiaomiDataObject(obj2000),
+    0x3003: XiaomiDataObject(obj3003),
+    0x4801: XiaomiDataObject(obj4801),
+    0x4802: XiaomiDataObject(obj4802),
+    0x4803: XiaomiDataObject(obj4803),
+    0x4804: XiaomiDataObject(obj4804),
+    0x4805: XiaomiDataObject(obj4805),
+    0x4806: XiaomiDataObject(obj4806),
+    0x4808: XiaomiDataObject(obj4808),
+    0x4810: XiaomiDataObject(obj4810),
+    0x4811: XiaomiDataObject(obj4811),
+    0x4818: XiaomiDataObject(obj4818),
+    0x483c: XiaomiDataObject(obj483c),
+    0x483d: XiaomiDataObject(obj483d),
+    0x483e: XiaomiDataObject(obj483e),
+    0x483f: XiaomiDataObject(obj483f),
+    0x4840: XiaomiDataObject(obj4840),
+    0x484e: XiaomiDataObject(obj484e, with_device_type=True),
+    0x484f: XiaomiDataObject(obj484f),
+    0x4850: XiaomiDataObject(obj4850),
+    0x4851: XiaomiDataObject(obj4851),
+    0x4852: XiaomiDataObject(obj4852),
+    0x4a01: XiaomiDataObject(obj4a01),
+    0x4a08: XiaomiDataObject(obj4a08),
+    0x4a0c: XiaomiDataObject(obj4a0c, allow_empty=True),
+    0x4a0d: XiaomiDataObject(obj4a0d, allow_empty=True),
+    0x4a0e: XiaomiDataObject(obj4a0e, allow_empty=True),
+    0x4a0f: XiaomiDataObject(obj4a0f),
+    0x4a12: XiaomiDataObject(obj4a12),
+    0x4a13: XiaomiDataObject(obj4a13),
+    0x4a1a: XiaomiDataObject(obj4a1a),
+    0x4a1c: XiaomiDataObject(obj4a1c),
+    0x4c01: XiaomiDataObject(obj4c01),
+    0x4c02: XiaomiDataObject(obj4c02),
+    0x4c03: XiaomiDataObject(obj4c03),
+    0x4c08: XiaomiDataObject(obj4c08),
+    0x4c14: XiaomiDataObject(obj4c14),
+    0x4e01: XiaomiDataObject(obj4e01),
+    0x4e0c: XiaomiDataObject(obj4e0c, with_device_type=True, allow_empty=True),
+    0x4e0d: XiaomiDataObject(obj4e0d, with_device_type=True, allow_empty=True),
+    0x4e0e: XiaomiDataObject(obj4e0e, with_device_type=True, allow_empty=True),
+    0x4e16: XiaomiDataObject(obj4e16),
+    0x4e17: XiaomiDataObject(obj4e17),
+    0x4e1c: XiaomiDataObject(obj4e1c),
+    0x5003: XiaomiDataObject(obj5003),
+    0x5010: XiaomiDataObject(obj5010),
+    0x5011: XiaomiDataObject(obj5011),
+    0x5403: XiaomiDataObject(obj5403),
+    0x5414: XiaomiDataObject(obj5414),
+    0x5601: XiaomiDataObject(obj5601),
+    0x560c: XiaomiDataObject(obj560c, with_device_type=True),
+    0x560d: XiaomiDataObject(obj560d, with_device_type=True),
+    0x560e: XiaomiDataObject(obj560e, with_device_type=True),
+    0x5a16: XiaomiDataObject(obj5a16),
+    0x6012: XiaomiDataObject(obj6012),
+    0x605d: XiaomiDataObject(obj605d),
+    0x6e16: XiaomiDataObject(obj6e16)
 }
 
 
+def xiaomi_sinfo(data: bytes, payload: bytes) -> str:
+    """Return the frame control and capability information of a MiBeacon for logging"""
+    frctrl = data[4] + (data[5] << 8)
+    device_id = data[6] + (data[7] << 8)
+    frctrl_auth_mode = (frctrl >> 10) & 3
+    sinfo = [
+        f"MiVer: {frctrl >> 12}",
+        f"DevID: {hex(device_id)} : {XIAOMI_TYPE_DICT[device_id]}",
+        f"FnCnt: {data[8]}",
+    ]
+    if frctrl & 1:
+        sinfo.append("Request timing")
+    sinfo.append("Registered and bound" if (frctrl >> 8) & 1 else "Not bound")
+    if (frctrl >> 9) & 1:
+        sinfo.append("Request APP to register and bind")
+    if frctrl_auth_mode == 0:
+        sinfo.append("Old version certification")
+    elif frctrl_auth_mode == 1:
+        sinfo.append("Safety certification")
+    elif frctrl_auth_mode == 2:
+        sinfo.append("Standard certification")
+    if (frctrl >> 5) & 1:
+        # capability byte (and IO capability) just before the object data
+        capability_start = 15 if (frctrl >> 4) & 1 else 9
+        capability_types = data[capability_start]
+        sinfo.append(f"Capability: {hex(capability_types)}")
+        if capability_types & 0x20:
+            sinfo.append(f"IO: {hex(data[capability_start + 1])}")
+    sinfo.append("Encryption" if (frctrl >> 3) & 1 else "No encryption")
+    sinfo.append(f"Object data: {payload.hex()}")
+    return ", ".join(sinfo)
+
+
 def parse_xiaomi(self, data: bytes, mac: bytes):
     """Parser for Xiaomi sensors"""
     # check for adstruc length
@@ -1497,14 +1546,10 @@ def parse_xiaomi(self, data: bytes, mac: bytes):
     frctrl = data[4] + (data[5] << 8)
     frctrl_mesh = (frctrl >> 7) & 1  # mesh device
     frctrl_version = frctrl >> 12  # version
-    frctrl_auth_mode = (frctrl >> 10) & 3
-    frctrl_solicited = (frctrl >> 9) & 1
-    frctrl_registered = (frctrl >> 8) & 1
     frctrl_object_include = (frctrl >> 6) & 1
     frctrl_capability_include = (frctrl >> 5) & 1
     frctrl_mac_include = (frctrl >> 4) & 1  # check for MAC address in data
     frctrl_is_encrypted = (frctrl >> 3) & 1  # check for encryption being used
-    frctrl_request_timing = frctrl & 1  # old version
 
     # Check that device is not of mesh type
     if frctrl_mesh != 0:
@@ -1544,24 +1589,6 @@ def parse_xiaomi(self, data: bytes, mac: bytes):
 
     packet_id = data[8]
 
-    sinfo = 'MiVer: ' + str(frctrl_version)
-    sinfo += ', DevID: ' + hex(device_id) + ' : ' + device_type
-    sinfo += ', FnCnt: ' + str(packet_id)
-    if frctrl_request_timing != 0:
-        sinfo += ', Request timing'
-    if frctrl_registered != 0:
-        sinfo += ', Registered and bound'
-    else:
-        sinfo += ', Not bound'
-    if frctrl_solicited != 0:
-        sinfo += ', Request APP to register and bind'
-    if frctrl_auth_mode == 0:
-        sinfo += ', Old version certification'
-    elif frctrl_auth_mode == 1:
-        sinfo += ', Safety certification'
-    elif frctrl_auth_mode == 2:
-        sinfo += ', Standard certification'
-
     # check for unique packet_id and advertisement priority
     try:
         prev_packet = self.lpacket_ids[mac]
@@ -1569,35 +1596,19 @@ def parse_xiaomi(self, data: bytes, mac: bytes):
         # start with empty first packet
         prev_packet = None
 
-    if device_type in ["LYWSD03MMC", "CGG1", "MHO-C401", "CGDK2"]:
-        # Check for adv priority and packet_id for devices that can also send in ATC format
-        adv_priority = 19
-        try:
-            prev_adv_priority = self.adv_priority[mac]
-        except KeyError:
-            # start with initial adv priority
-            prev_adv_priority = 0
-        if adv_priority > prev_adv_priority:
-            # always process advertisements with a higher priority
-            self.adv_priority[mac] = adv_priority
-        elif adv_priority == prev_adv_priority:
-            # only process messages with same priority that have a unique packet id
-            if prev_packet == packet_id:
-                if self.filter_duplicates is True:
-                    if _LOGGER.isEnabledFor(logging.DEBUG):
-                        _LOGGER.debug("Duplicate packet received, not processing. Data: %s", data.hex())
-                    return None
-                else:
-                    pass
-            else:
-                pass
-        else:
+    if device_type in XIAOMI_DUAL_FORMAT_TYPES:
+        # Check for adv priority and packet_id for devices that can also send in another format
+        arbitration = self.source_arbiter.arbitrate(mac, XIAOMI_PRIORITY)
+        if arbitration == LOWER:
             # do not process advertisements with lower priority (ATC advertisements will be used instead)
-            prev_adv_priority -= 1
-            self.adv_priority[mac] = prev_adv_priority
             if _LOGGER.isEnabledFor(logging.DEBUG):
                 _LOGGER.debug("Lower priority advertisement received, not processing. Data: %s", data.hex())
             return None
+        if arbitration == SAME and prev_packet == packet_id and self.filter_duplicates is True:
+            # only process messages with same priority that have a unique packet id
+            if _LOGGER.isEnabledFor(logging.DEBUG):
+                _LOGGER.debug("Duplicate packet received, not processing. Data: %s", data.hex())
+            return None
     else:
         if prev_packet == packet_id:
             if self.filter_duplicates is True:
@@ -1614,20 +1625,16 @@ def parse_xiaomi(self, data: bytes, mac: bytes):
             _LOGGER.debug("Invalid data length (in capability check), adv: %s", data.hex())
             return None
         capability_types = data[i - 1]
-        sinfo += ', Capability: ' + hex(capability_types)
         if (capability_types & 0x20) != 0:
             i += 1
             if msg_length < i:
                 _LOGGER.debug("Invalid data length (in capability type check), adv: %s", data.hex())
                 return None
-            capability_io = data[i - 1]
-            sinfo += ', IO: ' + hex(capability_io)
 
     # check that data contains object
     if frctrl_object_include != 0:
         # check for encryption
         if frctrl_is_encrypted != 0:
-            sinfo += ', Encryption'
             firmware = "Xiaomi (MiBeacon V" + str(frctrl_version) + " encrypted)"
             if frctrl_version <= 3:
                 payload = decrypt_mibeacon_legacy(self, data, i, mac)
@@ -1636,7 +1643,6 @@ def parse_xiaomi(self, data: bytes, mac: bytes):
         else:   # No encryption
             # check minimum advertisement length with data
             firmware = "Xiaomi (MiBeacon V" + str(frctrl_version) + ")"
-            sinfo += ', No encryption'
             if msg_length < i + 3:
                 _LOGGER.debug("Invalid data length (in non-encrypted data), adv: %s", data.hex())
                 return None
@@ -1656,7 +1662,6 @@ def parse_xiaomi(self, data: bytes, mac: bytes):
 
     if payload is not None:
         result.update({"data": True})
-        sinfo += ', Object data: ' + payload.hex()
         # loop through parse_xiaomi payload
         payload_start = 0
         payload_length = len(payload)
@@ -1668,32 +1673,20 @@ def parse_xiaomi(self, data: bytes, mac: bytes):
             if payload_length < next_start:
                 _LOGGER.debug("Invalid payload data length, payload: %s", payload.hex())
                 break
-            dobject = payload[payload_start + 3:next_start]
-            if dobject and obj_length != 0 or hex(obj_typecode) in [
-                "0x4a0c", "0x4a0d", "0x4a0e", "0x4e0c", "0x4e0d", "0x4e0e"
-            ]:
-                resfunc = xiaomi_dataobject_dict.get(obj_typecode, None)
-                if resfunc:
-                    if hex(obj_typecode) in [
-                        "0x8",
-                        "0x100e",
-                        "0x1001",
-                        "0xf",
-                        "0xb",
-                        "0x484e",
-                        "0x4e0c",
-                        "0x4e0d",
-                        "0x4e0e",
-                        "0x560c",
-                        "0x560d",
-                        "0x560e",
-                    ]:
-                        result.update(resfunc(dobject, device_type))
-                    else:
-                        result.update(resfunc(dobject))
-                else:
+            data_object = XIAOMI_DATA_OBJECTS.get(obj_typecode)
+            if obj_length != 0 or (data_object is not None and data_object.allow_empty):
+                dobject = payload[payload_start + 3:next_start]
+                if data_object is None:
                     if self.report_unknown == "Xiaomi":
-                        _LOGGER.info("%s, UNKNOWN dataobject in payload! Adv: %s", sinfo, data.hex())
+                        _LOGGER.info(
+                            "%s, UNKNOWN dataobject in payload! Adv: %s",
+                            xiaomi_sinfo(data, payload),
+                            data.hex()
+                        )
+                elif data_object.with_device_type:
+                    result.update(data_object.converter(dobject, device_type))
+                else:
+                    result.update(data_object.converter(dobject))
             payload_start = next_start
 
     return result
@@ -1714,26 +1707,28 @@ def decrypt_mibeacon_v4_v5(self, data, i, mac):
         # no encryption key found
         if mac not in self.no_key_message:
             _LOGGER.error("No encryption key found for device with MAC %s", to_mac(mac))
-            self.no_key_message.append(mac)
+            self.no_key_message[mac] = True
         if _LOGGER.isEnabledFor(logging.DEBUG):
             _LOGGER.debug("Key error for device with MAC %s, cannot decrypt data. Data: %s", to_mac(mac), data.hex())
         return None
 
+    if self.decryption_failures.skip(mac):
+        return None
     nonce = b"".join([mac[::-1], data[6:9], data[-7:-4]])
     aad = b"\x11"
     token = data[-4:]
     cipherpayload = data[i:-7]
-    cipher = AES.new(key, AES.MODE_CCM, nonce=nonce, mac_len=4)
-    cipher.update(aad)
 
     try:
-        decrypted_payload = cipher.decrypt_and_verify(cipherpayload, token)
+        decrypted_payload = self.ciphers.get(key).decrypt_and_verify(nonce, cipherpayload, token, aad)
     except ValueError as error:
-        _LOGGER.warning("Decryption failed: %s", error)
-        _LOGGER.debug("token: %s", token.hex())
-        _LOGGER.debug("nonce: %s", nonce.hex())
-        _LOGGER.debug("cipherpayload: %s", cipherpayload.hex())
+        if self.decryption_failures.failure(mac):
+            _LOGGER.warning("Decryption failed: %s", error)
+            _LOGGER.debug("token: %s", token.hex())
+            _LOGGER.debug("nonce: %s", nonce.hex())
+            _LOGGER.debug("cipherpayload: %s", cipherpayload.hex())
         return None
+    self.decryption_failures.success(mac)
     if decrypted_payload is None:
         _LOGGER.error(
             "Decryption failed for %s, decrypted payload is None",
@@ -1754,7 +1749,6 @@ def decrypt_mibeacon_legacy(self, data, i, mac):
         if len(aeskey) != 12:
             _LOGGER.error("Encryption key should be 12 bytes (24 characters) long")
             return None
-        key = b"".join([aeskey[0:6], bytes.fromhex("8d3d3c97"), aeskey[6:]])
     except KeyError:
         # no encryption key found
         _LOGGER.error("No encryption key found for device with MAC %s", to_mac(mac))
@@ -1763,11 +1757,9 @@ def decrypt_mibeacon_legacy(self, data, i, mac):
     nonce = b"".join([data[4:9], data[-4:-1], mac[::-1][:-1]])
     aad = b"\x11"
     cipherpayload = data[i:-4]
-    cipher = AES.new(key, AES.MODE_CCM, nonce=nonce, mac_len=4)
-    cipher.update(aad)
 
     try:
-        decrypted_payload = cipher.decrypt(cipherpayload)
+        decrypted_payload = self.ciphers.get_legacy(aeskey).decrypt(nonce, cipherpayload, aad)
     except ValueError as error:
         _LOGGER.warning("Decryption failed: %s", error)
         _LOGGER.debug("nonce: %s", nonce.hex())
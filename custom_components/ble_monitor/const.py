@@ -49,6 +49,21 @@ CONF_DEVICE_DELETE_DEVICE = "delete device"
 CONF_PACKET = "packet"
 CONF_GATEWAY_ID = "gateway_id"
 CONF_UUID = "uuid"
+CONF_DEDUP_TTL = "dedup_ttl"
+CONF_STATE_MAX_SIZE = "state_max_size"
+CONF_STATE_TTL = "state_ttl"
+CONF_PARSER_WORKERS = "parser_workers"
+CONF_VENDORS = "vendors"
+CONF_CAPTURE_FILE = "capture_file"
+CONF_CAPTURE_MAX_SIZE = "capture_max_size"
+CONF_REPLAY_FILE = "replay_file"
+CONF_REPLAY_SPEED = "replay_speed"
+CONF_HANDOFF_DELAY = "handoff_delay"
+CONF_HANDOFF_BATCH_SIZE = "handoff_batch_size"
+CONF_QUEUE_SIZE = "queue_size"
+CONF_QUEUE_POLICY = "queue_policy"
+CONF_COALESCE_MEASUREMENTS = "coalesce_measurements"
+CONF_SCANNER_MODE = "scanner_mode"
 CONFIG_IS_FLOW = "is_flow"
 
 SERVICE_CLEANUP_ENTRIES = "cleanup_entries"
@@ -56,6 +71,22 @@ SERVICE_PARSE_DATA = "parse_data"
 
 # Default values for configuration options
 DEFAULT_BT_AUTO_RESTART = False
+DEFAULT_DEDUP_TTL = 0
+DEFAULT_STATE_MAX_SIZE = 10000
+DEFAULT_STATE_TTL = 3600
+DEFAULT_PARSER_WORKERS = 0
+DEFAULT_CAPTURE_MAX_SIZE = 10
+DEFAULT_REPLAY_SPEED = 1
+DEFAULT_HANDOFF_DELAY = 5
+DEFAULT_HANDOFF_BATCH_SIZE = 100
+DEFAULT_QUEUE_SIZE = 1000
+DEFAULT_QUEUE_POLICY = {
+    "binary": "drop_oldest",
+    "measuring": "coalesce",
+    "tracker": "coalesce",
+}
+DEFAULT_COALESCE_MEASUREMENTS = False
+DEFAULT_SCANNER_MODE = "thread"
 DEFAULT_PERIOD = 60
 DEFAULT_LOG_SPIKES = False
 DEFAULT_USE_MEDIAN = False
@@ -95,6 +126,9 @@ CONF_TMAX_PROBES = 300.0
 CONF_HMIN = 0.0
 CONF_HMAX = 99.9
 
+# Sensors that report a "jagged" humidity with the Xiaomi firmware
+JAGGED_HUMIDITY = ('LYWSD03MMC', 'MHO-C401')
+
 
 # Sensors with deviating temperature range
 KETTLES = ('YM-K1501', 'YM-K1501EU', 'V-SK152')
@@ -2570,6 +2604,17 @@ AUTO_SENSOR_LIST = [
     "weight",
 ]
 
+# Automatically added sensors that update the state instantly after new data
+AUTO_INSTANT_SENSOR_LIST = [
+    description.key
+    for description in SENSOR_TYPES
+    if description.key in AUTO_SENSOR_LIST
+    and description.update_behavior in ["Instantly", "StateChange"]
+]
+
+
+# Selection list for scanner_mode
+SCANNER_MODE_LIST = ["thread", "event_loop"]
 
 # Selection list for report_uknown
 REPORT_UNKNOWN_LIST = [
@@ -1,6 +1,7 @@
 """Passive BLE monitor device tracker platform."""
 import asyncio
 import logging
+from collections import deque
 from datetime import timedelta
 
 from homeassistant.components.device_tracker import ScannerEntity, SourceType
@@ -59,7 +60,7 @@ class BLEupdaterTracker:
         """Initiate BLE updater."""
         _LOGGER.debug("BLE device tracker updater initialization")
         self.monitor = blemonitor
-        self.dataqueue = blemonitor.dataqueue["tracker"].async_q
+        self.dataqueue = blemonitor.dataqueue["tracker"]
         self.config = blemonitor.config
         self.period = self.config[CONF_PERIOD]
         self.add_entities = add_entities
@@ -108,16 +109,19 @@ class BLEupdaterTracker:
 
         # Set up new device trackers when first BLE advertisement is received
         trackers = []
+        batch = deque()
         while True:
-            try:
-                advevent = await asyncio.wait_for(self.dataqueue.get(), 1)
-                if advevent is None:
-                    _LOGGER.debug("Entities updater loop stopped")
-                    return True
-                data = advevent
-                self.dataqueue.task_done()
-            except asyncio.TimeoutError:
-                pass
+            if not batch:
+                try:
+                    advevents = await asyncio.wait_for(self.dataqueue.get(), 1)
+                    if advevents is None:
+                        _LOGGER.debug("Entities updater loop stopped")
+                        return True
+                    # the BLE advertisements are received in batches
+                    batch.extend(advevents)
+                except asyncio.TimeoutError:
+                    pass
+            data = batch.popleft() if batch else None
             if data:
                 _LOGGER.debug("Data device tracker received: %s", data)
                 ble_adv_cnt += 1
@@ -0,0 +1,25 @@
+"""Diagnostics support for Passive BLE monitor."""
+from __future__ import annotations
+
+from typing import Any
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .const import DOMAIN
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, config_entry: ConfigEntry
+) -> dict[str, Any]:
+    """Return diagnostics for a config entry."""
+    blemonitor = hass.data[DOMAIN]["blemonitor"]
+    dumpthread = blemonitor.dumpthread
+    if dumpthread is None:
+        return {}
+    parser = dumpthread.parser_pool or dumpthread.ble_parser
+    diagnostics = parser.diagnostics()
+    diagnostics["queues"] = {name: queue.stats() for name, queue in blemonitor.dataqueue.items()}
+    if dumpthread.coalescer is not None:
+        diagnostics["coalescer"] = dumpthread.coalescer.stats()
+    return diagnostics
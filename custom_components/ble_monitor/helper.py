@@ -7,12 +7,23 @@ from uuid import UUID
 import voluptuous as vol
 from homeassistant.const import CONF_MAC
 
+from .ble_parser.helpers import identifier_from_string
 from .const import AES128KEY24_REGEX, AES128KEY32_REGEX, CONF_UUID, MAC_REGEX
 
 _LOGGER = logging.getLogger(__name__)
 
 
 def identifier_normalize(value: str) -> str:
+    identifier = identifier_from_string(value)
+    if identifier is not None:
+        # cached forms of a UUID (with or without dashes), a formatted MAC or an unformatted upper case MAC
+        if ':' in value:
+            return value
+        if identifier.uuid is not None:
+            return identifier.uuid
+        if value == identifier.unformatted:
+            return identifier.formatted
+
     if validate_uuid(value):
         return str(UUID(value))
 
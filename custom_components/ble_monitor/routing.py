@@ -0,0 +1,45 @@
+"""Routing of the parsed sensor data to the queues of the measuring and binary sensors."""
+from typing import NamedTuple
+
+from .const import (AUTO_BINARY_SENSOR_LIST, AUTO_INSTANT_SENSOR_LIST,
+                    AUTO_MANUFACTURER_DICT, AUTO_SENSOR_LIST,
+                    MANUFACTURER_DICT, MEASUREMENT_DICT)
+
+
+class Route(NamedTuple):
+    """Keys of the sensor data that are processed by the sensors of a device type."""
+
+    measuring: frozenset
+    binary: frozenset
+    instant: frozenset
+
+
+def build_routes() -> dict[str, Route]:
+    """Return the route of each supported device type."""
+    auto_route = Route(
+        frozenset(AUTO_SENSOR_LIST),
+        frozenset(AUTO_BINARY_SENSOR_LIST + ["battery"]),
+        frozenset(AUTO_INSTANT_SENSOR_LIST),
+    )
+    routes = dict.fromkeys(AUTO_MANUFACTURER_DICT, auto_route)
+    # devices with a fixed list of sensors take precedence
+    for device_type in MANUFACTURER_DICT:
+        averaging, instant, binary = MEASUREMENT_DICT[device_type]
+        routes[device_type] = Route(
+            frozenset(averaging + instant),
+            frozenset(binary + ["battery"]),
+            frozenset(instant),
+        )
+    return routes
+
+
+def route_sensor_data(route: Route, sensor_msg) -> tuple[bool, bool]:
+    """Return whether the sensor data goes to the measuring and to the binary sensors.
+
+    Sensor data without measuring and binary sensor data goes to both.
+    """
+    measuring = not route.measuring.isdisjoint(sensor_msg)
+    binary = not route.binary.isdisjoint(sensor_msg)
+    if measuring == binary:
+        return True, True
+    return measuring, binary
@@ -2,7 +2,9 @@
 import asyncio
 import logging
 import statistics as sts
+from collections import deque
 from datetime import timedelta
+from itertools import repeat
 
 from homeassistant.components.sensor import RestoreSensor, SensorEntity
 from homeassistant.const import (ATTR_BATTERY_LEVEL, CONF_DEVICES, CONF_MAC,
@@ -15,17 +17,18 @@ from homeassistant.helpers.typing import StateType
 from homeassistant.util import dt
 from homeassistant.util.unit_conversion import TemperatureConverter
 
+from .ble_parser.handoff import coalesced_range, coalesced_samples
 from .const import (AUTO_MANUFACTURER_DICT, AUTO_SENSOR_LIST,
                     CONF_DEVICE_RESET_TIMER, CONF_DEVICE_RESTORE_STATE,
                     CONF_DEVICE_USE_MEDIAN, CONF_HMAX, CONF_HMIN,
                     CONF_LOG_SPIKES, CONF_PERIOD, CONF_RESTORE_STATE,
                     CONF_TMAX, CONF_TMAX_KETTLES, CONF_TMAX_PROBES, CONF_TMIN,
                     CONF_TMIN_KETTLES, CONF_TMIN_PROBES, CONF_USE_MEDIAN,
-                    CONF_UUID, DEFAULT_DEVICE_RESET_TIMER, DOMAIN, KETTLES,
-                    MANUFACTURER_DICT, MEASUREMENT_DICT, PROBES,
-                    RENAMED_FIRMWARE_DICT, RENAMED_MANUFACTURER_DICT,
-                    RENAMED_MODEL_DICT, SENSOR_TYPES,
-                    BLEMonitorSensorEntityDescription)
+                    CONF_UUID, DEFAULT_DEVICE_RESET_TIMER, DOMAIN,
+                    JAGGED_HUMIDITY, KETTLES, MANUFACTURER_DICT,
+                    MEASUREMENT_DICT, PROBES, RENAMED_FIRMWARE_DICT,
+                    RENAMED_MANUFACTURER_DICT, RENAMED_MODEL_DICT,
+                    SENSOR_TYPES, BLEMonitorSensorEntityDescription)
 from .helper import (detect_conf_type, dict_get_or, dict_get_or_normalize,
                      identifier_clean, identifier_normalize)
 
@@ -82,7 +85,7 @@ class BLEupdater:
         """Initiate BLE updater."""
         _LOGGER.debug("BLE sensors updater initialization")
         self.monitor = blemonitor
-        self.dataqueue = blemonitor.dataqueue["measuring"].async_q
+        self.dataqueue = blemonitor.dataqueue["measuring"]
         self.config = blemonitor.config
         self.period = self.config[CONF_PERIOD]
         self.add_entities = add_entities
@@ -185,16 +188,19 @@ class BLEupdater:
 
         # Set up new sensors when first BLE advertisement is received
         sensors = {}
+        batch = deque()
         while True:
-            try:
-                advevent = await asyncio.wait_for(self.dataqueue.get(), 1)
-                if advevent is None:
-                    _LOGGER.debug("Entities updater loop stopped")
-                    return True
-                data = advevent
-                self.dataqueue.task_done()
-            except asyncio.TimeoutError:
-                pass
+            if not batch:
+                try:
+                    advevents = await asyncio.wait_for(self.dataqueue.get(), 1)
+                    if advevents is None:
+                        _LOGGER.debug("Entities updater loop stopped")
+                        return True
+                    # the BLE advertisements are received in batches
+                    batch.extend(advevents)
+                except asyncio.TimeoutError:
+                    pass
+            data = batch.popleft() if batch else None
             if data:
                 _LOGGER.debug("Data measuring sensor received: %s", data)
                 ble_adv_cnt += 1
@@ -202,11 +208,12 @@ class BLEupdater:
                 # the RSSI value will be averaged for all valuable packets
                 if key not in rssi:
                     rssi[key] = []
-                rssi[key].append(int(data["rssi"]))
+                rssi_value, samples = coalesced_samples(data, "rssi")
+                rssi[key].extend(repeat(round(rssi_value), samples))
                 batt_attr = None
                 device_model = data["type"]
                 firmware = data["firmware"]
-                manufacturer = data["manufacturer"] if "manufacturer" in data else None
+                manufacturer = data.get("manufacturer")
                 # migrate to new model/firmware/manufacturer if changed
                 device_model = RENAMED_MODEL_DICT.get(device_model, device_model)
                 firmware = RENAMED_FIRMWARE_DICT.get(firmware, firmware)
@@ -647,7 +654,8 @@ class MeasuringSensor(BaseSensor):
             self.pending_update = False
             return
         self._period_cnt = period_cnt
-        self._measurements.append(data[self.entity_description.key])
+        value, samples = coalesced_samples(data, self.entity_description.key)
+        self._measurements.extend(repeat(value, samples))
         self._extra_state_attributes["sensor_type"] = data["type"]
         self._extra_state_attributes["last_packet_id"] = data["packet"]
         self._extra_state_attributes["firmware"] = data["firmware"]
@@ -744,21 +752,25 @@ class TemperatureSensor(MeasuringSensor):
             self.pending_update = False
             return
         self._period_cnt = period_cnt
+        # check every merged sample, a single spike would skew their mean
+        lowest, highest = coalesced_range(data, self.entity_description.key)
         if (
             not self._lower_temp_limit
-            <= data[self.entity_description.key]
+            <= lowest
+            <= highest
             <= self._upper_temp_limit
             and not self.is_beacon
         ):
             if self._log_spikes:
                 _LOGGER.error(
                     "Temperature spike: %s (%s)",
-                    data[self.entity_description.key],
+                    lowest if lowest < self._lower_temp_limit else highest,
                     self._key,
                 )
             self.pending_update = False
             return
-        self._measurements.append(data[self.entity_description.key])
+        value, samples = coalesced_samples(data, self.entity_description.key)
+        self._measurements.extend(repeat(value, samples))
         self._extra_state_attributes["sensor_type"] = data["type"]
         self._extra_state_attributes["last_packet_id"] = data["packet"]
         self._extra_state_attributes["firmware"] = data["firmware"]
@@ -778,7 +790,7 @@ class HumiditySensor(MeasuringSensor):
         super().__init__(config, key, devtype, firmware, entity_description, manufacturer)
         self._log_spikes = config[CONF_LOG_SPIKES]
         # LYWSD03MMC / MHO-C401 "jagged" humidity workaround
-        if devtype in ("LYWSD03MMC", "MHO-C401"):
+        if devtype in JAGGED_HUMIDITY:
             if self._device_firmware is not None:
                 if self._device_firmware[0:6] == "Xiaomi":
                     self._jagged = True
@@ -789,24 +801,28 @@ class HumiditySensor(MeasuringSensor):
             self.pending_update = False
             return
         self._period_cnt = period_cnt
+        # check every merged sample, a single spike would skew their mean
+        lowest, highest = coalesced_range(data, self.entity_description.key)
         if (
             not CONF_HMIN
-            <= data[self.entity_description.key]
+            <= lowest
+            <= highest
             <= CONF_HMAX
             and not self.is_beacon
         ):
             if self._log_spikes:
                 _LOGGER.error(
                     "Humidity spike: %s (%s)",
-                    data[self.entity_description.key],
+                    lowest if lowest < CONF_HMIN else highest,
                     self._key,
                 )
             self.pending_update = False
             return
+        value, samples = coalesced_samples(data, self.entity_description.key)
         if self._jagged is True:
-            self._measurements.append(int(data[self.entity_description.key]))
+            self._measurements.extend(repeat(int(value), samples))
         else:
-            self._measurements.append(data[self.entity_description.key])
+            self._measurements.extend(repeat(value, samples))
         self._extra_state_attributes["sensor_type"] = data["type"]
         self._extra_state_attributes["last_packet_id"] = data["packet"]
         self._extra_state_attributes["firmware"] = data["firmware"]
@@ -0,0 +1,44 @@
+"""Shared fake timer and HCI event factories of the tests."""
+from Cryptodome.Cipher import AES
+
+# ATC (custom format), the MAC address is part of the service data
+ATC_CUSTOM = "043e2202010000b2188d38c1a41602010612161a18b2188d38c1a4c809ad14e50b64b904c3"
+# BTHome V2 encryption key
+BTHOME_KEY = bytes.fromhex("231d39c1d7cc1ab1aee224cd096db932")
+
+
+class FakeTimer:
+    """Manually advanced clock."""
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def hci_event(adpayload, mac):
+    """Return a legacy single report HCI event with the advertising data."""
+    report = bytes([0x00, 0x01]) + mac[::-1] + bytes([len(adpayload)]) + adpayload + b"\xc0"
+    return bytes([0x04, 0x3E, len(report) + 2, 0x02, 0x01]) + report
+
+
+def atc_event(mac, packet_id=None):
+    """Return the ATC event with another MAC address and, optionally, packet id."""
+    data = bytearray.fromhex(ATC_CUSTOM)
+    data[7:13] = mac[::-1]
+    data[21:27] = mac[::-1]
+    if packet_id is not None:
+        data[34] = packet_id
+    return bytes(data)
+
+
+def bthome_event(mac, packet_id, temperature):
+    """Return an encrypted BTHome V2 event with a temperature measurement."""
+    count_id = packet_id.to_bytes(4, "little")
+    nonce = mac + b"\xd2\xfc\x41" + count_id
+    cipher = AES.new(BTHOME_KEY, AES.MODE_CCM, nonce=nonce, mac_len=4)
+    payload = b"\x02" + round(temperature * 100).to_bytes(2, "little", signed=True)
+    encrypted_payload, mic = cipher.encrypt_and_digest(payload)
+    service_data = b"\x16\xd2\xfc\x41" + encrypted_payload + count_id + mic
+    adpayload = b"\x02\x01\x06" + bytes([len(service_data)]) + service_data
+    return hci_event(adpayload, mac)
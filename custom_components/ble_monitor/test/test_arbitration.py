@@ -0,0 +1,88 @@
+"""The tests for the arbitration between advertisement formats."""
+from ble_monitor.ble_parser import BleParser
+from ble_monitor.ble_parser.arbitration import (HIGHER, LOWER, SAME,
+                                                SourceArbiter)
+from ble_monitor.test.common import atc_event
+
+MAC = bytes.fromhex("A4C1380283F4")
+# LYWSD03MMC with encryption (MiBeacon V5)
+MIBEACON = "043e2a02010000f4830238c1a41e0201061a1695fe58585b0550f4830238c1a495ef58763c26000097e2abb5e2"
+MIBEACON_KEY = bytes.fromhex("e9ea895fac7cca6d30532432a516f3a8")
+
+# Qingping CGG1, and a MiBeacon V2 advertisement of the same device
+QINGPING_CGG1 = "043E2402010000B24410342D58180201061416CDFD0807B24410342D580104CA004502020138AF"
+MIBEACON_CGG1 = "043e2502010000b24410342d5819020106151695fe50204703dab24410342d580d1004fe004802c4"
+
+
+class TestSourceArbiter:
+    """Tests for the per device priority of advertisement formats"""
+    def test_arbitrate(self):
+        """Test that lower priority formats are rejected until the priority has decayed."""
+        arbiter = SourceArbiter()
+        assert arbiter.arbitrate(MAC, 29) == HIGHER
+        assert arbiter.arbitrate(MAC, 29) == SAME
+        assert arbiter.arbitrate(MAC, 39) == HIGHER
+        assert arbiter.arbitrate(MAC, 29) == LOWER
+        for _ in range(19):
+            assert arbiter.arbitrate(MAC, 19) == LOWER
+        assert arbiter.arbitrate(MAC, 19) == SAME
+        assert arbiter.rejected == 20
+        assert len(arbiter) == 1
+
+    def test_release(self):
+        """Test that a released device accepts any format."""
+        arbiter = SourceArbiter()
+        arbiter.arbitrate(MAC, 39)
+        arbiter.release(MAC)
+        arbiter.release(MAC)
+        assert arbiter.arbitrate(MAC, 9) == HIGHER
+
+
+class TestAtcXiaomi:
+    """Tests for a LYWSD03MMC with custom firmware that sends ATC and MiBeacon advertisements"""
+    def test_atc_preferred(self):
+        """Test that MiBeacon advertisements are rejected before decryption."""
+        # a wrong key, to count the decryption attempts
+        ble_parser = BleParser(aeskeys={MAC: bytes(16)})
+        sensor_msg, _ = ble_parser.parse_raw_data(atc_event(MAC, 1))
+        assert sensor_msg["firmware"] == "ATC (Custom)"
+        sensor_msg, _ = ble_parser.parse_raw_data(bytes.fromhex(MIBEACON))
+        assert sensor_msg is None
+        stats = ble_parser.stats()
+        assert stats["source_arbitration"] == {"size": 1, "evictions": 0, "rejected": 1}
+        assert stats["decryption_failures"]["size"] == 0
+
+    def test_fallback(self):
+        """Test that MiBeacon takes over when the ATC advertisements stop."""
+        ble_parser = BleParser(aeskeys={MAC: MIBEACON_KEY})
+        ble_parser.parse_raw_data(atc_event(MAC, 1))
+        for _ in range(20):
+            sensor_msg, _ = ble_parser.parse_raw_data(bytes.fromhex(MIBEACON))
+            assert sensor_msg is None
+        sensor_msg, _ = ble_parser.parse_raw_data(bytes.fromhex(MIBEACON))
+        assert sensor_msg["firmware"] == "Xiaomi (MiBeacon V5 encrypted)"
+        sensor_msg, _ = ble_parser.parse_raw_data(atc_event(MAC, 2))
+        assert sensor_msg["firmware"] == "ATC (Custom)"
+
+    def test_qingping(self):
+        """Test that the Qingping advertisements of a CGG1 are used instead of MiBeacon."""
+        ble_parser = BleParser()
+        sensor_msg, _ = ble_parser.parse_raw_data(bytes.fromhex(MIBEACON_CGG1))
+        assert sensor_msg["firmware"] == "Xiaomi (MiBeacon V2)"
+        sensor_msg, _ = ble_parser.parse_raw_data(bytes.fromhex(QINGPING_CGG1))
+        assert sensor_msg["firmware"] == "Qingping"
+        assert sensor_msg["type"] == "CGG1"
+        assert sensor_msg["battery"] == 56
+        # the MiBeacon advertisements only take over when the Qingping advertisements stop
+        for _ in range(5):
+            assert ble_parser.parse_raw_data(bytes.fromhex(MIBEACON_CGG1))[0] is None
+        sensor_msg, _ = ble_parser.parse_raw_data(bytes.fromhex(MIBEACON_CGG1))
+        assert sensor_msg["firmware"] == "Xiaomi (MiBeacon V2)"
+        assert ble_parser.stats()["source_arbitration"]["rejected"] == 5
+
+    def test_duplicates(self):
+        """Test that duplicates of the best format are filtered."""
+        ble_parser = BleParser(filter_duplicates=True)
+        assert ble_parser.parse_raw_data(atc_event(MAC, 1))[0]["packet"] == 1
+        assert ble_parser.parse_raw_data(atc_event(MAC, 1))[0] is None
+        assert ble_parser.parse_raw_data(atc_event(MAC, 2))[0]["packet"] == 2
@@ -285,3 +285,19 @@ class TestBTHome:
         assert sensor_msg["data"]
         assert sensor_msg["tvoc"] == 307
         assert sensor_msg["rssi"] == -52
+
+    def test_bthome_unknown_object_id(self):
+        """Test BTHome parser with an unknown object id before a tvoc measurement"""
+        data_string = "043E1B02010000A5808FE648540F0201060B161C1803FE330103133301CC"
+        data = bytes(bytearray.fromhex(data_string))
+
+        # pylint: disable=unused-variable
+        ble_parser = BleParser()
+        sensor_msg, tracker_msg = ble_parser.parse_raw_data(data)
+
+        assert sensor_msg["firmware"] == "BTHome V1"
+        assert sensor_msg["type"] == "BTHome"
+        assert sensor_msg["mac"] == "5448E68F80A5"
+        assert sensor_msg["data"]
+        assert sensor_msg["tvoc"] == 307
+        assert sensor_msg["rssi"] == -52
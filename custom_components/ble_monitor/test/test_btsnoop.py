@@ -0,0 +1,54 @@
+"""The tests for the btsnoop capture files."""
+import io
+import struct
+
+import pytest
+from ble_monitor.ble_parser.btsnoop import (BTSNOOP_MAGIC,
+                                            DATALINK_HCI_UNENCAPSULATED,
+                                            BtsnoopWriter, read_btsnoop)
+
+# Govee H5051
+GOVEE = bytes.fromhex("043e1902010400aabb615960e30d0cff88ec00ba0af90f63020101b7")
+# HCI LE Set Scan Enable command
+SCAN_ENABLE = bytes.fromhex("010c20020100")
+
+
+class TestBtsnoop:
+    """Tests for reading and writing btsnoop captures"""
+    def test_round_trip(self):
+        """Test that written events are read back with their timestamp."""
+        stream = io.BytesIO()
+        writer = BtsnoopWriter(stream)
+        writer.write(GOVEE, 1700000000.25)
+        writer.write(GOVEE[:-1] + b"\xc0", 1700000001.5)
+        stream.seek(0)
+        assert list(read_btsnoop(stream)) == [
+            (GOVEE, 1700000000.25),
+            (GOVEE[:-1] + b"\xc0", 1700000001.5),
+        ]
+
+    def test_skip_other_packets(self):
+        """Test that commands and a truncated last record are skipped."""
+        stream = io.BytesIO()
+        writer = BtsnoopWriter(stream)
+        writer.write(SCAN_ENABLE, 1700000000.0)
+        writer.write(GOVEE, 1700000000.0)
+        writer.write(GOVEE, 1700000000.0)
+        stream.seek(0)
+        capture = io.BytesIO(stream.getvalue()[:-5])
+        assert [data for data, _ in read_btsnoop(capture)] == [GOVEE]
+
+    def test_unencapsulated(self):
+        """Test that events of a capture without packet types get the event packet type."""
+        record = struct.pack(">IIIIq", len(GOVEE) - 1, len(GOVEE) - 1, 3, 0, 0x00DCDDB30F2F8000)
+        capture = io.BytesIO(
+            struct.pack(">8sII", BTSNOOP_MAGIC, 1, DATALINK_HCI_UNENCAPSULATED) + record + GOVEE[1:]
+        )
+        assert list(read_btsnoop(capture)) == [(GOVEE, 0.0)]
+
+    def test_invalid(self):
+        """Test that files that are no btsnoop capture are rejected."""
+        with pytest.raises(ValueError):
+            list(read_btsnoop(io.BytesIO(b"043e19")))
+        with pytest.raises(ValueError):
+            list(read_btsnoop(io.BytesIO(struct.pack(">8sII", BTSNOOP_MAGIC, 1, 2001))))
@@ -0,0 +1,88 @@
+"""The tests for the capture files of raw HCI events."""
+import asyncio
+import io
+from time import monotonic
+
+import pytest
+from ble_monitor.ble_parser.capture import (CaptureWriter, read_capture,
+                                            replay_capture)
+
+# Govee H5051
+GOVEE = bytes.fromhex("043e1902010400aabb615960e30d0cff88ec00ba0af90f63020101b7")
+
+
+def record_capture(path, timestamps, **kwargs):
+    """Record the Govee event at the timestamps, alternating two adapters."""
+    writer = CaptureWriter(str(path), **kwargs)
+    for index, timestamp in enumerate(timestamps):
+        writer.write(GOVEE, ("hci0", "esp32_gateway")[index % 2], timestamp)
+    writer.close()
+    return writer
+
+
+class TestCaptureWriter:
+    """Tests for recording and reading capture files"""
+    def test_round_trip(self, tmp_path):
+        """Test that the events are read back with their timestamp and adapter."""
+        path = tmp_path / "capture.bin"
+        writer = record_capture(path, [10.0, 10.5, 12.25])
+        assert writer.written == 3
+        with open(path, "rb") as stream:
+            assert list(read_capture(stream)) == [
+                (10.0, "hci0", GOVEE),
+                (10.5, "esp32_gateway", GOVEE),
+                (12.25, "hci0", GOVEE),
+            ]
+        # writes after close are ignored
+        writer.write(GOVEE, "hci0")
+
+    def test_buffered(self, tmp_path):
+        """Test that records are buffered until they are flushed."""
+        path = tmp_path / "capture.bin"
+        writer = CaptureWriter(str(path))
+        writer.write(GOVEE, "hci0", 1.0)
+        assert path.stat().st_size == 0
+        writer.flush()
+        assert path.stat().st_size > len(GOVEE)
+        writer.close()
+
+    def test_rotation(self, tmp_path):
+        """Test that the capture is rotated at the maximum size, keeping the backups."""
+        path = tmp_path / "capture.bin"
+        # 3 records per file
+        record_capture(path, [float(timestamp) for timestamp in range(10)], max_size=170, backups=2)
+        assert sorted(file.name for file in tmp_path.iterdir()) == [
+            "capture.bin", "capture.bin.1", "capture.bin.2"
+        ]
+        timestamps = []
+        for name in ("capture.bin.2", "capture.bin.1", "capture.bin"):
+            with open(tmp_path / name, "rb") as stream:
+                timestamps += [timestamp for timestamp, _, _ in read_capture(stream)]
+        assert timestamps == [3.0, 4.0, 5.0, 6.0, 7.0, 8.0, 9.0]
+
+    def test_truncated(self, tmp_path):
+        """Test that a truncated last record is skipped and other files are rejected."""
+        path = tmp_path / "capture.bin"
+        record_capture(path, [1.0, 2.0])
+        capture = path.read_bytes()
+        assert [timestamp for timestamp, _, _ in read_capture(io.BytesIO(capture[:-3]))] == [1.0]
+        with pytest.raises(ValueError):
+            list(read_capture(io.BytesIO(GOVEE)))
+
+
+class TestReplay:
+    """Tests for replaying capture files"""
+    @pytest.mark.parametrize("speed, min_seconds, max_seconds", [(1, 0.19, 1), (10, 0, 0.1), (0, 0, 0.1)])
+    def test_speed(self, tmp_path, speed, min_seconds, max_seconds):
+        """Test that the events are replayed in order at the given speed."""
+        path = tmp_path / "capture.bin"
+        record_capture(path, [100.0, 100.1, 100.2])
+        replayed = []
+        start = monotonic()
+        count = asyncio.run(
+            replay_capture(str(path), lambda data, adapter: replayed.append(adapter), speed)
+        )
+        seconds = monotonic() - start
+        assert count == 3
+        assert replayed == ["hci0", "esp32_gateway", "hci0"]
+        assert min_seconds <= seconds < max_seconds
@@ -0,0 +1,89 @@
+"""The tests for the ble_parser command line interface."""
+import io
+import json
+
+import pytest
+from ble_monitor.ble_parser.__main__ import load_keys, main
+from ble_monitor.ble_parser.btsnoop import BtsnoopWriter
+from ble_monitor.ble_parser.capture import CaptureWriter
+
+# Govee H5051
+GOVEE = "043e1902010400aabb615960e30d0cff88ec00ba0af90f63020101b7"
+# BTHome V2 encrypted temperature and humidity
+BTHOME = "043E2202010000A5808FE64854160201061216d2fc41a47266c95f730011223378237214CC"
+BTHOME_KEY = "231d39c1d7cc1ab1aee224cd096db932"
+
+
+def run(capsys, *args):
+    """Run the command line interface, return the JSON lines and the stderr output."""
+    main([str(arg) for arg in args])
+    output = capsys.readouterr()
+    return [json.loads(line) for line in output.out.splitlines()], output.err
+
+
+class TestCli:
+    """Tests for parsing captures from the command line"""
+    def test_hex_lines(self, tmp_path, capsys, caplog):
+        """Test that hex lines with and without timestamp are parsed."""
+        capture = tmp_path / "capture.txt"
+        capture.write_text(f"# Govee\n{GOVEE}\n\n1700000000.5 {GOVEE}\nnot hex\n")
+        results, _ = run(capsys, capture)
+        assert [result.get("timestamp") for result in results] == [None, 1700000000.5]
+        assert results[0]["sensor"]["temperature"] == 27.46
+        assert "Line 5 skipped" in caplog.text
+
+    def test_btsnoop(self, tmp_path, capsys):
+        """Test that btsnoop captures are parsed, with the dedup cache on their timestamps."""
+        capture = tmp_path / "capture.btsnoop"
+        with open(capture, "wb") as stream:
+            writer = BtsnoopWriter(stream)
+            for timestamp in (100.0, 101.0, 120.0):
+                writer.write(bytes.fromhex(GOVEE), timestamp)
+        results, _ = run(capsys, capture, "--dedup-ttl", 10)
+        assert [result["sensor"]["data"] for result in results] == [True, False, True]
+        assert results[2]["timestamp"] == 120.0
+
+    def test_stdin(self, monkeypatch, capsys):
+        """Test that hex lines are read from stdin."""
+        stdin = io.TextIOWrapper(io.BufferedReader(io.BytesIO(f"{GOVEE}\n".encode())))
+        monkeypatch.setattr("sys.stdin", stdin)
+        results, _ = run(capsys)
+        assert results[0]["sensor"]["type"] == "H5051"
+
+    def test_keys_and_stats(self, tmp_path, capsys):
+        """Test that keys are loaded from a file and the statistics are reported."""
+        capture = tmp_path / "capture.txt"
+        capture.write_text(f"{BTHOME}\n{GOVEE}\n")
+        keys = tmp_path / "keys.txt"
+        keys.write_text(f"# BTHome\n54:48:E6:8F:80:A5 {BTHOME_KEY}\n")
+        results, err = run(capsys, capture, "--keys", keys, "--stats")
+        assert results[0]["sensor"]["temperature"] == 25.06
+        stats = json.loads(err.splitlines()[-1])
+        assert stats["packets"] == 2
+        assert stats["sensor"] == 2
+        assert stats["firmware"] == {"BTHome V2 (encrypted)": 1, "Govee": 1}
+        assert stats["parser"]["ciphers"] == {"size": 1, "evictions": 0}
+
+    def test_whitelist(self, tmp_path, capsys):
+        """Test that only whitelisted devices are parsed."""
+        capture = tmp_path / "capture.txt"
+        capture.write_text(f"{BTHOME}\n{GOVEE}\n")
+        results, _ = run(capsys, capture, "--whitelist", "E3:60:59:61:BB:AA")
+        assert [result["sensor"]["type"] for result in results] == ["H5051"]
+
+    def test_invalid_keys(self, tmp_path):
+        """Test that an invalid keys file is rejected."""
+        keys = tmp_path / "keys.txt"
+        keys.write_text("54:48:E6:8F:80:A5 1234\n")
+        with pytest.raises(ValueError, match="keys.txt:1"):
+            load_keys(keys)
+
+    def test_capture_file(self, tmp_path, capsys):
+        """Test that capture files of BLE monitor are parsed."""
+        capture = tmp_path / "capture.bin"
+        writer = CaptureWriter(str(capture))
+        writer.write(bytes.fromhex(GOVEE), "hci0", 5.0)
+        writer.close()
+        results, _ = run(capsys, capture)
+        assert results[0]["timestamp"] == 5.0
+        assert results[0]["sensor"]["type"] == "H5051"
@@ -0,0 +1,152 @@
+"""The tests for the cached AES-CCM contexts."""
+import random
+
+import pytest
+from ble_monitor.ble_parser import BleParser
+from ble_monitor.ble_parser.crypto import (AesCcm, CipherCache,
+                                           DecryptionFailures, legacy_key)
+from ble_monitor.test.common import FakeTimer
+from Cryptodome.Cipher import AES
+
+# BTHome V2 encrypted temperature and humidity
+BTHOME = "043E2202010000A5808FE64854160201061216d2fc41a47266c95f730011223378237214CC"
+BTHOME_MAC = bytes.fromhex("5448E68F80A5")
+BTHOME_KEY = bytes.fromhex("231d39c1d7cc1ab1aee224cd096db932")
+
+
+def pycryptodome_ccm(key, nonce, aad):
+    """Return a pycryptodome AES-CCM cipher."""
+    cipher = AES.new(key, AES.MODE_CCM, nonce=nonce, mac_len=4)
+    if aad:
+        cipher.update(aad)
+    return cipher
+
+
+class TestAesCcm:
+    """Tests for the AES-CCM context"""
+    def test_pycryptodome(self):
+        """Test that the results are the same as those of pycryptodome."""
+        rng = random.Random(1)
+        for _ in range(1000):
+            key = rng.randbytes(16)
+            nonce = rng.randbytes(rng.choice([12, 13]))
+            aad = rng.choice([b"", b"\x11"])
+            plaintext = rng.randbytes(rng.randrange(40))
+            ciphertext, mac_tag = pycryptodome_ccm(key, nonce, aad).encrypt_and_digest(plaintext)
+            context = AesCcm(key)
+            assert context.decrypt_and_verify(nonce, ciphertext, mac_tag, aad) == plaintext
+            assert context.decrypt(nonce, ciphertext, aad) == plaintext
+
+    def test_invalid_mac_tag(self):
+        """Test that an invalid MAC tag raises the same error as pycryptodome."""
+        key = bytes(range(16))
+        nonce = bytes(12)
+        ciphertext, mac_tag = pycryptodome_ccm(key, nonce, b"\x11").encrypt_and_digest(b"payload")
+        mac_tag = bytes([mac_tag[0] ^ 1]) + mac_tag[1:]
+        with pytest.raises(ValueError, match="MAC check failed"):
+            AesCcm(key).decrypt_and_verify(nonce, ciphertext, mac_tag, b"\x11")
+
+    def test_invalid_key(self):
+        """Test that an invalid key length raises a ValueError."""
+        with pytest.raises(ValueError):
+            AesCcm(bytes(12))
+
+
+class TestCipherCache:
+    """Tests for the AES-CCM contexts of the device keys"""
+    def test_load(self):
+        """Test that the contexts are built when the keys are loaded."""
+        key = bytes(range(16))
+        mibeacon_key = bytes(range(12))
+        ciphers = CipherCache({b"mac1": key, b"mac2": mibeacon_key})
+        assert len(ciphers) == 2
+        assert ciphers.get(key) is ciphers.get(key)
+        assert ciphers.get_legacy(mibeacon_key) is ciphers.get_legacy(mibeacon_key)
+        assert len(ciphers) == 2
+        ciphers.load({})
+        assert len(ciphers) == 0
+
+    def test_rotated_keys(self):
+        """Test that the contexts of keys that are no longer used are evicted."""
+        timer = FakeTimer()
+        ciphers = CipherCache(max_size=2, ttl=60, timer=timer)
+        for key in range(3):
+            ciphers.get(bytes([key]) * 16)
+        assert len(ciphers) == 2
+        assert ciphers.evictions == 1
+        timer.now = 100
+        ciphers.get(bytes(range(16)))
+        assert len(ciphers) == 1
+        assert ciphers.evictions == 3
+
+    def test_legacy_key(self):
+        """Test the key of MiBeacon v2/v3 devices."""
+        assert legacy_key(bytes.fromhex("e9ea895fac7ccca6d3053243")) == bytes.fromhex(
+            "e9ea895fac7c8d3d3c97cca6d3053243"
+        )
+
+    def test_changed_key(self):
+        """Test that a changed key of a device is used for the next packet."""
+        aeskeys = {BTHOME_MAC: bytes(16)}
+        ble_parser = BleParser(aeskeys=aeskeys)
+        sensor_msg, _ = ble_parser.parse_raw_data(bytes.fromhex(BTHOME))
+        assert sensor_msg is None
+        aeskeys[BTHOME_MAC] = BTHOME_KEY
+        sensor_msg, _ = ble_parser.parse_raw_data(bytes.fromhex(BTHOME))
+        assert sensor_msg["temperature"] == 25.06
+        assert ble_parser.stats()["ciphers"] == {"size": 2, "evictions": 0}
+
+
+class TestDecryptionFailures:
+    """Tests for the backoff of devices that fail to decrypt"""
+    def test_backoff(self):
+        """Test that decryption is skipped with exponential backoff."""
+        timer = FakeTimer()
+        failures = DecryptionFailures(threshold=2, backoff=10, max_backoff=15, timer=timer)
+        mac = b"\x11\x22\x33\x44\x55\x66"
+        assert failures.failure(mac) is True
+        assert failures.skip(mac) is False
+        assert failures.failure(mac) is False
+        assert failures.skip(mac) is True
+        timer.now = 10
+        assert failures.skip(mac) is False
+        assert failures.failure(mac) is False
+        timer.now = 24
+        assert failures.skip(mac) is True
+        assert failures.diagnostics() == {
+            "11:22:33:44:55:66": {"failures": 3, "skipped": 2, "retry_in": 1}
+        }
+        timer.now = 25
+        assert failures.skip(mac) is False
+        failures.success(mac)
+        assert failures.diagnostics() == {}
+        assert failures.skipped == 2
+
+    def test_diagnostics_idle(self):
+        """Test that reading the diagnostics doesn't keep idle devices."""
+        timer = FakeTimer()
+        failures = DecryptionFailures(threshold=2, ttl=60, timer=timer)
+        failures.failure(b"\x11\x22\x33\x44\x55\x66")
+        timer.now = 50
+        assert list(failures.diagnostics()) == ["11:22:33:44:55:66"]
+        timer.now = 70
+        failures.failure(b"\x11\x22\x33\x44\x55\x77")
+        assert list(failures.diagnostics()) == ["11:22:33:44:55:77"]
+
+    def test_wrong_key(self, caplog):
+        """Test that a wrong key is logged once per backoff instead of per advertisement."""
+        ble_parser = BleParser(aeskeys={BTHOME_MAC: bytes(16)})
+        for _ in range(10):
+            sensor_msg, _ = ble_parser.parse_raw_data(bytes.fromhex(BTHOME))
+            assert sensor_msg is None
+        warnings = [record.getMessage() for record in caplog.records if record.levelname == "WARNING"]
+        assert warnings[:2] == ["Decryption failed: MAC check failed"] * 2
+        assert len(warnings) == 3
+        assert "Decryption failed 3 times in a row for device with MAC 54:48:E6:8F:80:A5" in warnings[2]
+        assert ble_parser.stats()["decryption_failures"] == {"size": 1, "skipped": 7}
+        assert ble_parser.diagnostics()["decryption_failures"]["54:48:E6:8F:80:A5"]["failures"] == 3
+
+        ble_parser.aeskeys[BTHOME_MAC] = BTHOME_KEY
+        ble_parser.decryption_failures.success(BTHOME_MAC)
+        sensor_msg, _ = ble_parser.parse_raw_data(bytes.fromhex(BTHOME))
+        assert sensor_msg["temperature"] == 25.06
@@ -0,0 +1,91 @@
+"""The tests for the payload dedup cache."""
+from ble_monitor.ble_parser import BleParser
+from ble_monitor.ble_parser.cache import PayloadDedupCache
+
+# Govee H5051
+GOVEE = "043e1902010400aabb615960e30d0cff88ec00ba0af90f63020101b7"
+# iBeacon
+IBEACON = "043E2A02010001433EA2C96B6A1E02011A1AFF4C000215E2C56DB5DFFB48D2B060D0F5A71096E000640000C5B3"
+
+
+def with_rssi(data_string, rssi):
+    """Return the HCI event with another RSSI."""
+    return bytes.fromhex(data_string)[:-1] + bytes([rssi & 0xFF])
+
+
+class TestDedupCache:
+    """Tests for the payload dedup cache"""
+    def test_disabled_by_default(self):
+        """Test that the dedup cache is disabled by default."""
+        ble_parser = BleParser()
+        assert ble_parser.dedup_cache is None
+
+    def test_same_payload(self):
+        """Test that a repeated payload only refreshes the RSSI."""
+        ble_parser = BleParser(dedup_ttl=10)
+        sensor_msg, tracker_msg = ble_parser.parse_raw_data(with_rssi(GOVEE, -73))
+        assert sensor_msg["temperature"] == 27.46
+        assert sensor_msg["rssi"] == -73
+        assert tracker_msg is None
+
+        sensor_msg, tracker_msg = ble_parser.parse_raw_data(with_rssi(GOVEE, -60))
+        assert sensor_msg == {
+            "firmware": "Govee",
+            "type": "H5051",
+            "mac": "E3605961BBAA",
+            "packet": "no packet id",
+            "data": False,
+            "rssi": -60,
+            "local_name": "",
+        }
+        assert tracker_msg is None
+        assert ble_parser.dedup_cache.hits == 1
+        assert ble_parser.dedup_cache.misses == 1
+
+    def test_changed_payload(self):
+        """Test that a changed payload is parsed again."""
+        ble_parser = BleParser(dedup_ttl=10)
+        ble_parser.parse_raw_data(bytes.fromhex(GOVEE))
+        data = bytearray.fromhex(GOVEE)
+        data[-4] = 0x5A
+        sensor_msg, _ = ble_parser.parse_raw_data(bytes(data))
+        assert sensor_msg["data"] is True
+        assert ble_parser.dedup_cache.hits == 0
+        assert ble_parser.dedup_cache.misses == 2
+
+    def test_tracker(self):
+        """Test that tracker data is replayed with the new RSSI."""
+        uuid = bytes.fromhex("e2c56db5dffb48d2b060d0f5a71096e0")
+        ble_parser = BleParser(tracker_whitelist=[uuid], dedup_ttl=10)
+        sensor_msg, tracker_msg = ble_parser.parse_raw_data(with_rssi(IBEACON, -50))
+        first_sensor_msg = dict(sensor_msg)
+        first_tracker_msg = dict(tracker_msg)
+
+        sensor_msg, tracker_msg = ble_parser.parse_raw_data(with_rssi(IBEACON, -40))
+        assert sensor_msg["uuid"] == first_sensor_msg["uuid"]
+        assert sensor_msg["data"] is False
+        assert sensor_msg["rssi"] == -40
+        assert tracker_msg == dict(first_tracker_msg, rssi=-40)
+
+    def test_ttl(self):
+        """Test that a repeated payload is a miss after the time to live."""
+        cache = PayloadDedupCache(ttl=5)
+        cache.store(b"mac", 1, 100.0, {"mac": "mac", "type": "T", "data": True, "temperature": 20}, None)
+        assert cache.lookup(b"mac", 1, 104.9, -70) == (
+            {"mac": "mac", "type": "T", "data": False, "local_name": "", "rssi": -70},
+            None,
+        )
+        assert cache.lookup(b"mac", 2, 104.9, -70) is None
+        assert cache.lookup(b"mac", 1, 105.0, -70) is None
+        assert (cache.hits, cache.misses) == (1, 2)
+
+    def test_max_size(self):
+        """Test that the least recently used MAC is evicted."""
+        cache = PayloadDedupCache(ttl=5, max_size=2)
+        cache.store(b"mac1", 1, 0.0, None, None)
+        cache.store(b"mac2", 1, 0.0, None, None)
+        assert cache.lookup(b"mac1", 1, 1.0, -70) == (None, None)
+        cache.store(b"mac3", 1, 0.0, None, None)
+        assert len(cache) == 2
+        assert cache.lookup(b"mac2", 1, 1.0, -70) is None
+        assert cache.lookup(b"mac1", 1, 1.0, -70) == (None, None)
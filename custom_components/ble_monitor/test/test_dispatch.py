@@ -0,0 +1,326 @@
+"""The tests for the ble_parser dispatch table."""
+import random
+
+from ble_monitor.ble_parser import BleParser
+from ble_monitor.ble_parser.const import JAALEE_TYPES, TILT_TYPES
+from ble_monitor.ble_parser.dispatch import (MANUFACTURER_DATA_DISPATCH,
+                                             MANUFACTURER_DATA_ENTRIES,
+                                             SENSORPUSH_UUID128,
+                                             SERVICE_DATA_DISPATCH,
+                                             SERVICE_DATA_ENTRIES, VENDORS,
+                                             Advertisement, LazyParser,
+                                             build_vendor_table,
+                                             match_manufacturer_data,
+                                             match_service_data)
+
+SONOFF_MAC = b"\x66\x55\x44\x33\x22\x11"
+# Govee H5051 and an unencrypted BTHome V2 temperature with the same MAC
+GOVEE_MAC = bytes.fromhex("E3605961BBAA")
+GOVEE_MAN_SPEC_DATA = bytes.fromhex("0cff88ec00ba0af90f63020101")
+BTHOME_SERVICE_DATA = bytes.fromhex("0716d2fc4002c409")
+GOVEE_EVENT = "043e1902010400aabb615960e30d0cff88ec00ba0af90f63020101b7"
+
+
+def legacy_service_route(service_data, service_data_list, local_name):
+    """Routing of the former elif chain for service data, as (name, stop)"""
+    uuid16 = (service_data[3] << 8) | service_data[2]
+    if uuid16 == 0x1809:
+        return "Relsib (Health Thermometer)", True
+    if uuid16 == 0x181A:
+        if len(service_data) == 22 or len(service_data) == 20:
+            return "b-parasite", True
+        return "ATC", True
+    elif uuid16 in [0x181B, 0x181D]:
+        return "Mi Scale", True
+    elif uuid16 in [0x181C, 0x181E]:
+        return "BTHome V1", True
+    elif uuid16 == 0x5242:
+        return "HolyIOT", True
+    elif uuid16 in [0xAA20, 0xAA21, 0xAA22] and local_name == "ECo":
+        return "Relsib", True
+    elif uuid16 in [0xF51C, 0xF525]:
+        return "Jaalee", True
+    elif uuid16 == 0xFCD2:
+        return "BTHome V2", True
+    elif uuid16 in [0xFD3D, 0x0D00]:
+        return "Switchbot", True
+    elif uuid16 == 0xFD50:
+        return "HHCC", True
+    elif uuid16 == 0xFDCD:
+        return "Qingping", True
+    elif uuid16 == 0xFE95:
+        return "Xiaomi", True
+    elif uuid16 == 0xFEAA:
+        if len(service_data) == 19:
+            return "KKM", True
+        elif len(service_data) >= 23:
+            return "Ruuvitag V2/V4", True
+        return "Google (other)", False
+    elif uuid16 == 0xFEE0:
+        return "Amazfit", False
+    elif uuid16 == 0xFFF9:
+        return "Cleargrass", True
+    elif uuid16 == 0x2A6E or uuid16 == 0x2A6F:
+        return "Teltonika (service data)", True
+    return None, False
+
+
+def legacy_manufacturer_route(
+    man_spec_data, man_spec_data_list, service_class_uuid16, service_class_uuid128, local_name, mac
+):
+    """Routing of the former elif chain for manufacturer data, as (name, stop)"""
+    comp_id = (man_spec_data[3] << 8) | man_spec_data[2]
+    data_len = man_spec_data[0]
+    if comp_id == 0x0828:
+        return "Michelin TMS", True
+    if comp_id == 0x0001 and data_len in [0x09, 0x0C, 0x22, 0x25]:
+        return "Govee H5101/H5102/H5106/H5177", True
+    elif comp_id == 0x004C and man_spec_data[4] == 0x02:
+        if int.from_bytes(man_spec_data[6:22], byteorder='big') in TILT_TYPES:
+            return "Tilt", True
+        elif int.from_bytes(man_spec_data[6:22], byteorder='big') in JAALEE_TYPES:
+            return "Jaalee (iBeacon)", True
+        elif len(man_spec_data_list) == 2:
+            second_man_spec_data = man_spec_data_list[1]
+            second_comp_id = (second_man_spec_data[3] << 8) | second_man_spec_data[2]
+            if second_comp_id == 0x089A:
+                return "Teltonika (iBeacon)", True
+            return "iBeacon (pair)", False
+        else:
+            return "iBeacon", True
+    elif comp_id == 0x00DC and data_len == 0x0E:
+        return "Oral-b", True
+    elif comp_id == 0x05CD and data_len == 0x15:
+        return "Chef iQ", True
+    elif comp_id == 0x0131:
+        return "Oras", True
+    elif comp_id == 0x0157 and data_len == 0x1B:
+        return "Miband", True
+    elif comp_id == 0x0194 and data_len == 0x0C:
+        return "Blustream", True
+    elif comp_id == 0x0499:
+        return "Ruuvitag V3/V5", True
+    elif comp_id == 0x0757:
+        return "Teltonika (Ela rebrand)", True
+    elif comp_id == 0x07B4:
+        return "Hörmann", True
+    elif comp_id == 0x089A:
+        return "Teltonika", True
+    elif comp_id == 0x094F and data_len == 0x15:
+        return "Mikrotik", True
+    elif comp_id == 0x06E8:
+        return "Almendo (Blusensor)", True
+    elif comp_id == 0x1000 and data_len == 0x15:
+        return "Moat S2", True
+    elif comp_id == 0x0133 and data_len in [0x11, 0x15]:
+        return "BlueMaestro", True
+    elif comp_id == 0x01AE and data_len == 0x0F:
+        return "SmartDry", True
+    elif comp_id == 0x06D5:
+        return "Sensirion", True
+    elif comp_id in [0x2111, 0x2112, 0x2121, 0x2122] and data_len == 0x0B:
+        return "Air Mentor", True
+    elif comp_id == 0x2730 and data_len in [0x14, 0x2D]:
+        return "Govee H5182", True
+    elif comp_id == 0x1B36 and data_len in [0x14, 0x2D]:
+        return "Govee H5184", True
+    elif comp_id in [0x4A32, 0x332, 0x4C32] and data_len in [0x17, 0x2D]:
+        return "Govee H5185", True
+    elif comp_id in [0x67DD, 0xE02F, 0xF79F] and data_len in [0x11, 0x2A]:
+        return "Govee H5183", False
+    elif comp_id in [0x5112, 0x5122, 0x6111, 0x6121] and data_len == 0x0f:
+        return "Air Mentor 2S", True
+    elif comp_id == 0x8801 and data_len in [0x0C, 0x25]:
+        return "Govee H5179", True
+    elif comp_id == 0xAA55 and data_len == 0x14:
+        return "Thermobeacon", True
+    elif comp_id == 0xAC63 and data_len in [0x17, 0x2D]:
+        return "Govee H5191", True
+    elif comp_id == 0xEA1C and data_len == 0x17:
+        return "Govee H5055", True
+    elif comp_id == 0xEC88 and data_len in [0x09, 0x0A, 0x0C, 0x22, 0x24, 0x25]:
+        return "Govee H5051/H5071/H5072/H5075/H5074", True
+    elif comp_id == 0xF214 and data_len == 0x16:
+        return "Grundfos", True
+    elif comp_id == 0xFFFF and man_spec_data[4:6] == b"\xee\x1b" and mac == SONOFF_MAC:
+        return "Sonoff", True
+    elif comp_id == 0xFFFF and data_len == 0x1E:
+        return "Kegtron", True
+    elif comp_id == 0xA0AC and data_len == 0x0F and man_spec_data[14] in [0x06, 0x0D]:
+        return "Laica", True
+    elif comp_id == 0x0100 and data_len == 0x14:
+        return "Senssun IF_B7", True
+    elif comp_id == 0x061A:
+        return "R.W. Beckett", True
+    elif man_spec_data[2] == 0xC0 and data_len == 0x10:
+        return "Xiaogui Scale", True
+    elif man_spec_data[3] == 0x82 and data_len == 0x0E:
+        return "iNode", True
+    elif man_spec_data[3] in [
+        0x91, 0x92, 0x93, 0x94, 0x95, 0x96, 0x9A, 0x9B, 0x9C, 0x9D
+    ] and data_len == 0x19:
+        return "iNode Care Sensors", True
+    elif service_class_uuid16 == 0x20AA and data_len == 0x0E:
+        return "Jinou BEC07-5", True
+    elif service_class_uuid16 in [0x5182, 0x5184] and data_len in [0x14, 0x2D]:
+        return "Govee H5182/H5184", True
+    elif service_class_uuid16 == 0x5183 and data_len in [0x11, 0x2A]:
+        return "Govee H5183 (uuid16)", True
+    elif service_class_uuid16 in [0x5185, 0x5198] and data_len in [0x17, 0x30]:
+        return "Govee H5185/H5198", True
+    elif service_class_uuid16 == 0xF0FF:
+        if comp_id in [0x0010, 0x0011, 0x0015, 0x0018, 0x001B] and data_len in [0x15, 0x17]:
+            return "Thermobeacon (uuid16)", True
+        elif (comp_id in [0x0000, 0x0001] or local_name in ["iBBQ", "xBBQ", "sps", "tps"]) and (
+            data_len in [0x0A, 0x0D, 0x0F, 0x13, 0x17]
+        ):
+            return "Inkbird", True
+        elif comp_id == 0x004A and local_name == "ST7" and data_len == 0x11:
+            return "Mocreo ST7", True
+        else:
+            return "uuid16 0xF0FF (other)", False
+    elif service_class_uuid128 == SENSORPUSH_UUID128 and data_len in [0x06, 0x08]:
+        return "Sensorpush", True
+    elif local_name in ["sps", "tps"] and data_len == 0x0A:
+        return "Inkbird IBS-TH", True
+    elif local_name == "MOCREO" and data_len == 0x13:
+        return "MOCREO", True
+    elif local_name[0:5] in ["TP357", "TP359"] and data_len >= 0x07:
+        return "Thermopro", True
+    elif data_len == 0x1B and ((man_spec_data[4] << 8) | man_spec_data[5]) == 0xBEAC:
+        return "AltBeacon", True
+    elif man_spec_data[0] == 0x12 and comp_id == 0xACC0:
+        return "Acconeer", True
+    return None, False
+
+
+def _outcome(func, *args):
+    """Return the routing of func, or the exception it raised"""
+    try:
+        result = func(*args)
+    except IndexError:
+        return IndexError
+    if result is None:
+        return None, False
+    if isinstance(result, tuple):
+        return result
+    return result.name, result.stop
+
+
+def _random_record(rng, keys, ad_type):
+    """Return a random AD structure with a known or random key in bytes 2-3"""
+    if rng.random() < 0.8:
+        key = rng.choice(keys)
+    else:
+        key = rng.randrange(0x10000)
+    data_len = rng.choice([rng.randrange(3, 0x32), 0x0A, 0x0E, 0x10, 0x12, 0x14, 0x15, 0x17, 0x19, 0x1B])
+    payload = bytearray(rng.randrange(256) for _ in range(data_len - 3))
+    if rng.random() < 0.3:
+        beacon = rng.choice([
+            b"\x02\x15" + next(iter(TILT_TYPES)).to_bytes(16, "big"),
+            b"\x02\x15" + next(iter(JAALEE_TYPES)).to_bytes(16, "big"),
+            b"\xbe\xac",
+            b"\xee\x1b",
+            b"\x02\x15",
+        ])
+        payload[0:len(beacon)] = beacon[:len(payload)]
+    if len(payload) > 11 and rng.random() < 0.5:
+        payload[11] = rng.choice([0x06, 0x0D])
+    return bytes([data_len, ad_type]) + key.to_bytes(2, "little") + bytes(payload)
+
+
+class TestDispatch:
+    """Tests for the dispatch table"""
+    def test_table_lists_every_entry(self):
+        """Test that every keyed entry can be found in the table."""
+        for entries, table in (
+            (SERVICE_DATA_ENTRIES, SERVICE_DATA_DISPATCH),
+            (MANUFACTURER_DATA_ENTRIES, MANUFACTURER_DATA_DISPATCH),
+        ):
+            names = [entry.name for entry in entries]
+            assert len(names) == len(set(names))
+            for entry in entries:
+                for key in entry.keys:
+                    assert entry in table[key]
+
+    def test_service_data_routing_matches_legacy_chain(self):
+        """Test service data routing against the former elif chain."""
+        rng = random.Random(1)
+        keys = list(SERVICE_DATA_DISPATCH)
+        for _ in range(20000):
+            service_data = _random_record(rng, keys, 0x16)
+            service_data_list = [service_data] * rng.choice([1, 2, 3])
+            local_name = rng.choice(["", "ECo", "other"])
+            adv = Advertisement(b"\x11" * 6, local_name, None, None, service_data_list, [])
+            assert _outcome(match_service_data, service_data, adv) == _outcome(
+                legacy_service_route, service_data, service_data_list, local_name
+            )
+
+    def test_manufacturer_data_routing_matches_legacy_chain(self):
+        """Test manufacturer specific data routing against the former elif chain."""
+        rng = random.Random(2)
+        keys = list(MANUFACTURER_DATA_DISPATCH)
+        for _ in range(50000):
+            man_spec_data = _random_record(rng, keys, 0xFF)
+            man_spec_data_list = [man_spec_data]
+            if rng.random() < 0.2:
+                man_spec_data_list.append(_random_record(rng, [0x089A, 0x0001], 0xFF))
+            mac = rng.choice([SONOFF_MAC, b"\x11" * 6])
+            local_name = rng.choice(["", "ECo", "sps", "tps", "iBBQ", "ST7", "MOCREO", "TP357 (1234)"])
+            service_class_uuid16 = rng.choice(
+                [None, 0x20AA, 0x5182, 0x5183, 0x5184, 0x5185, 0x5198, 0xF0FF, 0xF0FF]
+            )
+            service_class_uuid128 = rng.choice([None, SENSORPUSH_UUID128])
+            adv = Advertisement(
+                mac, local_name, service_class_uuid16, service_class_uuid128, [], man_spec_data_list
+            )
+            assert _outcome(match_manufacturer_data, man_spec_data, adv) == _outcome(
+                legacy_manufacturer_route,
+                man_spec_data,
+                man_spec_data_list,
+                service_class_uuid16,
+                service_class_uuid128,
+                local_name,
+                mac,
+            )
+
+
+class TestVendors:
+    """Tests for the vendor allow-list"""
+    def test_vendors(self):
+        """Test that the vendors are the names of the vendor modules."""
+        assert len(VENDORS) == 47
+        assert {"xiaomi", "bthome", "govee", "oral_b"} <= VENDORS
+        assert all(entry.vendor in VENDORS for entry in SERVICE_DATA_ENTRIES if entry.handler)
+
+    def test_lazy_parser(self):
+        """Test that a vendor module is imported on the first call of its parser."""
+        lazy = LazyParser("govee", "parse_govee")
+        assert lazy.vendor == "govee"
+        assert lazy.load() is lazy.load()
+        assert lazy.load().__module__ == "ble_monitor.ble_parser.govee"
+
+    def test_vendor_table(self):
+        """Test that the parsers of disabled vendors are removed from the dispatch table."""
+        table = build_vendor_table({"bthome"})
+        adv = Advertisement(GOVEE_MAC, "", None, None, [], [])
+        assert match_manufacturer_data(GOVEE_MAN_SPEC_DATA, adv, table) is None
+        assert match_service_data(BTHOME_SERVICE_DATA, adv, table).name == "BTHome V2"
+        entries = [entry for entries in table.service_data.values() for entry in entries]
+        assert {entry.vendor for entry in entries} <= {"bthome", None}
+
+    def test_parser(self):
+        """Test that a parser with an allow-list ignores the advertisements of other vendors."""
+        ble_parser = BleParser(vendors=["bthome"])
+        sensor_msg, _ = ble_parser.parse_raw_data(bytes.fromhex(GOVEE_EVENT))
+        assert sensor_msg is None
+        assert ble_parser.stats()["prefilter"]["rejected"] == 1
+        sensor_msg, _ = ble_parser.parse_advertisement(
+            GOVEE_MAC, -60, man_spec_data_list=[GOVEE_MAN_SPEC_DATA]
+        )
+        assert sensor_msg is None
+        sensor_msg, _ = ble_parser.parse_advertisement(
+            GOVEE_MAC, -60, service_data_list=[BTHOME_SERVICE_DATA]
+        )
+        assert sensor_msg["temperature"] == 25.0
+        assert BleParser(vendors=sorted(VENDORS)).vendors is None
@@ -0,0 +1,231 @@
+"""The tests for the bounded queues that hand parse results over to an event loop."""
+import asyncio
+import logging
+from threading import Thread
+
+import pytest
+from ble_monitor.ble_parser.handoff import (COALESCE, DROP_NEWEST, DROP_OLDEST,
+                                            SAMPLES, Coalescer, HandoffQueue,
+                                            coalesced_range, coalesced_samples)
+from ble_monitor.test.common import FakeTimer
+
+
+def run_in_thread(function, *args):
+    """Run function in another thread and wait for it."""
+    producer = Thread(target=function, args=args)
+    producer.start()
+    producer.join()
+
+
+def measurement(mac, **values):
+    """Return the sensor data of an advertisement."""
+    return {"mac": mac, "type": "LYWSDCGQ", **values}
+
+
+class TestHandoffQueue:
+    """Tests for the handoff queue"""
+    def test_batches(self):
+        """Test that all queued items are taken at once, in order."""
+        queue = HandoffQueue("measuring")
+
+        async def consume():
+            run_in_thread(lambda: [queue.put(item) for item in range(5)])
+            first = await queue.get()
+            queue.put(5)
+            return first, await queue.get()
+
+        assert asyncio.run(consume()) == ([0, 1, 2, 3, 4], [5])
+        stats = queue.stats()
+        assert stats["batches"] == 2
+        assert stats["items"] == 6
+        assert stats["high_water"] == 5
+        assert stats["batch_size"] == {"mean": 3.0, "p50": 5, "p99": 5, "max": 5}
+        assert 0 <= stats["latency_ms"]["p50"] <= stats["latency_ms"]["max"]
+
+    def test_wakeup(self):
+        """Test that a waiting consumer is woken up after max_items or a notify."""
+        queue = HandoffQueue("binary", max_items=3)
+
+        async def consume():
+            batches = []
+            consumer = asyncio.create_task(queue.get())
+            await asyncio.sleep(0.01)
+            run_in_thread(lambda: [queue.put(item) for item in range(2)])
+            await asyncio.sleep(0.01)
+            # less than max_items
+            assert not consumer.done()
+            run_in_thread(queue.put, 2)
+            batches.append(await asyncio.wait_for(consumer, 1))
+            consumer = asyncio.create_task(queue.get())
+            await asyncio.sleep(0.01)
+            run_in_thread(queue.put, 3)
+            run_in_thread(queue.notify)
+            batches.append(await asyncio.wait_for(consumer, 1))
+            return batches
+
+        assert asyncio.run(consume()) == [[0, 1, 2], [3]]
+
+    def test_wakeup_in_loop(self):
+        """Test that a consumer is woken up by items that are put in its event loop."""
+        queue = HandoffQueue("measuring", max_items=2)
+
+        async def consume():
+            consumer = asyncio.create_task(queue.get())
+            await asyncio.sleep(0)
+            queue.put(0)
+            queue.put(1)
+            # the waiter is done, without a callback of the event loop
+            assert queue._waiter.done()
+            return await asyncio.wait_for(consumer, 1)
+
+        assert asyncio.run(consume()) == [0, 1]
+
+    def test_timeout(self):
+        """Test that a consumer that stops waiting still gets the next items."""
+        queue = HandoffQueue("tracker")
+
+        async def consume():
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(queue.get(), 0.01)
+            queue.put(1)
+            queue.notify()
+            return await asyncio.wait_for(queue.get(), 1)
+
+        assert asyncio.run(consume()) == [1]
+
+    def test_close(self):
+        """Test that a waiting consumer gets the queued items and then None when the queue is closed."""
+        queue = HandoffQueue("tracker")
+
+        async def consume():
+            consumer = asyncio.create_task(queue.get())
+            await asyncio.sleep(0.01)
+            queue.put(1)
+            run_in_thread(queue.close)
+            return await asyncio.wait_for(consumer, 1), await asyncio.wait_for(queue.get(), 1)
+
+        assert asyncio.run(consume()) == ([1], None)
+        queue.put(2)
+        assert len(queue) == 0
+        assert asyncio.run(queue.get()) is None
+
+    def test_policy(self):
+        """Test that unknown policies and coalesce without key are rejected."""
+        with pytest.raises(ValueError):
+            HandoffQueue("binary", 10, "drop_all")
+        with pytest.raises(ValueError):
+            HandoffQueue("binary", 10, COALESCE)
+
+
+class TestOverload:
+    """Tests for the policies of a full queue"""
+    @pytest.mark.parametrize(
+        "policy, items", [(DROP_OLDEST, [2, 3, 4]), (DROP_NEWEST, [0, 1, 2])]
+    )
+    def test_drop(self, policy, items):
+        """Test that the oldest or the newest items are dropped."""
+        queue = HandoffQueue("binary", 3, policy)
+        for item in range(5):
+            queue.put(item)
+        assert asyncio.run(queue.get()) == items
+        stats = queue.stats()
+        assert stats["dropped"] == 2
+        assert stats["high_water"] == 3
+
+    def test_coalesce(self):
+        """Test that new items are merged into the queued item of the same device."""
+        queue = HandoffQueue("measuring", 2, COALESCE, key=lambda item: item["mac"])
+        first = measurement("A4C138000001", temperature=21.5)
+        queue.put(first)
+        queue.put(measurement("A4C138000002", temperature=22.5))
+        queue.put(measurement("A4C138000001", humidity=45.0))
+        queue.put(measurement("A4C138000001", temperature=21.6))
+        assert asyncio.run(queue.get()) == [
+            measurement("A4C138000001", temperature=21.6, humidity=45.0),
+            measurement("A4C138000002", temperature=22.5),
+        ]
+        # the item that was put is not changed, it can be in another queue as well
+        assert first == measurement("A4C138000001", temperature=21.5)
+        # without a queued item of the device, the oldest item is dropped
+        queue.put(measurement("A4C138000001", temperature=21.7))
+        queue.put(measurement("A4C138000002", temperature=22.6))
+        queue.put(measurement("A4C138000003", temperature=23.6))
+        queue.put(measurement("A4C138000001", temperature=21.8))
+        assert asyncio.run(queue.get()) == [
+            measurement("A4C138000003", temperature=23.6),
+            measurement("A4C138000001", temperature=21.8),
+        ]
+        stats = queue.stats()
+        assert stats["coalesced"] == 2
+        assert stats["dropped"] == 2
+
+    def test_saturation_warning(self, caplog):
+        """Test that a warning is logged once when a queue stays full."""
+        timer = FakeTimer()
+        queue = HandoffQueue("measuring", 1, timer=timer)
+        with caplog.at_level(logging.WARNING):
+            for _ in range(12):
+                queue.put(timer.now)
+                timer.now += 1
+        assert len(caplog.records) == 1
+        assert "The measuring queue is full for more than 10 seconds" in caplog.text
+        # taking the items ends the saturation
+        assert asyncio.run(queue.get()) == [11.0]
+        caplog.clear()
+        with caplog.at_level(logging.WARNING):
+            for _ in range(5):
+                queue.put(timer.now)
+                timer.now += 1
+        assert not caplog.records
+
+
+class TestCoalescer:
+    """Tests for merging the messages of a device"""
+    def test_merge(self):
+        """Test that the latest values are kept with the sample counts, sums and ranges."""
+        coalescer = Coalescer(lambda item: item["mac"])
+        first = measurement("A4C138000001", temperature=21.0, rssi=-70, packet=1)
+        coalescer.put(first)
+        coalescer.put(measurement("A4C138000002", temperature=25.0, rssi=-80, packet=7))
+        coalescer.put(measurement("A4C138000001", humidity=40.0, rssi=-72, packet=2))
+        coalescer.put(measurement("A4C138000001", temperature=22.0, rssi=-74, packet=3))
+        assert len(coalescer) == 2
+        device_1, device_2 = coalescer.flush()
+        assert device_1 == measurement(
+            "A4C138000001",
+            temperature=22.0,
+            humidity=40.0,
+            rssi=-74,
+            packet=3,
+            samples={
+                "temperature": [2, 43.0, 21.0, 22.0],
+                "rssi": [3, -216, -74, -70],
+                "humidity": [1, 40.0, 40.0, 40.0],
+            },
+        )
+        assert device_2 == measurement("A4C138000002", temperature=25.0, rssi=-80, packet=7)
+        # the item that was put is not changed, it can be in another queue as well
+        assert first == measurement("A4C138000001", temperature=21.0, rssi=-70, packet=1)
+        assert coalescer.stats() == {"pending": 0, "merged": 2}
+        assert coalescer.flush() == []
+
+    def test_samples(self):
+        """Test the mean and number of samples of coalesced and other messages."""
+        coalescer = Coalescer(lambda item: item["mac"])
+        for temperature in (21.0, 22.0, 23.5):
+            coalescer.put(measurement("A4C138000001", temperature=temperature, battery=90))
+        data = coalescer.flush()[0]
+        assert coalesced_samples(data, "temperature") == (22.166666666666668, 3)
+        assert coalesced_samples(data, "battery") == (90, 3)
+        assert SAMPLES not in measurement("A4C138000001")
+        assert coalesced_samples(measurement("A4C138000001", temperature=21.0), "temperature") == (21.0, 1)
+
+    def test_range(self):
+        """Test that a spike that is merged with good samples is kept in the range."""
+        coalescer = Coalescer(lambda item: item["mac"])
+        for temperature in (21.0, 150.0, 22.0, 20.5):
+            coalescer.put(measurement("A4C138000001", temperature=temperature))
+        data = coalescer.flush()[0]
+        assert coalesced_samples(data, "temperature") == (53.375, 4)
+        assert coalesced_range(data, "temperature") == (20.5, 150.0)
+        assert coalesced_range(measurement("A4C138000001", temperature=21.0), "temperature") == (21.0, 21.0)
@@ -0,0 +1,85 @@
+"""The tests for HCI events with multiple advertising reports."""
+import pytest
+from ble_monitor.ble_parser import BleParser
+
+LEGACY_EVENTS = [
+    # Govee H5051
+    "043e1902010400aabb615960e30d0cff88ec00ba0af90f63020101b7",
+    # Thermobeacon
+    "043e29020100002716000088061d0201060302f0ff15ff110000002716000088063c0c8f01a103b9d70300c8",
+    # ATC (Atc1441 format)
+    "043e1f02010000f4830238c1a41312161a18f4830238c1a4a9066911b60b58f70dde",
+    # Inkbird
+    "043e2102010000d7652e9aec28150201060302f0ff0dff0000000028ec9a2e65d7f000b5",
+]
+
+EXTENDED_EVENTS = [
+    # Sensirion MyCO2
+    "043e320d0113000135673cdceaf80100ff7fb0000000000000000000180201060dffd506000867355367925c0b0406094d79434f32",
+    # Xiaomi Mi Scale V2
+    "043e390d011300008995c08c47c80100ff7fc70000000000000000001f02010603021d1809ff5701c8478cc095890d161d18821400e507040b101708",
+    # Thermopro TP359
+    "043e330d01130000870cf2487e480100ff7fd8000000000000000000190d0954503335392028304338372902010507ffc2ff0035012c",
+    # Amazfit Smart Scale
+    "043e390d011300000ea4309e87700100ff7fb10000000000000000001f0201050302e0fe1716e0feba82e6c7fc3414a442bf46ec68000462bba30100",
+]
+
+
+def combine_events(events):
+    """Combine single report HCI events into one event with multiple reports."""
+    reports = b"".join(event[5:] for event in events)
+    return bytes([0x04, 0x3E, len(reports) + 2, events[0][3], len(events)]) + reports
+
+
+class TestHciEvents:
+    """Tests for HCI events with multiple advertising reports"""
+    @pytest.mark.parametrize("num_reports", [2, 3, 4])
+    @pytest.mark.parametrize("events", [LEGACY_EVENTS, EXTENDED_EVENTS], ids=["legacy", "extended"])
+    def test_multiple_reports(self, events, num_reports):
+        """Test that every report in the event is parsed."""
+        events = [bytes.fromhex(event) for event in events[:num_reports]]
+        expected = [BleParser().parse_raw_data(event) for event in events]
+        assert all(sensor_msg for sensor_msg, _ in expected)
+
+        ble_parser = BleParser()
+        assert ble_parser.parse_hci_event(combine_events(events)) == expected
+
+    @pytest.mark.parametrize("events", [LEGACY_EVENTS, EXTENDED_EVENTS], ids=["legacy", "extended"])
+    def test_length_mismatch(self, events):
+        """Test that events with inconsistent lengths are rejected."""
+        data = combine_events([bytes.fromhex(event) for event in events[:2]])
+        ble_parser = BleParser()
+
+        # one report less than announced
+        assert ble_parser.parse_hci_event(data[:4] + bytes([3]) + data[5:]) == []
+        # one report more than announced
+        assert ble_parser.parse_hci_event(data[:4] + bytes([1]) + data[5:]) == []
+        # truncated event
+        assert ble_parser.parse_hci_event(bytes([data[0], data[1], data[2] - 1]) + data[3:-1]) == []
+
+
+class TestParseRawBatch:
+    """Tests for parsing a batch of HCI events"""
+    def test_batch(self):
+        """Test that each event of the batch gives the same results as parse_hci_event."""
+        events = [bytes.fromhex(event) for event in LEGACY_EVENTS + EXTENDED_EVENTS]
+        events.append(combine_events(events[:2]))
+        # too short and truncated events
+        events += [bytes(5), events[0][:-1]]
+        expected = [BleParser().parse_hci_event(event) for event in events]
+        assert expected[-2:] == [[], []]
+
+        results = BleParser().parse_raw_batch(events)
+        assert iter(results) is results
+        assert list(results) == expected
+
+    def test_timestamps(self):
+        """Test that the timestamps of the packets are used by the dedup cache."""
+        event = bytes.fromhex(LEGACY_EVENTS[0])
+        ble_parser = BleParser(dedup_ttl=10)
+        results = list(ble_parser.parse_raw_batch([event] * 3, [100.0, 105.0, 115.0]))
+        assert [sensor_msg["data"] for ((sensor_msg, _),) in results] == [True, False, True]
+        assert ble_parser.stats()["dedup_cache"]["hits"] == 1
+
+        with pytest.raises(ValueError):
+            list(ble_parser.parse_raw_batch([event] * 2, [100.0]))
@@ -0,0 +1,41 @@
+"""The tests for the MAC address and UUID helpers."""
+from ble_monitor.ble_parser.helpers import (identifier, identifier_from_string,
+                                            to_mac, to_unformatted_mac,
+                                            to_uuid)
+
+MAC = bytes.fromhex("A4C138AABBCC")
+UUID = bytes.fromhex("E2C56DB5DFFB48D2B060D0F5A71096E0")
+
+
+class TestIdentifier:
+    """Tests for the cached string forms of MAC addresses and UUIDs"""
+    def test_mac(self):
+        """Test the string forms of a MAC address."""
+        mac = identifier(MAC)
+        assert mac.raw == MAC
+        assert mac.unformatted == "A4C138AABBCC"
+        assert mac.formatted == "A4:C1:38:AA:BB:CC"
+        assert mac.uuid is None
+        assert mac.normalized == "A4:C1:38:AA:BB:CC"
+        assert to_mac(MAC) == "A4:C1:38:AA:BB:CC"
+        assert to_unformatted_mac(MAC) == "A4C138AABBCC"
+
+    def test_uuid(self):
+        """Test the string forms of a UUID."""
+        uuid = identifier(UUID)
+        assert uuid.unformatted == "E2C56DB5DFFB48D2B060D0F5A71096E0"
+        assert uuid.normalized == "e2c56db5-dffb-48d2-b060-d0f5a71096e0"
+        assert to_uuid(UUID) == "e2c56db5-dffb-48d2-b060-d0f5a71096e0"
+
+    def test_cached(self):
+        """Test that the same string objects are returned for the same identifier."""
+        assert to_mac(MAC) is to_mac(bytes.fromhex("A4C138AABBCC"))
+        assert identifier_from_string("A4C138AABBCC") is identifier(MAC)
+        assert identifier_from_string("a4:c1:38:aa:bb:cc") is identifier(MAC)
+        assert identifier_from_string("e2c56db5-dffb-48d2-b060-d0f5a71096e0") is identifier(UUID)
+
+    def test_invalid_string(self):
+        """Test that strings that are not a MAC address or UUID are not cached."""
+        assert identifier_from_string("A4C138AABB") is None
+        assert identifier_from_string("A4C138AABBCG") is None
+        assert identifier_from_string("A4C138 AABBC") is None
@@ -0,0 +1,101 @@
+"""The tests for the reentrant parser and the parser worker pool."""
+import sys
+from threading import Lock, Thread
+
+from ble_monitor.ble_parser import BleParser
+from ble_monitor.ble_parser.pool import ParserPool
+from ble_monitor.test.common import BTHOME_KEY, bthome_event
+
+
+def macs(count):
+    """Return count MAC addresses."""
+    return [bytes([0x54, 0x48, 0xE6, 0x00, 0x00, i]) for i in range(count)]
+
+
+class TestReentrantParser:
+    """Tests for parsing with one parser in several threads"""
+    def test_concurrent_bthome(self):
+        """Test that concurrent threads do not mix up the packets of different devices."""
+        devices = macs(8)
+        parser = BleParser(aeskeys={mac: BTHOME_KEY for mac in devices})
+        errors = []
+
+        def parse(mac):
+            for packet_id in range(1, 200):
+                sensor_msg, _ = parser.parse_raw_data(bthome_event(mac, packet_id, mac[5] + packet_id / 100))
+                if (
+                    sensor_msg["mac"] != mac.hex().upper()
+                    or sensor_msg["packet"] != packet_id
+                    or sensor_msg["temperature"] != round(mac[5] + packet_id / 100, 2)
+                    or sensor_msg["firmware"] != "BTHome V2 (encrypted)"
+                ):
+                    errors.append(sensor_msg)
+
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            threads = [Thread(target=parse, args=(mac,)) for mac in devices]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setswitchinterval(switch_interval)
+        assert errors == []
+
+
+class TestParserPool:
+    """Tests for the parser worker pool"""
+    def test_order_per_device(self):
+        """Test that the reports of a device are parsed in order by one worker."""
+        devices = macs(16)
+        results = []
+        lock = Lock()
+
+        def callback(sensor_msg, tracker_msg, gateway_id):
+            with lock:
+                results.append((sensor_msg["mac"], sensor_msg["packet"], gateway_id))
+
+        pool = ParserPool(callback, workers=4, aeskeys={mac: BTHOME_KEY for mac in devices})
+        pool.start()
+        for packet_id in range(1, 51):
+            for mac in devices:
+                pool.submit(bthome_event(mac, packet_id, 20.0), "gateway")
+        pool.stop()
+
+        assert len(results) == 16 * 50
+        for mac in devices:
+            packets = [packet for device, packet, _ in results if device == mac.hex().upper()]
+            assert packets == list(range(1, 51))
+        assert {gateway_id for _, _, gateway_id in results} == {"gateway"}
+        # the state of a device is only kept by one of the workers
+        assert sum(len(parser.lpacket_ids) for parser in pool.parsers) == 16
+
+    def test_stats(self):
+        """Test that the parser statistics are summed over the workers."""
+        pool = ParserPool(lambda *args: None, workers=3, aeskeys={mac: BTHOME_KEY for mac in macs(6)})
+        pool.start()
+        for mac in macs(6):
+            pool.submit(bthome_event(mac, 1, 20.0))
+        pool.stop()
+        stats = pool.stats()
+        assert stats["lpacket_ids"] == {"size": 6, "evictions": 0}
+        assert stats["prefilter"] == {"accepted": 6, "rejected": 0}
+        assert stats["pool"] == {"workers": 3, "queued": 0}
+
+    def test_callback_error(self):
+        """Test that a worker keeps running after an exception in the callback."""
+        results = []
+
+        def callback(sensor_msg, tracker_msg):
+            if sensor_msg["packet"] == 1:
+                raise ValueError("callback error")
+            results.append(sensor_msg["packet"])
+
+        mac = macs(1)[0]
+        pool = ParserPool(callback, workers=1, aeskeys={mac: BTHOME_KEY})
+        pool.start()
+        pool.submit(bthome_event(mac, 1, 20.0))
+        pool.submit(bthome_event(mac, 2, 20.0))
+        pool.stop()
+        assert results == [2]
@@ -0,0 +1,113 @@
+"""The tests for the advertisement prefilter."""
+import random
+import re
+from pathlib import Path
+
+from ble_monitor.ble_parser import BleParser
+from ble_monitor.ble_parser.dispatch import (MANUFACTURER_DATA_DISPATCH,
+                                             SERVICE_DATA_DISPATCH,
+                                             Advertisement,
+                                             match_manufacturer_data,
+                                             match_service_data)
+from ble_monitor.ble_parser.prefilter import Prefilter
+from ble_monitor.ble_parser.tokenizer import tokenize_ad_structures
+from ble_monitor.test.common import hci_event
+
+MAC = b"\x11\x22\x33\x44\x55\x66"
+
+# Advertisements of phones, earbuds and TVs
+UNSUPPORTED = [
+    # Apple Nearby Info
+    "02011a0aff4c0010050318a4d0c8",
+    # Apple AirPods
+    "1eff4c000719010e2022f58f0100000c6fbf7c8a2c3c6e5d6a0e2a4d36c4e1",
+    # Samsung
+    "02011a0dff750042040180606b2b3d2f4b",
+    # Microsoft Swift Pair / CDP
+    "1eff0600010920022a3c5e43a12d54b7c3ac3ee2cd69a5fc94a2d7c43e1b8c",
+    # Google Fast Pair
+    "0303 2cfe 06162cfe00b1a1".replace(" ", ""),
+    # Only flags and a name
+    "020106 0b094c472054562035352220".replace(" ", ""),
+]
+
+
+def load_test_vectors():
+    """Return the raw HCI events of the parser tests."""
+    vectors = []
+    for test_file in sorted(Path(__file__).parent.glob("test_*.py")):
+        for data_string in re.findall(r'data_string = ["\']([0-9a-fA-F]+)["\']', test_file.read_text()):
+            vectors.append(bytes.fromhex(data_string))
+    return vectors
+
+
+def random_adpayload(rng):
+    """Return random AD structures with a mix of known and unknown keys."""
+    adpayload = b"\x02\x01\x06"
+    for _ in range(rng.choice([1, 1, 2])):
+        if rng.random() < 0.5:
+            ad_type, keys = 0x16, list(SERVICE_DATA_DISPATCH)
+        else:
+            ad_type, keys = 0xFF, list(MANUFACTURER_DATA_DISPATCH)
+        key = rng.choice(keys) if rng.random() < 0.5 else rng.randrange(0x10000)
+        payload = bytes(rng.randrange(256) for _ in range(rng.randrange(1, 0x2E)))
+        if rng.random() < 0.2:
+            payload = rng.choice([b"\x02\x15", b"\xbe\xac", b"\x10\x05"]) + payload
+        record = bytes([ad_type]) + key.to_bytes(2, "little") + payload
+        adpayload += bytes([len(record)]) + record
+    if rng.random() < 0.3:
+        name = rng.choice([b"TP357 (1234)", b"TP359", b"sps", b"Phone"])
+        adpayload += bytes([len(name) + 1, rng.choice([0x08, 0x09])]) + name
+    return adpayload
+
+
+class TestPrefilter:
+    """Tests for the prefilter"""
+    def test_unsupported_devices(self):
+        """Test that advertisements of unsupported devices are rejected."""
+        ble_parser = BleParser()
+        for adpayload in UNSUPPORTED:
+            assert ble_parser.parse_raw_data(hci_event(bytes.fromhex(adpayload), MAC)) == (None, None)
+        assert ble_parser.stats()["prefilter"] == {"accepted": 0, "rejected": len(UNSUPPORTED)}
+
+    def test_supported_devices(self):
+        """Test that the prefilter does not change the result for the test vectors."""
+        ble_parser = BleParser()
+        reference_parser = BleParser(prefilter=False)
+        for data in load_test_vectors():
+            assert ble_parser.parse_hci_event(data) == reference_parser.parse_hci_event(data)
+        assert ble_parser.prefilter.accepted > 0
+
+    def test_rejected_advertisements_have_no_parser(self):
+        """Test that no parser is found for the records of rejected advertisements."""
+        rng = random.Random(3)
+        prefilter = Prefilter()
+        for _ in range(20000):
+            adpayload = random_adpayload(rng)
+            if prefilter.accepts(adpayload, 0, len(adpayload), MAC):
+                continue
+            local_name, uuid16, uuid128, service_data_list, man_spec_data_list = tokenize_ad_structures(
+                adpayload, 0, len(adpayload), MAC
+            )
+            adv = Advertisement(MAC, local_name, uuid16, uuid128, service_data_list, man_spec_data_list)
+            for service_data in service_data_list:
+                entry = match_service_data(service_data, adv)
+                assert entry is None or entry.handler is None
+            for man_spec_data in man_spec_data_list:
+                try:
+                    entry = match_manufacturer_data(man_spec_data, adv)
+                except IndexError:
+                    continue
+                assert entry is None or entry.handler is None
+        assert prefilter.accepted > 1000
+        assert prefilter.rejected > 1000
+
+    def test_tracker_whitelist(self):
+        """Test that advertisements of tracked devices are not rejected."""
+        ble_parser = BleParser(tracker_whitelist=[MAC])
+        _, tracker_msg = ble_parser.parse_raw_data(hci_event(bytes.fromhex(UNSUPPORTED[0]), MAC))
+        assert tracker_msg["mac"] == "112233445566"
+
+    def test_report_unknown(self):
+        """Test that the prefilter is disabled when unknown advertisements are reported."""
+        assert BleParser(report_unknown="Other").prefilter is None
@@ -0,0 +1,61 @@
+"""The tests for the routing of the sensor data to the queues of the sensors."""
+from ble_monitor.const import (AUTO_BINARY_SENSOR_LIST,
+                               AUTO_INSTANT_SENSOR_LIST,
+                               AUTO_MANUFACTURER_DICT, AUTO_SENSOR_LIST,
+                               MANUFACTURER_DICT, MEASUREMENT_DICT)
+from ble_monitor.routing import build_routes, route_sensor_data
+
+ROUTES = build_routes()
+
+
+def legacy_route(sensor_msg):
+    """Route the sensor data with the sensor lists, as it was done before the routing table."""
+    device_type = sensor_msg["type"]
+    if device_type in MANUFACTURER_DICT:
+        sensor_list = MEASUREMENT_DICT[device_type][0] + MEASUREMENT_DICT[device_type][1]
+        binary_list = MEASUREMENT_DICT[device_type][2] + ["battery"]
+    elif device_type in AUTO_MANUFACTURER_DICT:
+        sensor_list = AUTO_SENSOR_LIST
+        binary_list = AUTO_BINARY_SENSOR_LIST + ["battery"]
+    else:
+        return None
+    measuring = any(x in sensor_msg for x in sensor_list)
+    binary = any(x in sensor_msg for x in binary_list)
+    if binary == measuring:
+        return True, True
+    return measuring, binary
+
+
+def sensor_messages(device_type):
+    """Return sensor data of a device type with each of its keys, and without keys."""
+    header = {"mac": "A4C138000001", "type": device_type, "firmware": "test", "packet": 1, "data": True}
+    if device_type in MANUFACTURER_DICT:
+        keys = sum(MEASUREMENT_DICT[device_type], [])
+    else:
+        keys = AUTO_SENSOR_LIST + AUTO_BINARY_SENSOR_LIST
+    yield header
+    for key in keys:
+        yield {**header, key: 1}
+        yield {**header, key: 1, "rssi": -70}
+
+
+class TestRouting:
+    """Tests for the routing table"""
+    def test_device_types(self):
+        """Test that there is a route for all supported device types."""
+        assert set(ROUTES) == set(MANUFACTURER_DICT) | set(AUTO_MANUFACTURER_DICT)
+        assert "unknown" not in ROUTES
+
+    def test_legacy(self):
+        """Test that the routing table routes the sensor data as the sensor lists did."""
+        for device_type, route in ROUTES.items():
+            for sensor_msg in sensor_messages(device_type):
+                assert route_sensor_data(route, sensor_msg) == legacy_route(sensor_msg), sensor_msg
+
+    def test_instant(self):
+        """Test the measurements that update the state instantly."""
+        assert ROUTES["XMMF01JQD"].instant == frozenset(["button"])
+        assert ROUTES["LYWSDCGQ"].instant == frozenset()
+        assert ROUTES["BTHome"].instant == frozenset(AUTO_INSTANT_SENSOR_LIST)
+        assert "weight" in ROUTES["BTHome"].instant
+        assert "temperature" not in ROUTES["BTHome"].instant
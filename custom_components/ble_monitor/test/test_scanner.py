@@ -0,0 +1,105 @@
+"""The tests for the HCI scanner in the event loop."""
+import asyncio
+
+from ble_monitor import BLEmonitor, HCIscanner
+from ble_monitor.ble_parser.capture import CaptureWriter
+from ble_monitor.ble_parser.handoff import HandoffQueue
+
+# Govee H5074
+GOVEE = bytes.fromhex("043e1702010400aabb611d12e00b0aff88ec0088078c116402a6")
+
+
+def scanner_config(replay_file):
+    """Return the configuration of a scanner that replays a capture file."""
+    return {
+        "hci_interface": [0],
+        "bt_interface": ["disable"],
+        "active_scan": False,
+        "report_unknown": False,
+        "devices": [],
+        "discovery": True,
+        "bt_auto_restart": False,
+        "replay_file": str(replay_file),
+        "replay_speed": 0,
+        "dedup_ttl": 0,
+    }
+
+
+class TestHCIscanner:
+    """Tests for the HCI scanner"""
+    def test_replay(self, tmp_path):
+        """Test that the events are parsed and queued in the event loop, across a restart."""
+        path = tmp_path / "capture.bin"
+        writer = CaptureWriter(str(path))
+        for timestamp in range(3):
+            writer.write(GOVEE, "hci0", float(timestamp))
+        writer.close()
+        dataqueue = {name: HandoffQueue(name) for name in ("binary", "measuring", "tracker")}
+        scanner = HCIscanner(scanner_config(path), dataqueue)
+
+        async def scan():
+            scanner.start()
+            assert scanner.is_alive()
+            measurements = []
+            while len(measurements) < 3:
+                measurements += await asyncio.wait_for(dataqueue["measuring"].get(), 1)
+            scanner.restart()
+            await asyncio.sleep(0.01)
+            assert scanner.is_alive()
+            scanner.stop()
+            assert await scanner.async_join(1)
+            return measurements
+
+        measurements = asyncio.run(scan())
+        assert [data["type"] for data in measurements] == ["H5074"] * 3
+        assert measurements[0]["temperature"] == 19.28
+        assert not scanner.is_alive()
+        assert scanner.evt_cnt == 0
+
+    def test_stop_before_start(self, tmp_path):
+        """Test that a scanner that is stopped before it runs finishes at once."""
+        scanner = HCIscanner(scanner_config(tmp_path / "missing.bin"), {})
+
+        async def scan():
+            scanner.stop()
+            scanner.start()
+            return await scanner.async_join(1)
+
+        assert asyncio.run(scan())
+        assert not scanner.is_alive()
+
+    def test_stop(self, tmp_path):
+        """Test that the merged measurements are handed over before the queues are closed."""
+        path = tmp_path / "capture.bin"
+        writer = CaptureWriter(str(path))
+        for timestamp in range(3):
+            writer.write(GOVEE, "hci0", float(timestamp))
+        writer.close()
+        config = {
+            **scanner_config(path),
+            "scanner_mode": "event_loop",
+            "coalesce_measurements": True,
+            # the measurements are only handed over when the scanner stops
+            "handoff_delay": 60000,
+        }
+        blemonitor = BLEmonitor(config)
+
+        async def scan():
+            blemonitor.start()
+            while blemonitor.dumpthread.evt_cnt < 3:
+                await asyncio.sleep(0.01)
+            assert len(blemonitor.dataqueue["measuring"]) == 0
+            assert await blemonitor.async_stop()
+            queue = blemonitor.dataqueue["measuring"]
+            return await queue.get(), await queue.get()
+
+        measurements, closed = asyncio.run(scan())
+        assert [data["samples"]["temperature"][0] for data in measurements] == [3]
+        assert closed is None
+
+    def test_jagged_humidity(self):
+        """Test that the jagged humidity of the Xiaomi firmware is not merged."""
+        data = {"type": "LYWSD03MMC", "firmware": "Xiaomi (MiBeacon V3)", "humidity": 45.0}
+        assert HCIscanner.jagged_humidity(data)
+        assert not HCIscanner.jagged_humidity({**data, "firmware": "ATC (Custom)"})
+        assert not HCIscanner.jagged_humidity({"type": "LYWSD03MMC", "firmware": "Xiaomi (MiBeacon V3)", "battery": 80})
@@ -0,0 +1,122 @@
+"""The tests for the bounded parser state."""
+import logging
+import os
+import random
+import tracemalloc
+
+import pytest
+from ble_monitor.ble_parser import BleParser
+from ble_monitor.ble_parser.cache import LRUStateMap
+from ble_monitor.test.common import FakeTimer, atc_event, bthome_event
+
+
+class TestLRUStateMap:
+    """Tests for the bounded parser state map"""
+    def test_max_size(self):
+        """Test that the least recently used key is evicted."""
+        state = LRUStateMap(max_size=2, ttl=0)
+        state["a"] = 1
+        state["b"] = 2
+        assert state["a"] == 1
+        state["c"] = 3
+        assert dict(state) == {"a": 1, "c": 3}
+        assert state.evictions == 1
+        with pytest.raises(KeyError):
+            state["b"]
+
+    def test_ttl(self):
+        """Test that idle keys are evicted."""
+        timer = FakeTimer()
+        state = LRUStateMap(max_size=10, ttl=60, timer=timer)
+        state["a"] = 1
+        state["b"] = 2
+        timer.now = 50
+        assert state["a"] == 1
+        timer.now = 100
+        # b is idle for 100 seconds, a is idle for 50 seconds
+        state["c"] = 3
+        assert sorted(state) == ["a", "c"]
+        timer.now = 200
+        with pytest.raises(KeyError):
+            state["a"]
+        assert state.evictions == 2
+
+    def test_peek(self):
+        """Test that peek and snapshot don't mark the keys as recently used."""
+        state = LRUStateMap(max_size=2, ttl=0)
+        state["a"] = 1
+        state["b"] = 2
+        assert state.peek("a") == 1
+        assert state.peek("c", 0) == 0
+        assert state.snapshot() == [("a", 1), ("b", 2)]
+        state["c"] = 3
+        assert state.snapshot() == [("b", 2), ("c", 3)]
+
+    def test_parser_stats(self):
+        """Test the sizes and eviction counts of the parser state."""
+        ble_parser = BleParser(state_max_size=2)
+        for mac in (b"\xa4\xc1\x38\x00\x00\x01", b"\xa4\xc1\x38\x00\x00\x02", b"\xa4\xc1\x38\x00\x00\x03"):
+            sensor_msg, _ = ble_parser.parse_raw_data(atc_event(mac))
+            assert sensor_msg["type"] == "ATC"
+        stats = ble_parser.stats()
+        assert stats["lpacket_ids"] == {"size": 2, "evictions": 1}
+        assert stats["source_arbitration"] == {"size": 2, "evictions": 1, "rejected": 0}
+        assert stats["no_key_message"] == {"size": 0, "evictions": 0}
+
+    @pytest.mark.parametrize(
+        "rounds",
+        [
+            10000,
+            # 1M random MACs, takes several minutes
+            pytest.param(
+                333334,
+                marks=pytest.mark.skipif(
+                    not os.environ.get("BLE_MONITOR_SOAK"), reason="set BLE_MONITOR_SOAK to run the 1M MACs soak"
+                ),
+            ),
+        ],
+    )
+    def test_soak(self, caplog, rounds):
+        """Test that the parser state stays bounded with many random MACs, three per round."""
+        # an error is logged for each MAC without key or with a wrong key
+        caplog.set_level(logging.CRITICAL, logger="ble_monitor.ble_parser")
+        aeskeys = {}
+        ble_parser = BleParser(
+            aeskeys=aeskeys, dedup_ttl=10, dedup_max_size=1000, state_max_size=1000
+        )
+        rnd = random.Random(1)
+
+        def feed(count):
+            # a plain ATC, an encrypted BTHome without key and one with a wrong key per round
+            for _ in range(count):
+                list(ble_parser.parse_hci_event(atc_event(rnd.randbytes(6))))
+                list(ble_parser.parse_hci_event(bthome_event(rnd.randbytes(6), 1, 20.0)))
+                mac = rnd.randbytes(6)
+                aeskeys[mac] = bytes(16)
+                list(ble_parser.parse_hci_event(bthome_event(mac, 1, 20.0)))
+
+        feed(rounds - 5000)
+        aeskeys.clear()
+        # the state is full, the memory use should not grow anymore. Each feed
+        # renews all entries of the state and of the MAC string cache (4096)
+        tracemalloc.start()
+        try:
+            feed(2500)
+            aeskeys.clear()
+            traced = tracemalloc.get_traced_memory()[0]
+            feed(2500)
+            aeskeys.clear()
+            growth = tracemalloc.get_traced_memory()[0] - traced
+        finally:
+            tracemalloc.stop()
+
+        stats = ble_parser.stats()
+        for name in ("lpacket_ids", "source_arbitration", "no_key_message"):
+            assert stats[name]["size"] == 1000, name
+            assert stats[name]["evictions"] > 0, name
+        assert stats["movements_list"]["size"] <= 1000
+        assert len(ble_parser.dedup_cache) == 1000
+        assert len(ble_parser.decryption_failures) == 1000
+        assert stats["ciphers"] == {"size": 1, "evictions": 0}
+        # the state of the MACs is renewed, the memory use does not grow
+        assert growth < 50000
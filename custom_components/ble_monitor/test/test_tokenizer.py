@@ -0,0 +1,25 @@
+"""The tests for the AD structure tokenizer."""
+from ble_monitor.ble_parser.tokenizer import tokenize_ad_structures
+
+
+class TestTokenizer:
+    """Tests for the AD structure tokenizer"""
+    def test_tokenizer(self):
+        """Test that only the AD structures used by the parsers are returned."""
+        # flags, complete 16-bit UUIDs, tx power, complete local name, service data, manufacturer data
+        data = bytes.fromhex("020106" "0303f0ff" "020a00" "0409544553" "0516d2fc4001" "05ff4c000215")
+        local_name, uuid16, uuid128, service_data_list, man_spec_data_list = tokenize_ad_structures(
+            data, 0, len(data), b"\xaa\xbb\xcc\xdd\xee\xff"
+        )
+        assert local_name == "TES"
+        assert uuid16 == 0xF0FF
+        assert uuid128 is None
+        assert service_data_list == [bytes.fromhex("0516d2fc4001")]
+        assert man_spec_data_list == [bytes.fromhex("05ff4c000215")]
+
+    def test_tokenizer_truncated_uuid16(self):
+        """Test that a too short list of 16-bit UUIDs is ignored."""
+        data = bytes.fromhex("0203f0" "0409414243")
+        local_name, uuid16, _, _, _ = tokenize_ad_structures(data, 0, len(data), b"\x00" * 6)
+        assert local_name == "ABC"
+        assert uuid16 is None
@@ -0,0 +1,57 @@
+"""The tests for the whitelist when discovery is disabled."""
+from ble_monitor.ble_parser import BleParser
+
+# ATC (custom format) with MAC A4C1388D18B2
+ATC = "043e2202010000b2188d38c1a41602010612161a18b2188d38c1a4c809ad14e50b64b904c3"
+ATC_MAC = bytes.fromhex("A4C1388D18B2")
+# iBeacon with MAC 6A6BC9A23E43
+IBEACON = "043E2A02010001433EA2C96B6A1E02011A1AFF4C000215E2C56DB5DFFB48D2B060D0F5A71096E000640000C5B3"
+IBEACON_MAC = bytes.fromhex("6A6BC9A23E43")
+IBEACON_UUID = bytes.fromhex("e2c56db5dffb48d2b060d0f5a71096e0")
+
+
+class TestWhitelist:
+    """Tests for the whitelist"""
+    def test_whitelisted_mac(self):
+        """Test that whitelisted MAC addresses are parsed."""
+        ble_parser = BleParser(discovery=False, sensor_whitelist=[ATC_MAC])
+        sensor_msg, tracker_msg = ble_parser.parse_raw_data(bytes.fromhex(ATC))
+        assert sensor_msg["mac"] == "A4C1388D18B2"
+        assert tracker_msg is None
+
+    def test_not_whitelisted_mac(self):
+        """Test that other MAC addresses are rejected before parsing."""
+        ble_parser = BleParser(discovery=False, sensor_whitelist=[IBEACON_MAC])
+        assert ble_parser.parse_raw_data(bytes.fromhex(ATC)) == (None, None)
+        assert not ble_parser.lpacket_ids
+        assert ble_parser.stats()["whitelist"] == {"rejected": 1}
+
+    def test_tracker_whitelist(self):
+        """Test that tracked MAC addresses are not rejected, but not parsed either."""
+        ble_parser = BleParser(discovery=False, tracker_whitelist=[ATC_MAC])
+        sensor_msg, tracker_msg = ble_parser.parse_raw_data(bytes.fromhex(ATC))
+        assert sensor_msg is None
+        assert tracker_msg["mac"] == "A4C1388D18B2"
+        assert not ble_parser.lpacket_ids
+
+    def test_whitelisted_beacon_uuid(self):
+        """Test that beacons are parsed when their UUID is whitelisted."""
+        ble_parser = BleParser(discovery=False, sensor_whitelist=[IBEACON_UUID])
+        sensor_msg, _ = ble_parser.parse_raw_data(bytes.fromhex(IBEACON))
+        assert sensor_msg["uuid"] == "e2c56db5dffb48d2b060d0f5a71096e0"
+        assert ble_parser.parse_raw_data(bytes.fromhex(ATC)) == (None, None)
+        assert not ble_parser.lpacket_ids
+
+    def test_not_whitelisted_beacon_uuid(self):
+        """Test that beacons with other UUIDs are not parsed."""
+        other_uuid = bytes.fromhex("00112233445566778899aabbccddeeff")
+        ble_parser = BleParser(discovery=False, sensor_whitelist=[other_uuid])
+        assert ble_parser.parse_raw_data(bytes.fromhex(IBEACON)) == (None, None)
+
+    def test_tracked_beacon_uuid(self):
+        """Test that beacons are parsed when their UUID is tracked."""
+        ble_parser = BleParser(discovery=False, tracker_whitelist=[IBEACON_UUID])
+        sensor_msg, tracker_msg = ble_parser.parse_raw_data(bytes.fromhex(IBEACON))
+        assert sensor_msg is None
+        assert tracker_msg["uuid"] == "e2c56db5dffb48d2b060d0f5a71096e0"
+        assert tracker_msg["major"] == 100
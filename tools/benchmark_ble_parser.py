@@ -0,0 +1,420 @@
+#!/usr/bin/env python3
+"""Microbenchmarks for the ble_parser package.
+
+The corpus consists of the raw HCI events used in the ble_parser tests.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import io
+import logging
+import random
+import re
+import sys
+import threading
+import time
+import timeit
+from pathlib import Path
+
+COMPONENT_DIR = Path(__file__).resolve().parent.parent / "custom_components" / "ble_monitor"
+sys.path.insert(0, str(COMPONENT_DIR))
+
+from ble_parser import BleParser  # noqa: E402
+from ble_parser.handoff import HandoffQueue  # noqa: E402
+from ble_parser.tokenizer import tokenize_ad_structures  # noqa: E402
+from ble_parser.xiaomi import parse_xiaomi  # noqa: E402
+from Cryptodome.Cipher import AES  # noqa: E402
+
+# Advertising data of phones, earbuds and TVs, that no parser supports
+UNSUPPORTED_ADPAYLOADS = [
+    bytes.fromhex(adpayload) for adpayload in (
+        # Apple Nearby Info
+        "02011a0aff4c0010050318a4d0c8",
+        # Apple AirPods
+        "1eff4c000719010e2022f58f0100000c6fbf7c8a2c3c6e5d6a0e2a4d36c4e1",
+        # Samsung
+        "02011a0dff750042040180606b2b3d2f4b",
+        # Microsoft Swift Pair / CDP
+        "1eff0600010920022a3c5e43a12d54b7c3ac3ee2cd69a5fc94a2d7c43e1b8c",
+        # Google Fast Pair
+        "03032cfe06162cfe00b1a1",
+        # Flags and a name
+        "0201060b094c472054562035352220",
+    )
+]
+
+
+def load_corpus(pattern: str = "test_*.py") -> list[bytes]:
+    """Return the raw HCI events from the ble_parser tests."""
+    corpus = []
+    for test_file in sorted((COMPONENT_DIR / "test").glob(pattern)):
+        for data_string in re.findall(r'data_string = "([0-9a-fA-F]+)"', test_file.read_text()):
+            corpus.append(bytes.fromhex(data_string))
+    return corpus
+
+
+def _ad_payload(data: bytes) -> tuple[int, int, bool] | None:
+    """Return start and size of the advertising data of a (single report) HCI event."""
+    is_ext_packet = data[3] == 0x0D
+    adpayload_start = 29 if is_ext_packet else 14
+    if len(data) < adpayload_start:
+        return None
+    return adpayload_start, data[adpayload_start - 1], is_ext_packet
+
+
+def tokenize(data, adpayload_start, adpayload_size, is_ext_packet):
+    """MAC extraction and AD structure walk as done by parse_raw_data."""
+    mac = data[13:7:-1] if is_ext_packet else data[12:6:-1]
+    return tokenize_ad_structures(data, adpayload_start, adpayload_size, mac)
+
+
+def legacy_tokenize(data, adpayload_start, adpayload_size, is_ext_packet):
+    """MAC extraction and AD structure loop as they were before the tokenizer."""
+    complete_local_name = ""
+    shortened_local_name = ""
+    service_class_uuid16 = None
+    service_class_uuid128 = None
+    service_data_list = []
+    man_spec_data_list = []
+    mac = (data[8 if is_ext_packet else 7:14 if is_ext_packet else 13])[::-1]
+    while adpayload_size > 1:
+        adstuct_size = data[adpayload_start] + 1
+        if adstuct_size > 1 and adstuct_size <= adpayload_size:
+            adstruct = data[adpayload_start:adpayload_start + adstuct_size]
+            adstuct_type = adstruct[1]
+            if adstuct_type == 0x02 or adstuct_type == 0x03:
+                service_class_uuid16 = (adstruct[2] << 8) | adstruct[3]
+            elif adstuct_type == 0x05:
+                if mac == b"\x66\x55\x44\x33\x22\x11":
+                    man_spec_data_list.append(adstruct)
+            elif adstuct_type == 0x06:
+                service_class_uuid128 = adstruct[2:]
+            elif adstuct_type == 0x08:
+                try:
+                    shortened_local_name = adstruct[2:].decode("utf-8")
+                except UnicodeDecodeError:
+                    shortened_local_name = ""
+            elif adstuct_type == 0x09:
+                try:
+                    complete_local_name = adstruct[2:].decode("utf-8")
+                except UnicodeDecodeError:
+                    complete_local_name = ""
+            elif adstuct_type == 0x16 and adstuct_size > 4:
+                service_data_list.append(adstruct)
+            elif adstuct_type == 0xFF:
+                man_spec_data_list.append(adstruct)
+        adpayload_size -= adstuct_size
+        adpayload_start += adstuct_size
+    return (
+        complete_local_name or shortened_local_name,
+        service_class_uuid16,
+        service_class_uuid128,
+        service_data_list,
+        man_spec_data_list,
+    )
+
+
+class _CountingBytes(bytes):
+    """Bytes that count every slice taken from them (and from their slices)."""
+
+    slices = 0
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        if isinstance(key, slice):
+            _CountingBytes.slices += 1
+            return _CountingBytes(value)
+        return value
+
+
+def bench_tokenizer(corpus: list[bytes], number: int) -> None:
+    """Compare the tokenizer with the former slice-per-structure loop."""
+    jobs = []
+    for data in corpus:
+        payload = _ad_payload(data)
+        if payload is not None:
+            jobs.append((data, *payload))
+
+    for name, func in (("legacy", legacy_tokenize), ("tokenizer", tokenize)):
+        _CountingBytes.slices = 0
+        for data, start, size, is_ext_packet in jobs:
+            func(_CountingBytes(data), start, size, is_ext_packet)
+        slices = _CountingBytes.slices / len(jobs)
+
+        def run(func=func):
+            for data, start, size, is_ext_packet in jobs:
+                func(data, start, size, is_ext_packet)
+
+        seconds = min(timeit.repeat(run, number=number, repeat=5)) / (number * len(jobs))
+        print(
+            f"{name:>10}: {slices:5.2f} bytes objects/packet, "
+            f"{seconds * 1e6:6.2f} us/packet, {1 / seconds:10.0f} packets/s"
+        )
+
+
+def mixed_corpus(corpus: list[bytes], unsupported_share: float = 0.8) -> list[bytes]:
+    """Return the corpus mixed with advertisements of unsupported devices."""
+    rng = random.Random(1)
+    count = round(len(corpus) * unsupported_share / (1 - unsupported_share))
+    mixed = list(corpus)
+    for _ in range(count):
+        adpayload = rng.choice(UNSUPPORTED_ADPAYLOADS)
+        report = b"\x00\x01" + rng.randbytes(6) + bytes([len(adpayload)]) + adpayload + b"\xc0"
+        mixed.append(bytes([0x04, 0x3E, len(report) + 2, 0x02, 0x01]) + report)
+    rng.shuffle(mixed)
+    return mixed
+
+
+def bench_prefilter(corpus: list[bytes], number: int) -> None:
+    """Parse a corpus with 80% unsupported devices with and without prefilter."""
+    mixed = mixed_corpus(corpus)
+    unsupported = [data for data in mixed if data not in corpus]
+    print(f"mixed corpus: {len(mixed)} HCI events, {len(unsupported)} unsupported")
+    for events_name, events in (("mixed", mixed), ("unsupported", unsupported)):
+        for name, prefilter in (("off", False), ("on", True)):
+            def run(events=events, prefilter=prefilter):
+                ble_parser = BleParser(prefilter=prefilter)
+                for data in events:
+                    ble_parser.parse_hci_event(data)
+                return ble_parser
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                stats = run().stats().get("prefilter")
+                seconds = min(timeit.repeat(run, number=number, repeat=5)) / (number * len(events))
+            counters = f", accepted {stats['accepted']}, rejected {stats['rejected']}" if stats else ""
+            print(
+                f"{events_name:>11}, prefilter {name:>3}: {seconds * 1e6:6.2f} us/packet, "
+                f"{1 / seconds:10.0f} packets/s{counters}"
+            )
+
+
+def encrypted_corpus(devices: int = 150, packets: int = 20) -> tuple[list[bytes], dict]:
+    """Return encrypted BTHome V2 events of a number of devices and their keys."""
+    rng = random.Random(1)
+    aeskeys = {}
+    events = []
+    for _ in range(devices):
+        mac = rng.randbytes(6)
+        key = aeskeys[mac] = rng.randbytes(16)
+        for packet_id in range(1, packets + 1):
+            count_id = packet_id.to_bytes(4, "little")
+            cipher = AES.new(key, AES.MODE_CCM, nonce=mac + b"\xd2\xfc\x41" + count_id, mac_len=4)
+            # temperature and humidity
+            encrypted_payload, mic = cipher.encrypt_and_digest(b"\x02\xca\x09\x03\xbf\x13")
+            service_data = b"\x16\xd2\xfc\x41" + encrypted_payload + count_id + mic
+            adpayload = b"\x02\x01\x06" + bytes([len(service_data)]) + service_data
+            report = b"\x00\x00" + mac[::-1] + bytes([len(adpayload)]) + adpayload + b"\xcc"
+            events.append(bytes([0x04, 0x3E, len(report) + 2, 0x02, 0x01]) + report)
+    rng.shuffle(events)
+    return events, aeskeys
+
+
+class _PerPacketCcm:
+    """AES-CCM as it was done before the cached contexts, a new cipher per packet."""
+
+    def __init__(self, key):
+        self.key = key
+
+    def decrypt_and_verify(self, nonce, ciphertext, mac_tag, aad=b""):
+        cipher = AES.new(self.key, AES.MODE_CCM, nonce=nonce, mac_len=4)
+        if aad:
+            cipher.update(aad)
+        return cipher.decrypt_and_verify(ciphertext, mac_tag)
+
+
+class _PerPacketCiphers:
+    get = _PerPacketCcm
+
+
+def bench_decryption(corpus: list[bytes], number: int) -> None:
+    """Parse encrypted BTHome events with a new cipher per packet and with cached contexts."""
+    events, aeskeys = encrypted_corpus()
+    print(f"encrypted corpus: {len(events)} HCI events of {len(aeskeys)} devices")
+    for name, ciphers in (("per packet", _PerPacketCiphers()), ("cached", None)):
+        ble_parser = BleParser(aeskeys=aeskeys)
+        if ciphers is not None:
+            ble_parser.ciphers = ciphers
+
+        def run(ble_parser=ble_parser):
+            for data in events:
+                ble_parser.parse_hci_event(data)
+
+        seconds = min(timeit.repeat(run, number=max(number // 20, 1), repeat=5))
+        seconds /= max(number // 20, 1) * len(events)
+        print(f"{name:>10}: {seconds * 1e6:6.2f} us/packet, {1 / seconds:10.0f} packets/s")
+
+
+def bench_xiaomi(corpus: list[bytes], number: int) -> None:
+    """Parse the HCI events of the Xiaomi parser tests, and their MiBeacon service data only."""
+    events = load_corpus("test_xiaomi_parser.py")
+    records = []
+    for data in events:
+        payload = _ad_payload(data)
+        if payload is None:
+            continue
+        mac = data[13:7:-1] if payload[2] else data[12:6:-1]
+        for service_data in tokenize(data, *payload)[3]:
+            # unencrypted MiBeacons with objects
+            if service_data[2:4] == b"\x95\xfe" and service_data[4] & 0x48 == 0x40:
+                records.append((service_data, mac))
+    ble_parser = BleParser()
+
+    def run_events():
+        for data in events:
+            ble_parser.parse_hci_event(data)
+
+    def run_records():
+        for service_data, mac in records:
+            parse_xiaomi(ble_parser, service_data, mac)
+
+    for name, run, count in (("HCI events", run_events, len(events)), ("MiBeacons", run_records, len(records))):
+        with contextlib.redirect_stdout(io.StringIO()):
+            seconds = min(timeit.repeat(run, number=number, repeat=5)) / (number * count)
+        print(f"{count:4d} {name:>10}: {seconds * 1e6:6.2f} us/packet, {1 / seconds:10.0f} packets/s")
+
+
+def bench_batch(corpus: list[bytes], number: int) -> None:
+    """Parse the mixed corpus event by event and as a batch."""
+    mixed = mixed_corpus(corpus)
+    print(f"mixed corpus: {len(mixed)} HCI events")
+
+    def run_events():
+        ble_parser = BleParser()
+        for data in mixed:
+            if len(data) >= 12:
+                ble_parser.parse_hci_event(data)
+
+    def run_batch():
+        for _ in BleParser().parse_raw_batch(mixed):
+            pass
+
+    for name, run in (("events", run_events), ("batch", run_batch)):
+        with contextlib.redirect_stdout(io.StringIO()):
+            seconds = min(timeit.repeat(run, number=number, repeat=5)) / (number * len(mixed))
+        print(f"{name:>10}: {seconds * 1e6:6.2f} us/packet, {1 / seconds:10.0f} packets/s")
+
+
+async def _hand_over(rate: int, seconds: float, max_items: int, delay: float) -> HandoffQueue:
+    """Put items in a handoff queue from a thread at rate items/s and get them in the event loop.
+
+    The producer notifies the consumer every delay seconds, as the HCIdump thread does.
+    """
+    queue = HandoffQueue("measuring", max_items=max_items)
+    items = int(rate * seconds)
+
+    def put():
+        start = time.monotonic()
+        last_notify = start
+        for item in range(items):
+            while (now := time.monotonic()) < start + item / rate:
+                time.sleep(0.0002)
+            queue.put(item)
+            if now - last_notify >= delay:
+                queue.notify()
+                last_notify = now
+        queue.notify()
+
+    producer = threading.Thread(target=put)
+    producer.start()
+    received = 0
+    while received < items:
+        received += len(await asyncio.wait_for(queue.get(), 1))
+    producer.join()
+    return queue
+
+
+def bench_handoff(corpus: list[bytes], number: int) -> None:
+    """Hand 2000 items/s over from a thread to an event loop, with a wakeup per item and in batches."""
+    for name, max_items in (("per item", 1), ("batches", 100)):
+        queue = asyncio.run(_hand_over(2000, 1, max_items, 0.005))
+        stats = queue.stats()
+        print(
+            f"{name:>10}: {stats['batches']:5} wakeups/s, batch size {stats['batch_size']}, "
+            f"latency {stats['latency_ms']} ms"
+        )
+
+
+def bench_routing(corpus: list[bytes], number: int) -> None:
+    """Route the sensor data of the corpus with the sensor lists and with the routing table."""
+    # the routing table is part of the integration, which needs Home Assistant
+    sys.path.insert(0, str(COMPONENT_DIR.parent))
+    from ble_monitor.const import (AUTO_BINARY_SENSOR_LIST,
+                                   AUTO_MANUFACTURER_DICT, AUTO_SENSOR_LIST,
+                                   MANUFACTURER_DICT, MEASUREMENT_DICT)
+    from ble_monitor.routing import build_routes, route_sensor_data
+
+    ble_parser = BleParser()
+    supported = MANUFACTURER_DICT.keys() | AUTO_MANUFACTURER_DICT.keys()
+    with contextlib.redirect_stdout(io.StringIO()):
+        messages = [
+            sensor_msg
+            for data in corpus
+            for sensor_msg, _ in ble_parser.parse_hci_event(data)
+            if sensor_msg and sensor_msg.get("type") in supported
+        ]
+    print(f"{len(messages)} sensor messages")
+    routes = build_routes()
+
+    def run_lists():
+        for sensor_msg in messages:
+            device_type = sensor_msg["type"]
+            if device_type in MANUFACTURER_DICT:
+                sensor_list = MEASUREMENT_DICT[device_type][0] + MEASUREMENT_DICT[device_type][1]
+                binary_list = MEASUREMENT_DICT[device_type][2] + ["battery"]
+            elif device_type in AUTO_MANUFACTURER_DICT:
+                sensor_list = AUTO_SENSOR_LIST
+                binary_list = AUTO_BINARY_SENSOR_LIST + ["battery"]
+            else:
+                continue
+            measuring = any(x in sensor_msg for x in sensor_list)
+            binary = any(x in sensor_msg for x in binary_list)
+            if binary == measuring:
+                measuring = binary = True
+
+    def run_table():
+        for sensor_msg in messages:
+            route = routes.get(sensor_msg["type"])
+            if route is None:
+                continue
+            route_sensor_data(route, sensor_msg)
+
+    for name, run in (("lists", run_lists), ("table", run_table)):
+        seconds = min(timeit.repeat(run, number=number, repeat=5)) / (number * len(messages))
+        print(f"{name:>10}: {seconds * 1e6:6.2f} us/message, {1 / seconds:10.0f} messages/s")
+
+
+BENCHMARKS = {
+    "batch": bench_batch,
+    "decryption": bench_decryption,
+    "handoff": bench_handoff,
+    "prefilter": bench_prefilter,
+    "routing": bench_routing,
+    "tokenizer": bench_tokenizer,
+    "xiaomi": bench_xiaomi,
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "benchmark", nargs="*", default=sorted(BENCHMARKS), help=f"one of {', '.join(sorted(BENCHMARKS))}"
+    )
+    parser.add_argument("--number", type=int, default=200, help="passes over the corpus")
+    args = parser.parse_args()
+    unknown = sorted(set(args.benchmark) - set(BENCHMARKS))
+    if unknown:
+        parser.error(f"unknown benchmark: {', '.join(unknown)}")
+    # the parsers log errors for some of the test vectors
+    logging.disable(logging.CRITICAL)
+    corpus = load_corpus()
+    print(f"corpus: {len(corpus)} HCI events")
+    for name in args.benchmark:
+        print(f"== {name}")
+        BENCHMARKS[name](corpus, args.number)
+
+
+if __name__ == "__main__":
+    main()